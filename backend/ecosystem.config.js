@@ -34,7 +34,8 @@ module.exports = {
     {
       name: 'mantle-forge-python-saas',
       script: 'gunicorn',
-      args: '-w 4 -b 0.0.0.0:5000 app:app',
+      // Workers, threads, timeouts and recycling come from python-saas/gunicorn.conf.py
+      args: '-c gunicorn.conf.py app:app',
       cwd: path.join(__dirname, '../python-saas'),
       interpreter: path.join(__dirname, '../python-saas/venv/bin/python'),
       env: {
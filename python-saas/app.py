@@ -2,26 +2,143 @@
 MantleForge Python Risk Analysis SaaS
 Provides AI-powered risk analysis for RWA assets
 """
-from flask import Flask, request, jsonify
+from flask import Flask, Request, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+import io
 import os
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from contextlib import closing
+from typing import Optional, Dict, Any, Iterator, List, Tuple
 from dotenv import load_dotenv
 from risk_analyzer import RiskAnalyzer
-from pdf_parser import PDFParser
+from pdf_parser import PDFParser, PDFTriageError, join_pages, parse_page_selection
+from parse_sandbox import ParseSandbox, SandboxError
+from result_cache import ResultCache
+from single_flight import SingleFlight
+from text_store import TextStore, extraction_key
+from job_queue import JobQueue, QueueFull
+from upload_spool import SpooledUpload, UploadBudget, UploadBudgetExceeded, UploadTooLarge, spool_upload
+import metrics
+from metrics import STAGE_SECONDS, UPLOAD_BYTES, ERRORS, REQUESTS, REQUEST_SECONDS
+from profiling import RequestProfiler
 
 load_dotenv()
 
+# Configuration
+PORT = int(os.getenv("PORT", 5000))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 200 * 1024 * 1024))
+PDF_SPOOL_THRESHOLD = int(os.getenv("PDF_SPOOL_THRESHOLD", 8 * 1024 * 1024))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 1000))
+# Everything one batch request may spool: its PDF parts, its archives and the PDFs they expand to
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", 1024 * 1024 * 1024))
+# Endpoints whose uploads share BATCH_MAX_BYTES; every other request gets MAX_UPLOAD_BYTES in total
+BATCH_ENDPOINTS = frozenset({'analyze_batch'})
+JOBS_DIR = os.getenv("JOBS_DIR") or os.path.join(tempfile.gettempdir(), "mantleforge-jobs")
+PDF_SANDBOX = os.getenv("PDF_SANDBOX", "true").lower() == "true"
+
+class SpoolingRequest(Request):
+    """
+    Request that streams file parts straight into a size-limited, hashing spool
+    All parts of one request draw on a shared byte budget, enforced while the
+    body is parsed, so a request with many parts is cut off as soon as it
+    goes over rather than after everything has been written to the spool.
+    """
+    @property
+    def upload_budget(self) -> UploadBudget:
+        budget = self.__dict__.get('_upload_budget')
+        if budget is None:
+            limit = BATCH_MAX_BYTES if self.endpoint in BATCH_ENDPOINTS else MAX_UPLOAD_BYTES
+            budget = self.__dict__['_upload_budget'] = UploadBudget(limit)
+        return budget
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        upload = SpooledUpload(MAX_UPLOAD_BYTES, PDF_SPOOL_THRESHOLD, UPLOAD_SPOOL_DIR, self.upload_budget)
+        self.__dict__.setdefault('_spools', []).append(upload)
+        return upload
+
+    def close(self) -> None:
+        """Also remove the spools of a body whose parsing was cut off part-way"""
+        super().close()
+        for upload in self.__dict__.get('_spools', []):
+            upload.close()
+
 app = Flask(__name__)
+app.request_class = SpoolingRequest
 CORS(app, resources={r"/*": {"origins": "*"}})
 
-# Configuration
-PORT = int(os.getenv("PORT", 5000))
 # Note: AI analysis is handled by backend using EmbedAPI
 # This service focuses on PDF parsing and data extraction
 
 # Initialize services
 risk_analyzer = RiskAnalyzer()
-pdf_parser = PDFParser()
+# Uploads are parsed in worker processes with time, CPU and memory limits
+parse_sandbox = ParseSandbox.from_env() if PDF_SANDBOX else None
+pdf_parser = PDFParser(sandbox=parse_sandbox)
+result_cache = ResultCache.from_env()
+# Concurrent uploads of the same document (double submits, retries) share one parse
+single_flight = SingleFlight.from_env()
+# Extracted text is kept so documents can be re-scored (/api/reanalyze) without re-parsing
+text_store = TextStore.from_env()
+# Admin-only per-request profiling (PROFILE_TOKEN); disabled when no token is set
+request_profiler = RequestProfiler.from_env()
+# Profiled requests parse serially so the profile shows the parser's work; with the
+# sandbox on, the worker profiles the parse under its usual limits and sends the recording back
+profiling_parser = PDFParser(workers=1, sandbox=parse_sandbox)
+_portfolio_scorer = None
+_portfolio_lock = threading.Lock()
+
+def get_portfolio_scorer():
+    """Portfolio scorer, built on first use so NumPy is not imported at start-up"""
+    global _portfolio_scorer
+    with _portfolio_lock:
+        if _portfolio_scorer is None:
+            from portfolio_scorer import PortfolioScorer
+            from fingerprint_store import FingerprintStore
+            _portfolio_scorer = PortfolioScorer(max_assets=int(os.getenv("PORTFOLIO_MAX_ASSETS", 100000)),
+                                                store=FingerprintStore.from_env())
+        return _portfolio_scorer
+
+def warm_up(sandbox: bool = True) -> Dict[str, Any]:
+    """
+    Import and exercise the lazily loaded dependencies before the first request
+    
+    Args:
+        sandbox: Also start the parse sandbox workers (not in a pre-fork master)
+    
+    Returns:
+        Seconds spent per step
+    """
+    report: Dict[str, Any] = {}
+    start = time.perf_counter()
+    report['pdf_parser'] = pdf_parser.warm_up(sandbox=sandbox)
+    step = time.perf_counter()
+    get_portfolio_scorer()
+    report['portfolio_scorer'] = round(time.perf_counter() - step, 4)
+    step = time.perf_counter()
+    risk_analyzer.http.session
+    report['http_client'] = round(time.perf_counter() - step, 4)
+    report['total_seconds'] = round(time.perf_counter() - start, 4)
+    return report
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request(response):
+    """Count every response by route template (not raw path) and status"""
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    if 'request_started' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, endpoint=endpoint)
+    return response
 
 @app.route('/api/health', methods=['GET'])
 def health():
@@ -31,21 +148,234 @@ def health():
         "service": "mantle-forge-risk-analyzer"
     }), 200
 
+@app.route('/api/warmup', methods=['GET', 'POST'])
+def warmup():
+    """Load and exercise the PDF engines and other lazy imports; safe to call repeatedly"""
+    try:
+        report = warm_up()
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": f"Warm-up failed: {str(e)}"
+        }), 500
+    return jsonify({
+        "status": "success",
+        "warmup": report
+    }), 200
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Result cache hit/miss and single-flight coalescing counters for sizing"""
+    return jsonify({
+        "status": "success",
+        "cache": result_cache.stats(),
+        "single_flight": single_flight.stats(),
+        "text_store": text_store.stats() if text_store is not None else None
+    }), 200
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Per-stage latency histograms and counters in Prometheus text format, summed over all workers"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+def _spooled(file) -> SpooledUpload:
+    """Return the upload's spool, copying the stream in chunks if it was not spooled on arrival"""
+    if isinstance(file.stream, SpooledUpload):
+        file.stream.seek(0)
+        upload = file.stream
+    else:
+        upload = spool_upload(file.stream, MAX_UPLOAD_BYTES, PDF_SPOOL_THRESHOLD, UPLOAD_SPOOL_DIR,
+                              request.upload_budget)
+    UPLOAD_BYTES.observe(upload.size)
+    return upload
+
+PDF_TRIAGE = os.getenv("PDF_TRIAGE", "true").lower() == "true"
+
+class AnalysisError(Exception):
+    """A document that cannot be analyzed, with the HTTP status it maps to"""
+    def __init__(self, message: str, status: int = 400, code: Optional[str] = None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+    def to_dict(self) -> Dict[str, Any]:
+        error = {"status": "error", "message": str(self)}
+        if self.code:
+            error["error_code"] = self.code
+        return error
+
+def _build_result(pdf_text: str, asset_type: str, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Run risk analysis on extracted text and shape the /api/analyze response"""
+    # Note: Actual AI analysis is done by backend using EmbedAPI
+    # This service provides PDF parsing and basic risk scoring
+    analysis_result = risk_analyzer.analyze(pdf_text, asset_type)
+    
+    return {
+        "status": "success",
+        "risk_score": analysis_result["risk_score"],
+        "valuation": analysis_result["valuation"],
+        "asset_type": asset_type,
+        "extracted_data": {
+            **analysis_result["extracted_data"],
+            "pdf_metadata": metadata if metadata is not None else {},
+            "text_length": len(pdf_text)
+        },
+        "confidence": analysis_result.get("confidence", 0.85),
+        "pdf_text": pdf_text[:1000]  # First 1000 chars for backend AI analysis
+    }
+
+def _result_from_extraction(pdf_text: str, metadata: Dict[str, Any], asset_type: str,
+                            truncated: bool = False, document_hash: Optional[str] = None,
+                            pages_processed: Optional[str] = None) -> Dict[str, Any]:
+    """Validate extracted text and build the response for a parsed PDF"""
+    if not pdf_text or len(pdf_text.strip()) < 10:
+        ERRORS.inc(stage='analysis', error='no_text')
+        raise AnalysisError("Could not extract text from PDF. File may be corrupted or image-based.",
+                            code='no_text')
+    result = _build_result(pdf_text, asset_type, metadata)
+    result["extracted_data"]["text_truncated"] = truncated
+    if pages_processed is not None:
+        # 1-based pages the text came from, e.g. '1-3,10'
+        result["extracted_data"]["pages_processed"] = pages_processed
+    if document_hash is not None:
+        # Lets callers re-score this document later via /api/reanalyze
+        result["document_hash"] = document_hash
+    return result
+
+def _store_text(digest: str, method: str, options: Dict[str, Any], extraction: Dict[str, Any]) -> None:
+    """Keep an extraction in the text store; a storage failure never fails the analysis"""
+    if text_store is None:
+        return
+    try:
+        with STAGE_SECONDS.time(stage='text_store'):
+            text_store.put(digest, extraction_key(method, **options), extraction['text'], extraction['metadata'],
+                           extraction['truncated'], extraction.get('page_texts'), extraction.get('pages_processed'))
+    except (sqlite3.Error, OSError) as e:
+        ERRORS.inc(stage='text_store', error=type(e).__name__)
+        print(f"Warning: Could not store extracted text: {e}")
+
+def _positive_int_param(name: str) -> Optional[int]:
+    """Read an optional positive integer from the form fields or query string"""
+    value = request.values.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number <= 0:
+        raise AnalysisError(f"{name} must be a positive integer")
+    return number
+
+def _page_selection_param(value: Any) -> Optional[str]:
+    """Validate a page selection such as '1-3,10' into its canonical form"""
+    if value in (None, ''):
+        return None
+    try:
+        return parse_page_selection(str(value))
+    except ValueError as e:
+        raise AnalysisError(str(e))
+
+def _extraction_options() -> Dict[str, Any]:
+    """Extraction budget (max_chars / max_pages) and page choice (pages / sample) requested by the caller"""
+    options: Dict[str, Any] = {}
+    for name in ('max_chars', 'max_pages', 'sample'):
+        value = _positive_int_param(name)
+        if value is not None:
+            options[name] = value
+    # Canonical form, so '10,1-3' and '1-3,10' share cache entries and stored text
+    page_selection = _page_selection_param(request.values.get('pages'))
+    if page_selection is not None:
+        options['page_selection'] = page_selection
+    return options
+
+def _analyze_pdf(source, digest: str, asset_type: str = 'invoice', method: str = 'auto',
+                 options: Optional[Dict[str, Any]] = None,
+                 profile: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], str]:
+    """
+    Full pipeline for one PDF: cache lookup, single parse, risk analysis
+    Concurrent requests for the same document and parameters are coalesced,
+    so only one of them parses it and the others share its result.
+    
+    Args:
+        options: Extra PDFParser.extract_document keyword arguments, e.g. max_chars / max_pages
+        profile: The request profiler's info dict, for a profiled request: the cache
+            lookup is skipped and a sandbox worker's recording is stored in it
+    
+    Returns:
+        (result, cache status 'HIT', 'MISS', or 'SHARED' when another in-flight request parsed it)
+    
+    Raises:
+        AnalysisError: if the PDF cannot be parsed or has no usable text
+    """
+    # Repeat uploads of the same document are served from cache
+    options = options or {}
+    cache_key = ResultCache.make_key(digest, asset_type, method, **options)
+    if profile is not None:
+        return _parse_and_analyze(profiling_parser, source, digest, asset_type, method, options, profile), 'MISS'
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached, 'HIT'
+    
+    def parse_and_cache():
+        result = _parse_and_analyze(pdf_parser, source, digest, asset_type, method, options)
+        result_cache.put(cache_key, result)
+        return result
+    
+    result, shared = single_flight.do(cache_key, parse_and_cache)
+    return result, 'SHARED' if shared else 'MISS'
+
+def _parse_and_analyze(parser: PDFParser, source, digest: str, asset_type: str, method: str,
+                       options: Dict[str, Any], profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Parse one PDF, keep its text in the text store and run risk analysis on it"""
+    # Parse once; text, metadata and page count share the parse.
+    # Junk uploads are rejected by triage before any page is laid out
+    try:
+        with STAGE_SECONDS.time(stage='parse'):
+            extraction = parser.extract_document(source, method, triage=PDF_TRIAGE,
+                                                 with_page_texts=text_store is not None,
+                                                 profile=profile is not None, **options)
+    except (PDFTriageError, SandboxError) as e:
+        if isinstance(e, SandboxError):
+            ERRORS.inc(stage='sandbox', error=e.code)
+        raise AnalysisError(e.message, code=e.code)
+    except Exception as e:
+        raise AnalysisError(f"PDF parsing failed: {str(e)}")
+    
+    if profile is not None and 'profile' in extraction:
+        profile['sandbox'] = extraction.pop('profile')
+    _store_text(digest, method, options, extraction)
+    return _result_from_extraction(extraction['text'], extraction['metadata'], asset_type,
+                                   extraction['truncated'], digest, extraction['pages_processed'])
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_asset():
     """
     Main risk analysis endpoint
     Accepts PDF upload (multipart/form-data) or JSON with pdf_text
     Returns risk score and analysis
+    
+    Requests sending the PROFILE_TOKEN in X-Profile-Token are run under
+    cProfile and tracemalloc; the stored report's id is returned in X-Profile-Id
     """
+    if not (request_profiler.enabled and request_profiler.requested(request.headers)):
+        return _analyze_asset()
+    
+    with request_profiler.profile(f"{request.method} {request.full_path}") as profile:
+        response = app.make_response(_analyze_asset(profile))
+    if profile and profile.get('profile_id'):
+        response.headers['X-Profile-Id'] = profile['profile_id']
+    return response
+
+def _analyze_asset(profile: Optional[Dict[str, Any]] = None):
     try:
-        pdf_text = ''
-        pdf_bytes = None
-        asset_type = 'invoice'
+        # The multipart body is read and spooled on first access to request.files
+        with STAGE_SECONDS.time(stage='upload_read'):
+            files = request.files
         
         # Check if PDF file was uploaded (multipart/form-data)
-        if 'pdf' in request.files:
-            file = request.files['pdf']
+        if 'pdf' in files:
+            file = files['pdf']
             if file and file.filename:
                 if not file.filename.endswith('.pdf'):
                     return jsonify({
@@ -53,22 +383,22 @@ def analyze_asset():
                         "message": "Only PDF files are supported"
                     }), 400
                 
-                # Read PDF bytes
-                pdf_bytes = file.read()
+                asset_type = request.form.get('asset_type', 'invoice')
+                method = request.form.get('method', 'auto')
                 
-                # Extract text from PDF
+                # Large uploads are parsed from a temp file, not from memory
+                upload = _spooled(file)
                 try:
-                    pdf_text = pdf_parser.extract_text(pdf_bytes)
-                    if not pdf_text or len(pdf_text.strip()) < 10:
-                        return jsonify({
-                            "status": "error",
-                            "message": "Could not extract text from PDF. File may be corrupted or image-based."
-                        }), 400
-                except Exception as e:
-                    return jsonify({
-                        "status": "error",
-                        "message": f"PDF parsing failed: {str(e)}"
-                    }), 400
+                    result, cache_status = _analyze_pdf(upload.source(), upload.sha256, asset_type, method,
+                                                        _extraction_options(), profile)
+                except AnalysisError as e:
+                    return jsonify(e.to_dict()), e.status
+                
+                response = jsonify(result)
+                response.headers['X-Cache'] = cache_status
+                return response, 200
+            
+            return jsonify(_build_result('', 'invoice')), 200
         
         # Check for JSON data (alternative method)
         elif request.is_json:
@@ -81,52 +411,595 @@ def analyze_asset():
                     "status": "error",
                     "message": "No PDF file or pdf_text provided"
                 }), 400
+            
+            return jsonify(_build_result(pdf_text, asset_type)), 200
         else:
             return jsonify({
                 "status": "error",
                 "message": "No PDF file or pdf_text provided"
             }), 400
         
-        # Perform risk analysis
-        # Note: Actual AI analysis is done by backend using EmbedAPI
-        # This service provides PDF parsing and basic risk scoring
-        analysis_result = risk_analyzer.analyze(pdf_text, asset_type)
+    except AnalysisError as e:
+        return jsonify(e.to_dict()), e.status
+    except UploadTooLarge as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 413
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
+def _stream_analysis(source, digest: str, asset_type: str, method: str,
+                     options: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Events for /api/analyze/stream: 'start', one 'page' per parsed page, then 'result' or 'error'
+    The result is the /api/analyze response for the same upload and is
+    cached under the same key, so either endpoint can serve the other's hits.
+    """
+    yield {"type": "start", "asset_type": asset_type, "method": method}
+    cache_key = ResultCache.make_key(digest, asset_type, method, **options)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        yield {"type": "result", "cache": "HIT", **cached}
+        return
+    
+    page_texts = []
+    engine = None
+    try:
+        with closing(pdf_parser.iter_pages(source, method, triage=PDF_TRIAGE, **options)) as pages:
+            while True:
+                try:
+                    page = next(pages)
+                except StopIteration as stop:
+                    summary = stop.value
+                    break
+                page_texts.append(page['text'])
+                engine = page['engine']
+                yield {"type": "page", **page}
+        
+        pdf_text = join_pages(page_texts, engine)
+        max_chars = options.get('max_chars')
+        truncated = summary['truncated'] or (max_chars is not None and len(pdf_text) > max_chars)
+        extraction = {'text': pdf_text[:max_chars] if max_chars else pdf_text, 'metadata': summary['metadata'],
+                      'truncated': truncated, 'page_texts': page_texts, 'pages_processed': summary['pages_processed']}
+        _store_text(digest, method, options, extraction)
+        result = _result_from_extraction(extraction['text'], extraction['metadata'], asset_type, truncated, digest,
+                                         summary['pages_processed'])
+    except (PDFTriageError, SandboxError) as e:
+        if isinstance(e, SandboxError):
+            ERRORS.inc(stage='sandbox', error=e.code)
+        yield {"type": "error", **AnalysisError(e.message, code=e.code).to_dict()}
+        return
+    except AnalysisError as e:
+        yield {"type": "error", **e.to_dict()}
+        return
+    except Exception as e:
+        yield {"type": "error", **AnalysisError(f"PDF parsing failed: {str(e)}").to_dict()}
+        return
+    
+    result_cache.put(cache_key, result)
+    yield {"type": "result", "cache": "MISS", **result}
+
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_asset_stream():
+    """
+    Streaming variant of /api/analyze for PDF uploads
+    Responds with NDJSON (one JSON object per line) so clients can show each
+    page as it is parsed: a 'start' line, a 'page' line per page with its text
+    and timing, then a 'result' line shaped like /api/analyze or an 'error' line
+    """
+    try:
+        with STAGE_SECONDS.time(stage='upload_read'):
+            files = request.files
+        file = files.get('pdf')
+        if not file or not file.filename:
+            return jsonify({
+                "status": "error",
+                "message": "No PDF file provided"
+            }), 400
+        if not file.filename.endswith('.pdf'):
+            return jsonify({
+                "status": "error",
+                "message": "Only PDF files are supported"
+            }), 400
+        
+        asset_type = request.form.get('asset_type', 'invoice')
+        method = request.form.get('method', 'auto')
+        options = _extraction_options()
+        upload = _spooled(file)
+    except AnalysisError as e:
+        return jsonify(e.to_dict()), e.status
+    except UploadTooLarge as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 413
+    
+    def lines():
+        for event in _stream_analysis(upload.source(), upload.sha256, asset_type, method, options):
+            yield json.dumps(event) + "\n"
+    
+    # The request context (and with it the spooled upload) lives until the stream ends
+    response = Response(stream_with_context(lines()), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/metadata', methods=['POST'])
+def pdf_metadata():
+    """
+    Metadata-only endpoint for a PDF upload
+    Reads the Info dictionary and page count without extracting any text,
+    so it answers in about the same time whatever the page count
+    """
+    try:
+        file = request.files.get('pdf')
+        if not file or not file.filename:
+            return jsonify({
+                "status": "error",
+                "message": "No PDF file provided"
+            }), 400
+        if not file.filename.endswith('.pdf'):
+            return jsonify({
+                "status": "error",
+                "message": "Only PDF files are supported"
+            }), 400
         
-        # Extract metadata if PDF was provided
-        metadata = {}
-        if pdf_bytes:
+        upload = _spooled(file)
+        with STAGE_SECONDS.time(stage='metadata_only'):
+            metadata = pdf_parser.extract_metadata(upload.source())
+    except SandboxError as e:
+        ERRORS.inc(stage='sandbox', error=e.code)
+        return jsonify(AnalysisError(e.message, code=e.code).to_dict()), 400
+    except UploadTooLarge as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 413
+    
+    if 'error' in metadata:
+        return jsonify({
+            "status": "error",
+            "message": f"Could not read PDF metadata: {metadata['error']}"
+        }), 400
+    return jsonify({
+        "status": "success",
+        "document_hash": upload.sha256,
+        "metadata": metadata
+    }), 200
+
+def _batch_too_large() -> AnalysisError:
+    return AnalysisError(f"Batch exceeds maximum of {BATCH_MAX_ITEMS} items")
+
+def _batch_bytes_too_large(budget: UploadBudget) -> AnalysisError:
+    return AnalysisError(str(UploadBudgetExceeded(budget.max_bytes)), status=413)
+
+def _zip_items(archive, asset_type: str, method: str, spools: List[SpooledUpload],
+               max_items: int, budget: UploadBudget) -> List[Dict[str, Any]]:
+    """
+    Expand a zip archive into batch items, one per PDF member
+    
+    Args:
+        max_items: Batch slots left; checked against the member list before anything is decompressed
+        budget: The request's upload budget; uploaded parts and decompressed members both draw on it
+    
+    Raises:
+        AnalysisError: if the archive holds too many PDFs or expands beyond the budget
+    """
+    upload = _spooled(archive)
+    source = upload.source()
+    try:
+        zf = zipfile.ZipFile(source if isinstance(source, str) else io.BytesIO(source))
+    except zipfile.BadZipFile:
+        return [{"name": archive.filename, "error": "Invalid zip archive"}]
+    
+    items = []
+    with zf:
+        members = [info for info in zf.infolist()
+                   if not info.is_dir() and info.filename.lower().endswith('.pdf')
+                   and not info.filename.startswith('__MACOSX/')]
+        if len(members) > max_items:
+            raise _batch_too_large()
+        # Declared sizes reject an obvious bomb up front; the spool limit below
+        # enforces the bytes actually decompressed, in case the headers lie
+        if sum(info.file_size for info in members) > budget.remaining:
+            raise _batch_bytes_too_large(budget)
+        for info in members:
+            name = f"{archive.filename}/{info.filename}"
+            if info.file_size > MAX_UPLOAD_BYTES:
+                items.append({"name": name, "error": str(UploadTooLarge(MAX_UPLOAD_BYTES))})
+                continue
             try:
-                metadata = pdf_parser.extract_metadata(pdf_bytes)
-                # Ensure all metadata values are JSON-serializable
-                metadata = {k: str(v) if not isinstance(v, (str, int, float, bool, type(None))) else v 
-                           for k, v in metadata.items()}
+                # Members are streamed through the same size-limited spool as direct uploads
+                with zf.open(info) as member:
+                    spool = spool_upload(member, MAX_UPLOAD_BYTES, PDF_SPOOL_THRESHOLD, UPLOAD_SPOOL_DIR, budget)
+            except UploadBudgetExceeded:
+                raise _batch_bytes_too_large(budget)
+            except UploadTooLarge as e:
+                items.append({"name": name, "error": str(e)})
+                continue
             except Exception as e:
-                # Log error but don't fail the request
-                print(f"Warning: Metadata extraction failed: {e}")
-                metadata = {'error': 'Metadata extraction failed', 'num_pages': 0}
+                items.append({"name": name, "error": f"Could not read archive member: {str(e)}"})
+                continue
+            spools.append(spool)
+            items.append({"name": name, "source": spool.source(), "digest": spool.sha256,
+                          "asset_type": asset_type, "method": method})
+    return items
+
+def _text_items(entries, default_asset_type: str) -> List[Dict[str, Any]]:
+    """Turn a JSON array of pdf_text entries into batch items"""
+    if not isinstance(entries, list):
+        raise AnalysisError("items must be a JSON array")
+    items = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            items.append({"name": None, "error": "Each item must be an object with pdf_text"})
+            continue
+        items.append({"name": entry.get('name'), "pdf_text": entry.get('pdf_text', ''),
+                      "asset_type": entry.get('asset_type', default_asset_type)})
+    return items
+
+def _collect_batch_items(spools: List[SpooledUpload]) -> List[Dict[str, Any]]:
+    """Gather batch items from PDF parts, zip archives and pdf_text entries"""
+    if request.is_json:
+        data = request.json
+        if isinstance(data, list):
+            return _text_items(data, 'invoice')
+        data = data or {}
+        return _text_items(data.get('items', []), data.get('asset_type', 'invoice'))
+    
+    asset_type = request.form.get('asset_type', 'invoice')
+    method = request.form.get('method', 'auto')
+    items = []
+    for file in request.files.getlist('pdf'):
+        if not file.filename or not file.filename.endswith('.pdf'):
+            items.append({"name": file.filename, "error": "Only PDF files are supported"})
+            continue
+        upload = _spooled(file)
+        items.append({"name": file.filename, "source": upload.source(), "digest": upload.sha256,
+                      "asset_type": asset_type, "method": method})
+    for archive in request.files.getlist('archive'):
+        items.extend(_zip_items(archive, asset_type, method, spools, BATCH_MAX_ITEMS - len(items),
+                                request.upload_budget))
+    if request.form.get('items'):
+        try:
+            entries = json.loads(request.form['items'])
+        except ValueError:
+            raise AnalysisError("items must be a JSON array")
+        items.extend(_text_items(entries, asset_type))
+    return items
+
+def _run_batch(items: List[Dict[str, Any]], options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Analyze batch items, fanning PDF extraction out across the parser pool"""
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    pending = []
+    
+    def error(message):
+        return {"status": "error", "message": message}
+    
+    for index, item in enumerate(items):
+        if 'error' in item:
+            results[index] = error(item['error'])
+        elif 'pdf_text' in item:
+            if not item['pdf_text']:
+                results[index] = error("No pdf_text provided")
+            else:
+                results[index] = _build_result(item['pdf_text'], item['asset_type'])
+        else:
+            cache_key = ResultCache.make_key(item['digest'], item['asset_type'], item['method'], **options)
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append((index, cache_key, pdf_parser.submit(item['source'], item['method'],
+                                                                    triage=PDF_TRIAGE,
+                                                                    with_page_texts=text_store is not None, **options)))
+    
+    for index, cache_key, future in pending:
+        try:
+            extraction = future.result()
+        except (PDFTriageError, SandboxError) as e:
+            results[index] = AnalysisError(e.message, code=e.code).to_dict()
+            continue
+        except Exception as e:
+            results[index] = error(f"PDF parsing failed: {str(e)}")
+            continue
+        item = items[index]
+        _store_text(item['digest'], item['method'], options, extraction)
+        try:
+            result = _result_from_extraction(extraction['text'], extraction['metadata'], item['asset_type'],
+                                             extraction['truncated'], item['digest'], extraction['pages_processed'])
+        except AnalysisError as e:
+            results[index] = e.to_dict()
+            continue
+        result_cache.put(cache_key, result)
+        results[index] = result
+    
+    return [{"index": index, "name": item.get('name'), **result}
+            for index, (item, result) in enumerate(zip(items, results))]
+
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """
+    Batch risk analysis endpoint
+    Accepts multiple 'pdf' parts, 'archive' zip files and/or a JSON array of
+    pdf_text items; returns per-item results so one bad document does not
+    fail the whole batch
+    """
+    spools: List[SpooledUpload] = []
+    try:
+        items = _collect_batch_items(spools)
+        if not items:
+            return jsonify({
+                "status": "error",
+                "message": "No PDF files, archives or pdf_text items provided"
+            }), 400
+        if len(items) > BATCH_MAX_ITEMS:
+            return jsonify(_batch_too_large().to_dict()), 400
         
+        results = _run_batch(items, _extraction_options())
+        succeeded = sum(1 for r in results if r['status'] == 'success')
         return jsonify({
             "status": "success",
-            "risk_score": analysis_result["risk_score"],
-            "valuation": analysis_result["valuation"],
-            "asset_type": asset_type,
-            "extracted_data": {
-                **analysis_result["extracted_data"],
-                "pdf_metadata": metadata,
-                "text_length": len(pdf_text)
-            },
-            "confidence": analysis_result.get("confidence", 0.85),
-            "pdf_text": pdf_text[:1000]  # First 1000 chars for backend AI analysis
+            "count": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "results": results
         }), 200
         
+    except AnalysisError as e:
+        return jsonify(e.to_dict()), e.status
+    except UploadTooLarge as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 413
     except Exception as e:
         return jsonify({
             "status": "error",
             "message": str(e)
         }), 500
+    finally:
+        for spool in spools:
+            spool.close()
+
+def _run_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Job handler: the same pipeline as /api/analyze, on a persisted input"""
+    if 'path' in payload:
+        result, _ = _analyze_pdf(payload['path'], payload['digest'], payload['asset_type'], payload['method'],
+                                 payload.get('options'))
+        return result
+    return _build_result(payload['pdf_text'], payload['asset_type'])
+
+def _cleanup_job(payload: Dict[str, Any]) -> None:
+    """Remove a finished job's persisted PDF"""
+    if 'path' in payload:
+        try:
+            os.remove(payload['path'])
+        except OSError:
+            pass
+
+def _jobs_dir() -> str:
+    """
+    JOBS_DIR, created 0o700 if missing
+
+    Raises:
+        PermissionError: if another user owns it or others can write to it
+    """
+    os.makedirs(JOBS_DIR, mode=0o700, exist_ok=True)
+    st = os.stat(JOBS_DIR)
+    if (hasattr(os, 'getuid') and st.st_uid != os.getuid()) or st.st_mode & 0o022:
+        raise PermissionError(f"Jobs directory {JOBS_DIR} must be private to this user")
+    return JOBS_DIR
+
+job_queue = JobQueue.from_env(_run_job, cleanup=_cleanup_job)
+
+@app.route('/api/analyze/jobs', methods=['POST'])
+def submit_analysis_job():
+    """
+    Queue an analysis and return a job id immediately
+    Accepts the same inputs as /api/analyze; poll /api/analyze/jobs/<job_id> for the result
+    """
+    try:
+        if 'pdf' in request.files and request.files['pdf'].filename:
+            file = request.files['pdf']
+            if not file.filename.endswith('.pdf'):
+                return jsonify({
+                    "status": "error",
+                    "message": "Only PDF files are supported"
+                }), 400
+            
+            options = _extraction_options()
+            upload = _spooled(file)
+            path = os.path.join(_jobs_dir(), f"{uuid.uuid4().hex}.pdf")
+            upload.persist(path)
+            payload = {
+                "path": path,
+                "digest": upload.sha256,
+                "asset_type": request.form.get('asset_type', 'invoice'),
+                "method": request.form.get('method', 'auto'),
+                "options": options
+            }
+        elif request.is_json:
+            data = request.json or {}
+            if not data.get('pdf_text'):
+                return jsonify({
+                    "status": "error",
+                    "message": "No PDF file or pdf_text provided"
+                }), 400
+            payload = {"pdf_text": data['pdf_text'], "asset_type": data.get('asset_type', 'invoice')}
+        else:
+            return jsonify({
+                "status": "error",
+                "message": "No PDF file or pdf_text provided"
+            }), 400
+        
+        try:
+            job_id = job_queue.submit(payload)
+        except QueueFull as e:
+            _cleanup_job(payload)
+            return jsonify({
+                "status": "error",
+                "message": str(e)
+            }), 429
+        
+        return jsonify({
+            "status": "success",
+            "job_id": job_id,
+            "job_status": "queued",
+            "status_url": f"/api/analyze/jobs/{job_id}"
+        }), 202
+        
+    except AnalysisError as e:
+        return jsonify(e.to_dict()), e.status
+    except UploadTooLarge as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 413
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
+@app.route('/api/analyze/jobs/<job_id>', methods=['GET'])
+def get_analysis_job(job_id):
+    """Job status, plus the analysis result once it has succeeded"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({
+            "status": "error",
+            "message": "Job not found"
+        }), 404
+    return jsonify({
+        "status": "success",
+        "job": job
+    }), 200
+
+@app.route('/api/reanalyze', methods=['POST'])
+def reanalyze():
+    """
+    Re-score stored documents from their saved text, without parsing the PDFs again
+    JSON body: document_hashes (as returned by /api/analyze), or after/limit to
+    page through every stored document; asset_type, method, max_chars,
+    max_pages, pages and sample pick the stored extraction, as on /api/analyze. New results
+    replace cached ones, so later uploads of the same documents get them too.
+    """
+    if text_store is None:
+        return jsonify({
+            "status": "error",
+            "message": "Text store is disabled (set TEXT_STORE_DB)"
+        }), 503
+    
+    data = request.get_json(silent=True) or {}
+    asset_type = data.get('asset_type', 'invoice')
+    method = data.get('method', 'auto')
+    options = {}
+    for name in ('max_chars', 'max_pages', 'sample', 'limit'):
+        value = data.get(name)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value <= 0):
+            return jsonify({
+                "status": "error",
+                "message": f"{name} must be a positive integer"
+            }), 400
+        if value is not None and name != 'limit':
+            options[name] = value
+    try:
+        page_selection = _page_selection_param(data.get('pages'))
+    except AnalysisError as e:
+        return jsonify(e.to_dict()), 400
+    if page_selection is not None:
+        options['page_selection'] = page_selection
+    extraction = extraction_key(method, **options)
+    
+    hashes = data.get('document_hashes')
+    next_after = None
+    if hashes is None:
+        # Backfill mode: the next page of stored documents
+        limit = min(data.get('limit') or 100, BATCH_MAX_ITEMS)
+        hashes = text_store.list_hashes(extraction, str(data.get('after') or ''), limit)
+        next_after = hashes[-1] if len(hashes) == limit else None
+    elif not isinstance(hashes, list) or not all(isinstance(h, str) for h in hashes):
+        return jsonify({
+            "status": "error",
+            "message": "document_hashes must be a list of strings"
+        }), 400
+    elif len(hashes) > BATCH_MAX_ITEMS:
+        return jsonify({
+            "status": "error",
+            "message": f"Batch exceeds maximum of {BATCH_MAX_ITEMS} items"
+        }), 400
+    
+    stored = text_store.get_many(hashes, extraction)
+    results = []
+    for document_hash in hashes:
+        document = stored.get(document_hash)
+        if document is None:
+            results.append({"document_hash": document_hash, "status": "error", "error_code": "not_found",
+                             "message": f"No stored text for this document with extraction '{extraction}'"})
+            continue
+        try:
+            result = _result_from_extraction(document['text'], document['metadata'], asset_type,
+                                             document['truncated'], document_hash, document['pages_processed'])
+        except AnalysisError as e:
+            results.append({"document_hash": document_hash, **e.to_dict()})
+            continue
+        result_cache.put(ResultCache.make_key(document_hash, asset_type, method, **options), result)
+        results.append(result)
+    
+    succeeded = sum(1 for r in results if r['status'] == 'success')
+    return jsonify({
+        "status": "success",
+        "count": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "next_after": next_after,
+        "results": results
+    }), 200
+
+@app.route('/api/risk/portfolio', methods=['POST'])
+def score_portfolio():
+    """
+    Portfolio risk sweep endpoint
+    Accepts {"assets": {"id": [...], "asset_type": [...], "valuation": [...],
+    "due_date": [...], "last_risk": [...]}, "threshold": 5, "as_of": "YYYY-MM-DD",
+    "incremental": true} and returns only the assets whose risk score moved by
+    more than threshold; incremental sweeps re-score only assets whose inputs changed
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or 'assets' not in data:
+        return jsonify({
+            "status": "error",
+            "message": "JSON body with an assets object is required"
+        }), 400
+    
+    threshold = data.get('threshold', 0)
+    if not isinstance(threshold, (int, float)) or threshold < 0:
+        return jsonify({
+            "status": "error",
+            "message": "threshold must be a non-negative number"
+        }), 400
+    
+    from portfolio_scorer import PortfolioError
+    try:
+        result = get_portfolio_scorer().score(data['assets'], threshold, data.get('as_of'),
+                                        incremental=bool(data.get('incremental')))
+    except PortfolioError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+    
+    return jsonify({"status": "success", **result}), 200
 
 if __name__ == '__main__':
     print(f"🚀 MantleForge Risk Analyzer starting on port {PORT}")
     print(f"📊 AI Analysis: Handled by backend (EmbedAPI + Claude)")
+    job_queue.start()
     app.run(host='0.0.0.0', port=PORT, debug=True)
 
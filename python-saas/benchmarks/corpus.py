@@ -0,0 +1,62 @@
+"""
+Benchmark Corpus
+Deterministic PDFs for benchmarks: text-heavy, table-heavy, image-only and corrupt documents
+"""
+import random
+from typing import Dict, List
+
+from tests.fixtures import build_pdf
+
+# Page counts for the full run; quick runs stop at QUICK_PAGE_COUNTS
+PAGE_COUNTS = (1, 10, 100, 1000)
+QUICK_PAGE_COUNTS = (1, 10)
+
+WORDS = ('invoice', 'payment', 'amount', 'due', 'supplier', 'customer', 'contract', 'term', 'interest',
+         'principal', 'collateral', 'maturity', 'asset', 'transfer', 'balance', 'account', 'net', 'days',
+         'agreement', 'party', 'schedule', 'delivery', 'goods', 'services', 'tax', 'total')
+
+
+def _text_page(rng: random.Random, number: int) -> str:
+    lines = [f"Invoice No: INV-{number:05d}", f"Invoice Date: 2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"]
+    for _ in range(40):
+        lines.append(' '.join(rng.choice(WORDS) for _ in range(12)))
+    lines.append(f"Total due: ${rng.randint(100, 999999):,}.{rng.randint(0, 99):02d}")
+    return '\n'.join(lines)
+
+
+def _table_page(rng: random.Random, number: int) -> str:
+    lines = [f"Schedule {number}", "Item  Qty  Unit  Amount"]
+    for row in range(45):
+        qty = rng.randint(1, 500)
+        unit = rng.randint(1, 9999) / 100
+        lines.append(f"SKU-{row:03d}  {qty}  {unit:.2f}  {qty * unit:.2f}")
+    return '\n'.join(lines)
+
+
+def build_corpus(page_counts=PAGE_COUNTS, seed: int = 1234) -> Dict[str, Dict]:
+    """
+    Build the benchmark corpus in memory
+
+    Args:
+        page_counts: Page counts generated for each multi-page kind
+        seed: Random seed; the same seed always yields byte-identical PDFs
+
+    Returns:
+        {name: {'kind': str, 'pages': int, 'pdf': bytes}}
+    """
+    rng = random.Random(seed)
+    corpus: Dict[str, Dict] = {}
+    for pages in page_counts:
+        text_pages: List[str] = [_text_page(rng, i) for i in range(pages)]
+        corpus[f"text-{pages}"] = {'kind': 'text', 'pages': pages,
+                                   'pdf': build_pdf(text_pages, info={'Title': f'Text {pages}'})}
+        table_pages = [_table_page(rng, i) for i in range(pages)]
+        corpus[f"table-{pages}"] = {'kind': 'table', 'pages': pages, 'pdf': build_pdf(table_pages)}
+        corpus[f"image-{pages}"] = {'kind': 'image', 'pages': pages,
+                                    'pdf': build_pdf([''] * pages, image_only=True)}
+
+    valid = corpus[f"text-{page_counts[0]}"]['pdf']
+    corpus['corrupt-truncated'] = {'kind': 'corrupt', 'pages': 0, 'pdf': valid[:len(valid) // 2]}
+    corpus['corrupt-garbage'] = {'kind': 'corrupt', 'pages': 0,
+                                 'pdf': b'%PDF-1.4\n' + bytes(rng.getrandbits(8) for _ in range(4096))}
+    return corpus
@@ -0,0 +1,87 @@
+"""
+Import Time Report
+Cold-start cost of the service: `import app`, the heaviest imports, warm-up and the first request
+
+Usage (from python-saas/):
+    python -m benchmarks.import_time [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter so nothing is cached from the parent
+_PROBE = r"""
+import io, json, os, sys, time
+os.environ.setdefault('USE_BACKEND_AI', 'false')
+os.environ['PDF_SANDBOX'] = 'false'
+os.environ['RESULT_CACHE_SIZE'] = '0'
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+loaded = [name for name in ('PyPDF2', 'pdfplumber', 'pdfminer', 'numpy', 'requests') if name in sys.modules]
+warmup = None
+if sys.argv[1] == 'warm':
+    start = time.perf_counter()
+    app.warm_up(sandbox=False)
+    warmup = time.perf_counter() - start
+from tests.fixtures import build_pdf
+pdf = build_pdf(['Invoice No: INV-1 Invoice Date: 2024-01-02 Total due: $10.00'])
+client = app.app.test_client()
+start = time.perf_counter()
+client.post('/api/analyze', data={'pdf': (io.BytesIO(pdf), 'a.pdf')})
+first = time.perf_counter() - start
+print(json.dumps({'import': imported, 'warmup': warmup, 'first_request': first, 'loaded': loaded}))
+"""
+
+
+def _probe(mode: str) -> Dict:
+    output = subprocess.run([sys.executable, '-c', _PROBE, mode], cwd=HERE, capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def heaviest_imports(limit: int = 10) -> List[tuple]:
+    """(module, cumulative microseconds) for the slowest top-level imports of app"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=HERE,
+                            capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Two-space indent marks imports made directly by app.py
+        if name.startswith('   ') and not name.startswith('    '):
+            rows.append((name.strip(), int(cumulative)))
+    return sorted(rows, key=lambda row: row[1], reverse=True)[:limit]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Cold-start import time report")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per measurement")
+    args = parser.parse_args(argv)
+
+    cold = [_probe('cold') for _ in range(args.runs)]
+    warm = [_probe('warm') for _ in range(args.runs)]
+
+    def median_ms(samples: List[Dict], key: str) -> float:
+        return round(statistics.median(sample[key] for sample in samples) * 1000, 1)
+
+    print(f"import app:                    {median_ms(cold, 'import'):8.1f} ms (median of {args.runs})")
+    print(f"  heavy modules loaded:        {', '.join(cold[0]['loaded']) or 'none'}")
+    print(f"first /api/analyze, cold:      {median_ms(cold, 'first_request'):8.1f} ms")
+    print(f"warm_up():                     {median_ms(warm, 'warmup'):8.1f} ms")
+    print(f"first /api/analyze, warmed up: {median_ms(warm, 'first_request'):8.1f} ms")
+    print("\nSlowest imports made by app.py (cumulative):")
+    for name, micros in heaviest_imports():
+        print(f"  {name:30s} {micros / 1000:8.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
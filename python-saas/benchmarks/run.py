@@ -0,0 +1,211 @@
+"""
+Benchmark Runner
+Measures latency percentiles and throughput for PDF parsing, risk analysis and /api/analyze,
+and compares them against a stored baseline
+
+Usage (from python-saas/):
+    python -m benchmarks.run --quick                 # 1 and 10 page documents
+    python -m benchmarks.run                         # up to 1000 pages
+    python -m benchmarks.run --update-baseline       # record this machine's numbers
+    python -m benchmarks.run --threshold 0.3 --filter parser.auto
+
+Exits with status 1 when any case's p50 latency regressed by more than the
+threshold against the baseline.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.corpus import build_corpus, PAGE_COUNTS, QUICK_PAGE_COUNTS
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Ratios this close to the baseline are noise, whatever the threshold
+MIN_REGRESSION_MS = 0.5
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Linearly interpolated percentile of samples (q in 0..100)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def measure(func: Callable[[], Any], pages: int = 1, min_iterations: int = 3, max_iterations: int = 200,
+            target_seconds: float = 1.0) -> Dict[str, Any]:
+    """
+    Time repeated calls of func
+
+    Runs at least min_iterations and then until target_seconds have passed
+    or max_iterations is reached. Exceptions count as errors but are still
+    timed, since rejecting bad input quickly is part of the work.
+
+    Returns:
+        Iterations, errors, latency percentiles in ms and throughput
+    """
+    samples: List[float] = []
+    errors = 0
+    started = time.perf_counter()
+    while len(samples) < max_iterations:
+        t0 = time.perf_counter()
+        try:
+            func()
+        except Exception:
+            errors += 1
+        samples.append(time.perf_counter() - t0)
+        if len(samples) >= min_iterations and time.perf_counter() - started >= target_seconds:
+            break
+
+    total = sum(samples)
+    return {
+        'iterations': len(samples),
+        'errors': errors,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'mean_ms': round(total / len(samples) * 1000, 3),
+        'docs_per_s': round(len(samples) / total, 2) if total else 0.0,
+        'pages_per_s': round(len(samples) * pages / total, 2) if total else 0.0,
+    }
+
+
+def build_cases(corpus: Dict[str, Dict], quick: bool = False) -> List[Tuple[str, int, Callable[[], Any]]]:
+    """Every (case name, pages, callable) to measure"""
+    # Score locally and without result caching, so numbers reflect the code under test
+    os.environ.setdefault('USE_BACKEND_AI', 'false')
+    os.environ['RESULT_CACHE_SIZE'] = '0'
+    os.environ.pop('RESULT_CACHE_DIR', None)
+
+    from field_extractor import FieldExtractor
+    from pdf_parser import PDFParser
+    from risk_analyzer import RiskAnalyzer
+    from app import app
+
+    # One process, no sandbox: measures the parsers themselves
+    parser = PDFParser(workers=1)
+    analyzer = RiskAnalyzer()
+    extractor = FieldExtractor()
+    client = app.test_client()
+    cases: List[Tuple[str, int, Callable[[], Any]]] = []
+
+    for name, doc in corpus.items():
+        pdf, pages = doc['pdf'], max(doc['pages'], 1)
+        cases.append((f"parser.pypdf2/{name}", pages, lambda pdf=pdf: parser.extract_text_pypdf2(pdf)))
+        cases.append((f"parser.pdfplumber/{name}", pages, lambda pdf=pdf: parser.extract_text_pdfplumber(pdf)))
+        cases.append((f"parser.auto/{name}", pages, lambda pdf=pdf: parser.extract_text(pdf)))
+        cases.append((f"parser.metadata/{name}", pages, lambda pdf=pdf: parser.extract_metadata(pdf)))
+
+    small = QUICK_PAGE_COUNTS[-1]
+    for kind in ('text', 'table'):
+        text = parser.extract_text(corpus[f"{kind}-{small}"]['pdf'])
+        cases.append((f"analyzer.analyze/{kind}-{small}", small,
+                      lambda text=text: analyzer.analyze(text, 'invoice')))
+        cases.append((f"extractor.fields/{kind}-{small}", small, lambda text=text: extractor.extract(text)))
+
+    route_docs = ['text-1', f'text-{small}', f'table-{small}', 'image-1', 'corrupt-truncated']
+    if not quick:
+        route_docs.append(f'text-{PAGE_COUNTS[-2]}')
+    for name in route_docs:
+        doc = corpus[name]
+
+        def post(pdf=doc['pdf']):
+            return client.post('/api/analyze', data={'pdf': (io.BytesIO(pdf), 'bench.pdf')})
+
+        cases.append((f"route.analyze/{name}", max(doc['pages'], 1), post))
+    return cases
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[Dict[str, Any]]:
+    """
+    Compare p50 latency against the baseline
+
+    Returns:
+        One row per case present in both, with ratio and a regressed flag
+    """
+    rows = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base or not base.get('p50_ms'):
+            continue
+        ratio = current['p50_ms'] / base['p50_ms']
+        regressed = ratio > 1 + threshold and current['p50_ms'] - base['p50_ms'] > MIN_REGRESSION_MS
+        rows.append({'case': name, 'baseline_ms': base['p50_ms'], 'current_ms': current['p50_ms'],
+                     'ratio': round(ratio, 3), 'regressed': regressed})
+    return rows
+
+
+def run(quick: bool = False, name_filter: Optional[str] = None, target_seconds: float = 1.0) -> Dict[str, Dict]:
+    """Build the corpus, run every matching case and return results by case name"""
+    corpus = build_corpus(QUICK_PAGE_COUNTS if quick else PAGE_COUNTS)
+    results = {}
+    for name, pages, func in build_cases(corpus, quick):
+        if name_filter and name_filter not in name:
+            continue
+        # Single-page cases repeat enough to get stable percentiles; big documents run a few times
+        results[name] = measure(func, pages, min_iterations=3 if pages < 100 else 1,
+                                target_seconds=target_seconds)
+        stats = results[name]
+        print(f"{name:45s} p50 {stats['p50_ms']:10.2f} ms  p95 {stats['p95_ms']:10.2f} ms  "
+              f"{stats['pages_per_s']:10.1f} pages/s  ({stats['iterations']} runs, {stats['errors']} errors)")
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="PDF/risk pipeline benchmarks")
+    parser.add_argument('--quick', action='store_true', help="Only 1 and 10 page documents")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument('--update-baseline', action='store_true', help="Write results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Allowed p50 slowdown (0.25 = 25%%)")
+    parser.add_argument('--filter', dest='name_filter', help="Only run cases whose name contains this")
+    parser.add_argument('--target-seconds', type=float, default=1.0, help="Time budget per case")
+    parser.add_argument('--output', help="Also write results JSON here")
+    args = parser.parse_args(argv)
+
+    results = run(args.quick, args.name_filter, args.target_seconds)
+    report = {
+        'meta': {'python': platform.python_version(), 'machine': platform.machine(),
+                 'cpus': os.cpu_count(), 'quick': args.quick, 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.update_baseline:
+        baseline = {'meta': report['meta'], 'results': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline['results'] = json.load(f).get('results', {})
+        baseline['results'].update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline first")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f).get('results', {})
+
+    rows = compare(results, baseline, args.threshold)
+    regressions = [row for row in rows if row['regressed']]
+    print(f"\nCompared {len(rows)} cases against baseline (threshold {args.threshold:.0%})")
+    for row in regressions:
+        print(f"REGRESSION {row['case']}: {row['baseline_ms']:.2f} ms -> {row['current_ms']:.2f} ms "
+              f"(x{row['ratio']:.2f})")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
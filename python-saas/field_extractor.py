@@ -0,0 +1,187 @@
+"""
+Field Extractor Module
+Deterministic, single-pass extraction of invoice fields (amount, date, invoice number, IBAN, parties) from PDF text
+"""
+import re
+from datetime import date
+from typing import Optional, Dict, Any, List, Tuple
+
+CURRENCY_SYMBOLS = {'$': 'USD', '€': 'EUR', '£': 'GBP', '¥': 'JPY'}
+
+MONTHS = {name: index for index, names in enumerate([
+    ('jan', 'january'), ('feb', 'february'), ('mar', 'march'), ('apr', 'april'), ('may',),
+    ('jun', 'june'), ('jul', 'july'), ('aug', 'august'), ('sep', 'sept', 'september'),
+    ('oct', 'october'), ('nov', 'november'), ('dec', 'december'),
+], start=1) for name in names}
+
+# How much each field counts towards the document's overall confidence
+FIELD_WEIGHTS = {'amount': 0.4, 'date': 0.2, 'invoice_number': 0.2, 'parties': 0.2}
+
+_NUMBER = r'\d{1,3}(?:[,.]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?'
+_MONTH = r'jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?'
+
+# One alternation so the text is scanned once; the first matching branch wins at each position.
+# Every branch starts at a word start, a currency symbol or a line start, so the leading guard
+# rejects the other offsets (most of the text) before any of the branches is tried
+_FIELDS = re.compile(rf"""
+    (?:(?<!\w)(?=\w)|(?=[$€£¥])|^)
+    (?:
+    (?P<total_label>\b(?:grand\s+total|total\s+(?:amount\s+)?due|amount\s+due|balance\s+due|total)\b)
+  | (?P<date_label>\b(?:invoice\s+date|issue\s+date|date\s+of\s+issue|date)\b\s*:)
+  | (?P<invoice_label>\binvoice\s*(?:no\.?|number|num|\#)\s*[:.]?\s*(?P<invoice_number>(?=[A-Z\-/]*\d)[A-Z0-9][A-Z0-9\-/]{{1,29}}))
+  | (?P<party_label>^[ \t]*(?:bill(?:ed)?\s+to|sold\s+to|ship\s+to|from|seller|buyer|vendor|supplier|customer|client|payee|payer)\s*:[ \t]*(?P<party>[^\n]{{2,80}}))
+  | (?P<iban>\b[A-Z]{{2}}\d{{2}}(?:[ ]?[A-Z0-9]{{4}}){{2,7}}(?:[ ]?[A-Z0-9]{{1,3}})?\b)
+  | (?P<iso_date>\b(?P<iso_y>\d{{4}})-(?P<iso_m>\d{{1,2}})-(?P<iso_d>\d{{1,2}})\b)
+  | (?P<num_date>\b(?P<nd_a>\d{{1,2}})[/.](?P<nd_b>\d{{1,2}})[/.](?P<nd_y>\d{{4}})\b)
+  | (?P<text_date>\b(?:(?P<td_d1>\d{{1,2}})(?:st|nd|rd|th)?\s+(?P<td_m1>{_MONTH})\.?,?\s+(?P<td_y1>\d{{4}})
+                    |(?P<td_m2>{_MONTH})\.?\s+(?P<td_d2>\d{{1,2}})(?:st|nd|rd|th)?,?\s+(?P<td_y2>\d{{4}}))\b)
+  | (?P<money>(?:(?P<symbol>[$€£¥])\s?(?P<symbol_amount>{_NUMBER})
+              |(?P<code>\b(?:USD|EUR|GBP|JPY|CHF|CAD|AUD)\b)\s?(?P<code_amount>{_NUMBER})
+              |(?P<amount_code>{_NUMBER})\s?(?P<trailing_code>\b(?:USD|EUR|GBP|JPY|CHF|CAD|AUD)\b|€)))
+  | (?P<bare_amount>(?<![\w.,/-])(?:{_NUMBER})(?![\w/-]))
+    )
+""", re.IGNORECASE | re.MULTILINE | re.VERBOSE)
+
+
+def _parse_amount(text: str) -> float:
+    """Parse '1,234.56', '1.234,56' or '1234' into a float"""
+    separators = [i for i, ch in enumerate(text) if ch in ',.']
+    if not separators:
+        return float(text)
+    last = separators[-1]
+    # A final separator followed by one or two digits is the decimal point
+    if len(text) - last - 1 in (1, 2):
+        whole = re.sub(r'[,.]', '', text[:last])
+        return float(f"{whole}.{text[last + 1:]}")
+    return float(re.sub(r'[,.]', '', text))
+
+
+def _make_date(year: int, month: int, day: int) -> Optional[str]:
+    try:
+        return date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+
+def _iban_valid(iban: str) -> bool:
+    """ISO 13616 mod-97 check"""
+    iban = iban.replace(' ', '').upper()
+    if not 15 <= len(iban) <= 34:
+        return False
+    digits = ''.join(str(int(ch, 36)) for ch in iban[4:] + iban[:4])
+    return int(digits) % 97 == 1
+
+
+class FieldExtractor:
+    def extract(self, text: str) -> Dict[str, Any]:
+        """
+        Extract invoice fields from text in a single regex pass
+
+        Args:
+            text: Text from PDFParser
+
+        Returns:
+            Dictionary with amount, currency, date, invoice_number, iban and
+            parties (None / [] when not found), field_confidence per field
+            and an overall confidence between 0 and 1
+        """
+        labeled_amounts: List[Tuple[float, Optional[str]]] = []
+        currency_amounts: List[Tuple[float, Optional[str]]] = []
+        labeled_dates: List[Tuple[str, float]] = []
+        dates: List[Tuple[str, float]] = []
+        invoice_numbers: List[str] = []
+        ibans: List[str] = []
+        parties: List[str] = []
+        # Set by a label, consumed by the next value of that kind
+        expect_amount = expect_date = False
+
+        for match in _FIELDS.finditer(text or ''):
+            group = match.group
+            if group('total_label'):
+                expect_amount = True
+            elif group('date_label'):
+                expect_date = True
+            elif group('invoice_label'):
+                invoice_numbers.append(group('invoice_number'))
+            elif group('party_label'):
+                parties.append(group('party').strip())
+            elif group('iban'):
+                if _iban_valid(group('iban')):
+                    ibans.append(group('iban').replace(' ', '').upper())
+            elif group('money') or group('bare_amount'):
+                if group('money'):
+                    number = group('symbol_amount') or group('code_amount') or group('amount_code')
+                    symbol = group('symbol') or group('code') or group('trailing_code')
+                    currency = CURRENCY_SYMBOLS.get(symbol, symbol.upper())
+                else:
+                    number, currency = group('bare_amount'), None
+                amount = _parse_amount(number)
+                if expect_amount:
+                    labeled_amounts.append((amount, currency))
+                    expect_amount = False
+                elif currency:
+                    currency_amounts.append((amount, currency))
+            else:
+                parsed = self._match_date(match)
+                if parsed is None:
+                    continue
+                if expect_date:
+                    labeled_dates.append(parsed)
+                    expect_date = False
+                else:
+                    dates.append(parsed)
+
+        fields: Dict[str, Any] = {'amount': None, 'currency': None, 'date': None, 'invoice_number': None,
+                                  'iban': None, 'parties': []}
+        confidence: Dict[str, float] = {}
+
+        if labeled_amounts:
+            # The last labeled figure is usually the grand total, after subtotals and tax
+            fields['amount'], fields['currency'] = labeled_amounts[-1]
+            confidence['amount'] = 0.95 if fields['currency'] else 0.85
+        elif currency_amounts:
+            fields['amount'], fields['currency'] = max(currency_amounts)
+            confidence['amount'] = 0.6
+        if fields['currency'] is None and currency_amounts:
+            fields['currency'] = currency_amounts[0][1]
+
+        if labeled_dates or dates:
+            fields['date'], date_confidence = (labeled_dates or dates)[0]
+            confidence['date'] = min(1.0, date_confidence + (0.2 if labeled_dates else 0))
+        if invoice_numbers:
+            fields['invoice_number'] = invoice_numbers[0]
+            confidence['invoice_number'] = 0.9
+        if ibans:
+            fields['iban'] = ibans[0]
+            confidence['iban'] = 0.99
+        if parties:
+            fields['parties'] = list(dict.fromkeys(parties))
+            confidence['parties'] = 0.85
+
+        fields['field_confidence'] = confidence
+        fields['confidence'] = round(sum(weight * confidence.get(name, 0.0)
+                                         for name, weight in FIELD_WEIGHTS.items()), 4)
+        return fields
+
+    @staticmethod
+    def _match_date(match) -> Optional[Tuple[str, float]]:
+        """Normalize a date match to (ISO date, confidence)"""
+        group = match.group
+        if group('iso_date'):
+            value = _make_date(int(group('iso_y')), int(group('iso_m')), int(group('iso_d')))
+            return (value, 0.8) if value else None
+        if group('num_date'):
+            a, b, year = int(group('nd_a')), int(group('nd_b')), int(group('nd_y'))
+            if a > 12:
+                value, confidence = _make_date(year, b, a), 0.75
+            elif b > 12:
+                value, confidence = _make_date(year, a, b), 0.75
+            else:
+                # Day and month are ambiguous; read it day-first
+                value, confidence = _make_date(year, b, a), 0.5
+            return (value, confidence) if value else None
+        day = group('td_d1') or group('td_d2')
+        month = MONTHS.get((group('td_m1') or group('td_m2')).lower().rstrip('.'))
+        year = group('td_y1') or group('td_y2')
+        value = _make_date(int(year), month, int(day)) if month else None
+        return (value, 0.8) if value else None
@@ -0,0 +1,77 @@
+"""
+Fingerprint Store Module
+SQLite store of per-asset input fingerprints and last scores, so unchanged assets can skip re-scoring
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlite_files import chunked, connect, open_db
+
+
+def make_fingerprint(inputs: Dict[str, Any]) -> str:
+    """Stable hex SHA-256 over JSON-serializable scoring inputs"""
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class FingerprintStore:
+    def __init__(self, db_path: str):
+        """
+        Initialize fingerprint store
+
+        Args:
+            db_path: SQLite file; shared safely by several worker processes.
+                Stored scores are trusted on later sweeps, so a missing
+                directory is created 0o700 and the file 0o600
+
+        Raises:
+            OSError: if db_path is a symlink or belongs to another user
+        """
+        self.db_path = db_path
+        open_db(db_path,
+                "CREATE TABLE IF NOT EXISTS fingerprints ("
+                " asset_id TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, result TEXT, updated_at REAL)")
+
+    @classmethod
+    def from_env(cls) -> Optional['FingerprintStore']:
+        """Build a store at RISK_FINGERPRINT_DB; None (incremental sweeps re-score everything) when it is not set"""
+        path = os.getenv("RISK_FINGERPRINT_DB")
+        if not path:
+            return None
+        return cls(path)
+
+    def get_many(self, asset_ids: Iterable[Any]) -> Dict[str, Tuple[str, Any]]:
+        """
+        Look up stored fingerprints
+
+        Returns:
+            {asset_id (as str): (fingerprint, result)} for the ids that are stored
+        """
+        ids = list(dict.fromkeys(str(asset_id) for asset_id in asset_ids))
+        found: Dict[str, Tuple[str, Any]] = {}
+        with connect(self.db_path) as conn:
+            for chunk in chunked(ids):
+                rows = conn.execute(
+                    f"SELECT asset_id, fingerprint, result FROM fingerprints"
+                    f" WHERE asset_id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for asset_id, fingerprint, result in rows:
+                    found[asset_id] = (fingerprint, json.loads(result) if result is not None else None)
+        return found
+
+    def put_many(self, rows: List[Tuple[Any, str, Any]]) -> None:
+        """Store (asset_id, fingerprint, result) rows, replacing earlier ones"""
+        now = time.time()
+        with connect(self.db_path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO fingerprints (asset_id, fingerprint, result, updated_at)"
+                " VALUES (?, ?, ?, ?)",
+                [(str(asset_id), fingerprint, json.dumps(result), now) for asset_id, fingerprint, result in rows]
+            )
+
+    def clear(self) -> None:
+        """Forget every fingerprint, forcing a full re-score"""
+        with connect(self.db_path) as conn:
+            conn.execute("DELETE FROM fingerprints")
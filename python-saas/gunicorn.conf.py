@@ -0,0 +1,98 @@
+"""
+Gunicorn Configuration
+Production serving for the Python SaaS: `gunicorn -c gunicorn.conf.py app:app`, tuned via GUNICORN_* variables
+"""
+import glob
+import os
+import shutil
+import tempfile
+
+cores = os.cpu_count() or 1
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', 5000)}")
+
+# 'gthread' (default) or 'sync'; 'gevent' / 'eventlet' also work if installed.
+# Parsing runs in sandbox processes, so request threads mostly wait on them and on the backend
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("GUNICORN_WORKERS", max(2, cores)))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+
+# Each worker has its own parse sandbox; split the cores between workers so the total
+# number of parsing processes stays close to the core count. Sandboxed documents are
+# parsed serially, so PDF_PARALLEL_WORKERS only matters with PDF_SANDBOX=false
+os.environ.setdefault("PDF_SANDBOX_WORKERS", str(max(1, cores // workers)))
+
+# Directories the master creates for this run (mkdtemp: 0o700, unpredictable name);
+# workers trust what they find there, so no other local user may be able to write to them
+_run_dirs = []
+for _name, _prefix in (
+    # Workers report metrics through files here, so /api/metrics covers all of them
+    ("METRICS_DIR", "mantleforge-metrics-"),
+    # Identical uploads arriving at different workers at once are parsed by only one of them
+    ("SINGLE_FLIGHT_DIR", "mantleforge-inflight-"),
+):
+    if not os.environ.get(_name):
+        os.environ[_name] = tempfile.mkdtemp(prefix=_prefix)
+        _run_dirs.append(os.environ[_name])
+
+# Import the app (parsers, analyzers, config) once in the master; workers fork from it
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Import and exercise the PDF engines before serving (see app.warm_up)
+warmup = os.getenv("GUNICORN_WARMUP", "true").lower() == "true"
+
+# Recycle workers to bound slow memory growth from parser caches
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+# A request can legitimately spend the whole sandbox time limit parsing
+_parse_timeout = float(os.getenv("PDF_SANDBOX_TIMEOUT", 60))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", _parse_timeout + 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", _parse_timeout + 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = os.getenv("GUNICORN_ERROR_LOG", "-")
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    """Drop metric files left by a previous run so counters start from zero"""
+    metrics_dir = os.environ["METRICS_DIR"]
+    os.makedirs(metrics_dir, mode=0o700, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, "*.json")):
+        os.remove(path)
+
+    # Loaded once here, the engines are shared by every forked worker
+    if preload_app and warmup:
+        import app
+        server.log.info("Warm-up (master): %s", app.warm_up(sandbox=False))
+
+
+def post_worker_init(worker):
+    """Start this worker's job threads and parse sandbox processes before it accepts requests"""
+    import app
+    # Picks up jobs left queued or running by workers of a previous run
+    app.job_queue.start()
+    if warmup:
+        worker.log.info("Warm-up (worker %s): %s", worker.pid, app.warm_up())
+
+
+def worker_exit(server, worker):
+    """Stop this worker's parse sandbox processes and fold its metrics into the archive"""
+    import app
+    if app.parse_sandbox is not None:
+        app.parse_sandbox.shutdown()
+    app.metrics.registry.retire()
+
+
+def child_exit(server, worker):
+    """Archive the metrics of workers that died without running worker_exit (e.g. killed on timeout)"""
+    import metrics
+    metrics.registry.archive_exited()
+
+
+def on_exit(server):
+    """Remove the per-run directories created above"""
+    for path in _run_dirs:
+        shutil.rmtree(path, ignore_errors=True)
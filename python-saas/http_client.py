@@ -0,0 +1,188 @@
+"""
+HTTP Client Module
+Pooled, keep-alive JSON client with timeouts, jittered retries and a per-host circuit breaker
+"""
+import os
+import random
+import threading
+import time
+from typing import Optional, Dict, Any, Tuple
+from urllib.parse import urlsplit
+
+# Responses worth another attempt; other 4xx mean the request itself is wrong
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitOpen(Exception):
+    """Raised without a request when a host's circuit breaker is open"""
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        """
+        Initialize circuit breaker
+
+        Args:
+            failure_threshold: Consecutive failed calls that open the circuit
+            reset_timeout: Seconds the circuit stays open before one trial call is let through
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """'closed', 'open' or 'half_open'"""
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half_open'
+            return 'open'
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in half-open state only one trial call is allowed"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class HTTPClient:
+    def __init__(self, connect_timeout: float = 3, read_timeout: float = 30, retries: int = 2,
+                 backoff: float = 0.25, backoff_max: float = 4, pool_size: int = 10,
+                 failure_threshold: int = 5, reset_timeout: float = 30):
+        """
+        Initialize HTTP client
+
+        Args:
+            connect_timeout: Seconds to establish a connection
+            read_timeout: Seconds to wait for the response
+            retries: Extra attempts after a connection error, timeout or retryable status
+            backoff: Base delay; attempt n sleeps a random time up to backoff * 2**n
+            backoff_max: Upper bound for a single backoff sleep
+            pool_size: Keep-alive connections kept per host
+            failure_threshold: Failed calls (after retries) before a host's circuit opens
+            reset_timeout: Seconds before an open circuit allows a trial call
+        """
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._session: Optional['requests.Session'] = None
+        self._session_pid: Optional[int] = None
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'HTTPClient':
+        """Build a client from HTTP_* environment variables"""
+        return cls(
+            connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", 3)),
+            read_timeout=float(os.getenv("HTTP_READ_TIMEOUT", 30)),
+            retries=int(os.getenv("HTTP_RETRIES", 2)),
+            backoff=float(os.getenv("HTTP_BACKOFF", 0.25)),
+            pool_size=int(os.getenv("HTTP_POOL_SIZE", 10)),
+            failure_threshold=int(os.getenv("HTTP_BREAKER_THRESHOLD", 5)),
+            reset_timeout=float(os.getenv("HTTP_BREAKER_RESET", 30)),
+        )
+
+    @property
+    def session(self) -> 'requests.Session':
+        """Shared session, recreated in a forked child so sockets are never shared across processes"""
+        # requests is imported on first use to keep service start-up fast
+        import requests
+        from requests.adapters import HTTPAdapter
+        with self._lock:
+            if self._session is None or self._session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+                self._session_pid = os.getpid()
+            return self._session
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        """Circuit breaker for the URL's host"""
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[host]
+
+    def post_json(self, url: str, payload: Dict[str, Any],
+                  headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        POST a JSON payload and decode the JSON response
+
+        Returns:
+            Decoded response body
+
+        Raises:
+            CircuitOpen: if the host has been failing and is not being retried yet
+            requests.RequestException: once retries are exhausted, or at once for non-retryable HTTP errors
+            ValueError: if the response body is not JSON
+        """
+        import requests
+        breaker = self.breaker(url)
+        if not breaker.allow():
+            raise CircuitOpen(f"Circuit open for {urlsplit(url).netloc}")
+
+        # A half-open trial gets a single attempt
+        attempts = 1 if breaker.state == 'half_open' else self.retries + 1
+        for attempt in range(attempts):
+            try:
+                response = self.session.post(url, json=payload, headers=headers, timeout=self.timeout)
+                if response.status_code in RETRY_STATUSES:
+                    response.raise_for_status()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                if attempt + 1 >= attempts:
+                    breaker.record_failure()
+                    raise
+                time.sleep(random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt)))
+                continue
+            except BaseException:
+                # Any other failure (e.g. a broken chunked body) still ends a half-open trial
+                breaker.record_failure()
+                raise
+
+            # The host answered, so it is healthy even if this request was rejected
+            breaker.record_success()
+            response.raise_for_status()
+            return response.json()
+
+
+_default_client: Optional[HTTPClient] = None
+_default_lock = threading.Lock()
+
+def default_client() -> HTTPClient:
+    """Process-wide client, so every caller shares one connection pool"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HTTPClient.from_env()
+        return _default_client
@@ -0,0 +1,264 @@
+"""
+Job Queue Module
+Bounded in-process worker queue for long-running analyses, with optional SQLite persistence
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Optional, Dict, Any
+
+from sqlite_files import connect, open_db
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_SUCCEEDED = 'succeeded'
+STATUS_FAILED = 'failed'
+
+
+class QueueFull(Exception):
+    """Raised by submit when the queue is at capacity"""
+    pass
+
+
+class JobQueue:
+    def __init__(self, handler: Callable[[Dict[str, Any]], Dict[str, Any]], workers: int = 2,
+                 max_queue: int = 100, db_path: Optional[str] = None, result_ttl: float = 3600,
+                 cleanup: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        Initialize job queue
+
+        Args:
+            handler: Runs one job payload and returns its result; exceptions mark the job failed
+            workers: Number of worker threads
+            max_queue: Queued (not yet running) jobs allowed before submit raises QueueFull
+            db_path: SQLite file for job state (None keeps jobs in memory only); it holds
+                job payloads, so it is created 0o600 like the other stores
+            result_ttl: Seconds finished jobs are kept before being pruned
+            cleanup: Called with the payload once a job finishes, e.g. to remove its input file
+        """
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self.db_path = db_path
+        self.result_ttl = result_ttl
+        self.cleanup = cleanup
+        self._queue: "queue.Queue[str]" = queue.Queue(maxsize=max_queue)
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._payloads: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+        if self.db_path:
+            self._init_db()
+
+    @classmethod
+    def from_env(cls, handler: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 cleanup: Optional[Callable[[Dict[str, Any]], None]] = None) -> 'JobQueue':
+        """Build a queue from JOBS_* environment variables"""
+        return cls(
+            handler,
+            workers=int(os.getenv("JOBS_WORKERS", 2)),
+            max_queue=int(os.getenv("JOBS_MAX_QUEUE", 100)),
+            db_path=os.getenv("JOBS_DB_PATH") or None,
+            result_ttl=float(os.getenv("JOBS_RESULT_TTL", 3600)),
+            cleanup=cleanup,
+        )
+
+    def submit(self, payload: Dict[str, Any]) -> str:
+        """
+        Queue a job
+
+        Returns:
+            The new job id
+
+        Raises:
+            QueueFull: if max_queue jobs are already waiting
+        """
+        self.start()
+        self._prune()
+        job_id = uuid.uuid4().hex
+        job = {'job_id': job_id, 'status': STATUS_QUEUED, 'created_at': time.time(),
+               'started_at': None, 'finished_at': None, 'result': None, 'error': None}
+        with self._lock:
+            self._jobs[job_id] = job
+            self._payloads[job_id] = payload
+        self._save(job, payload)
+        try:
+            self._queue.put_nowait(job_id)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job_id]
+                del self._payloads[job_id]
+            self._delete(job_id)
+            raise QueueFull(f"Job queue is full ({self.max_queue} jobs waiting)")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the job state, falling back to SQLite for jobs owned by another process"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        return self._load(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and job counts by status"""
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+        return {'queued': self._queue.qsize(), 'max_queue': self.max_queue,
+                'workers': self.workers, 'jobs': counts}
+
+    def start(self) -> None:
+        """
+        Start the worker threads and requeue jobs orphaned by exited processes
+        Call once per serving process, after any pre-fork (gunicorn's
+        post_worker_init); submit also starts the queue if nothing did.
+        """
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        if self.db_path:
+            self._recover()
+
+    def _worker(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run(job_id)
+            except sqlite3.Error as e:
+                print(f"Warning: Job state could not be persisted: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id: str) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            payload = self._payloads.get(job_id)
+            if job is None or payload is None:
+                return
+            job['status'] = STATUS_RUNNING
+            job['started_at'] = time.time()
+        self._save(job)
+
+        try:
+            result = self.handler(payload)
+            update = {'status': STATUS_SUCCEEDED, 'result': result}
+        except Exception as e:
+            update = {'status': STATUS_FAILED, 'error': str(e)}
+        finally:
+            if self.cleanup:
+                try:
+                    self.cleanup(payload)
+                except Exception as e:
+                    print(f"Warning: Job cleanup failed: {e}")
+
+        with self._lock:
+            job.update(update, finished_at=time.time())
+            self._payloads.pop(job_id, None)
+        self._save(job)
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than result_ttl"""
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job['finished_at'] is not None and job['finished_at'] < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+        if self.db_path:
+            with connect(self.db_path) as conn:
+                conn.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,))
+
+    # SQLite persistence
+
+    def _init_db(self) -> None:
+        open_db(self.db_path,
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " job_id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT, owner INTEGER,"
+                " result TEXT, error TEXT, created_at REAL, started_at REAL, finished_at REAL)")
+
+    def _save(self, job: Dict[str, Any], payload: Optional[Dict[str, Any]] = None) -> None:
+        if not self.db_path:
+            return
+        with connect(self.db_path) as conn:
+            if payload is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO jobs (job_id, status, payload, owner, created_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (job['job_id'], job['status'], json.dumps(payload), os.getpid(), job['created_at'])
+                )
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, result = ?, error = ?, started_at = ?, finished_at = ?"
+                    " WHERE job_id = ?",
+                    (job['status'], json.dumps(job['result']) if job['result'] is not None else None,
+                     job['error'], job['started_at'], job['finished_at'], job['job_id'])
+                )
+
+    def _delete(self, job_id: str) -> None:
+        if not self.db_path:
+            return
+        with connect(self.db_path) as conn:
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not self.db_path:
+            return None
+        with connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT job_id, status, result, error, created_at, started_at, finished_at"
+                " FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'job_id': row[0], 'status': row[1], 'result': json.loads(row[2]) if row[2] else None,
+                'error': row[3], 'created_at': row[4], 'started_at': row[5], 'finished_at': row[6]}
+
+    def _recover(self) -> None:
+        """Requeue jobs left queued or running by a process that has exited"""
+        with connect(self.db_path) as conn:
+            rows = conn.execute(
+                "SELECT job_id, payload, owner, created_at FROM jobs WHERE status IN (?, ?)",
+                (STATUS_QUEUED, STATUS_RUNNING)
+            ).fetchall()
+        for job_id, payload, owner, created_at in rows:
+            if self._queue.full():
+                break
+            if owner is not None and _pid_alive(owner):
+                continue
+            # Claim the job so sibling workers recovering at the same time skip it
+            with connect(self.db_path) as conn:
+                claimed = conn.execute(
+                    "UPDATE jobs SET owner = ?, status = ? WHERE job_id = ? AND owner IS ?",
+                    (os.getpid(), STATUS_QUEUED, job_id, owner)
+                ).rowcount
+            if not claimed:
+                continue
+            with self._lock:
+                self._jobs[job_id] = {'job_id': job_id, 'status': STATUS_QUEUED, 'created_at': created_at,
+                                      'started_at': None, 'finished_at': None, 'result': None, 'error': None}
+                self._payloads[job_id] = json.loads(payload)
+            self._queue.put_nowait(job_id)
+
+
+def _pid_alive(pid: int) -> bool:
+    """Whether a process with this pid is still running"""
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,390 @@
+"""
+Metrics Module
+Counters and latency histograms in Prometheus text format, aggregated across worker processes
+"""
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; archiving then runs without a lock
+    fcntl = None
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = tuple(1024 * 4 ** power for power in range(10))  # 1KB .. 256MB
+PAGES_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+# Totals of exited processes, merged so the directory holds one file per live process plus this one
+ARCHIVE_FILE = 'archive.json'
+ARCHIVE_LOCK = 'archive.lock'
+
+
+def _label_key(labels: Dict[str, Any]) -> str:
+    """Labels rendered as they appear between the braces, e.g. stage="pdfplumber" """
+    def escape(value: Any) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(labels[name])}"' for name in sorted(labels))
+
+
+def _running(pid: int) -> bool:
+    """Whether a process with this pid exists"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists but belongs to someone else
+        return True
+    return True
+
+
+# Every registry in the process, so a forked child can drop the totals it inherited
+_registries: 'weakref.WeakSet[MetricsRegistry]' = weakref.WeakSet()
+
+
+def _reset_after_fork() -> None:
+    """
+    Start each registry in a forked child from zero
+    The parent keeps reporting what it recorded before the fork (warm-up in a
+    preloading master, say); a child that kept those totals would publish them
+    again in its own file and in the archive once it exits.
+    """
+    for registry in list(_registries):
+        registry._lock = threading.Lock()
+        registry._counters, registry._histograms = {}, {}
+        registry._dirty = False
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class MetricsRegistry:
+    def __init__(self, metrics_dir: Optional[str] = None, flush_interval: float = 1.0):
+        """
+        Initialize metrics registry
+
+        Args:
+            metrics_dir: Directory shared by all worker processes; each writes its
+                totals there and a scrape sums them. None keeps metrics in-process.
+                Created 0o700 if missing; it must not be writable by other users
+            flush_interval: Seconds between writes of this process's totals
+                (0 writes on every update)
+        """
+        self.metrics_dir = metrics_dir
+        self.flush_interval = flush_interval
+        self._definitions: Dict[str, Tuple[str, str, Tuple[float, ...]]] = {}
+        self._counters: Dict[str, Dict[str, float]] = {}
+        # name -> label key -> [per-bucket counts..., +Inf count, sum]
+        self._histograms: Dict[str, Dict[str, List[float]]] = {}
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._file: Optional[str] = None
+        self._dirty = False
+        self._flusher_pid: Optional[int] = None
+        self._retired_pid: Optional[int] = None
+        _registries.add(self)
+
+        if self.metrics_dir:
+            os.makedirs(self.metrics_dir, mode=0o700, exist_ok=True)
+            st = os.stat(self.metrics_dir)
+            if (hasattr(os, 'getuid') and st.st_uid != os.getuid()) or st.st_mode & 0o022:
+                raise PermissionError(f"Metrics directory {self.metrics_dir} must be private to this user")
+
+    @classmethod
+    def from_env(cls) -> 'MetricsRegistry':
+        """Build a registry from METRICS_DIR and METRICS_FLUSH_INTERVAL"""
+        return cls(
+            metrics_dir=os.getenv("METRICS_DIR") or None,
+            flush_interval=float(os.getenv("METRICS_FLUSH_INTERVAL", 1.0)),
+        )
+
+    def counter(self, name: str, help_text: str) -> 'Counter':
+        self._definitions[name] = ('counter', help_text, ())
+        return Counter(self, name)
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = SECONDS_BUCKETS) -> 'Histogram':
+        self._definitions[name] = ('histogram', help_text, tuple(sorted(buckets)))
+        return Histogram(self, name)
+
+    def inc(self, name: str, amount: float = 1, labels: Optional[Dict[str, Any]] = None) -> None:
+        key = _label_key(labels or {})
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+        self._maybe_flush()
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None) -> None:
+        buckets = self._definitions[name][2]
+        key = _label_key(labels or {})
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0.0] * (len(buckets) + 2)
+            index = len(buckets)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    index = i
+                    break
+            counts[index] += 1
+            counts[-1] += value
+        self._maybe_flush()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """This process's totals, as JSON-serializable data"""
+        with self._lock:
+            return {
+                'counters': {name: dict(series) for name, series in self._counters.items()},
+                'histograms': {name: {key: list(counts) for key, counts in series.items()}
+                               for name, series in self._histograms.items()},
+            }
+
+    def drain(self) -> Dict[str, Any]:
+        """Return this process's totals and reset them; used to ship a worker's metrics to its parent"""
+        with self._lock:
+            data = {'counters': self._counters, 'histograms': self._histograms}
+            self._counters, self._histograms = {}, {}
+        return data
+
+    def merge(self, data: Optional[Dict[str, Any]]) -> None:
+        """Add totals recorded elsewhere (see drain) into this process's totals"""
+        if not data:
+            return
+        with self._lock:
+            self._add(self._counters, self._histograms, data)
+        self._maybe_flush()
+
+    @staticmethod
+    def _add(counters: Dict[str, Dict[str, float]], histograms: Dict[str, Dict[str, List[float]]],
+             data: Dict[str, Any]) -> None:
+        for name, series in data.get('counters', {}).items():
+            target = counters.setdefault(name, {})
+            for key, value in series.items():
+                target[key] = target.get(key, 0) + value
+        for name, series in data.get('histograms', {}).items():
+            target = histograms.setdefault(name, {})
+            for key, counts in series.items():
+                existing = target.get(key)
+                if existing is None or len(existing) != len(counts):
+                    target[key] = list(counts)
+                else:
+                    target[key] = [a + b for a, b in zip(existing, counts)]
+
+    def _maybe_flush(self) -> None:
+        if not self.metrics_dir:
+            return
+        if self.flush_interval <= 0:
+            self.flush()
+            return
+        self._dirty = True
+        # Idle workers must still publish their last updates, so a thread writes them
+        if self._flusher_pid != os.getpid():
+            with self._lock:
+                if self._flusher_pid == os.getpid():
+                    return
+                self._flusher_pid = os.getpid()
+            threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+
+    def _flush_loop(self) -> None:
+        while self.metrics_dir and self._flusher_pid == os.getpid():
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                self.flush()
+
+    def flush(self) -> None:
+        """Write this process's totals to the metrics directory"""
+        if not self.metrics_dir or self._retired_pid == os.getpid():
+            return
+        with self._lock:
+            # A forked child starts its own file instead of overwriting its parent's
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._file = os.path.join(self.metrics_dir, f"{self._pid}-{uuid.uuid4().hex[:8]}.json")
+            self._dirty = False
+        data = self.snapshot()
+        fd, tmp_path = tempfile.mkstemp(dir=self.metrics_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self._file)
+        except OSError as e:
+            print(f"Warning: Could not write metrics: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def collect(self) -> Dict[str, Any]:
+        """Totals summed over every process writing to the metrics directory (or just this one)"""
+        if not self.metrics_dir:
+            return self.snapshot()
+        self.flush()
+        counters: Dict[str, Dict[str, float]] = {}
+        histograms: Dict[str, Dict[str, List[float]]] = {}
+        # Exited processes live on in the archive, so counters never go backwards;
+        # the shared lock keeps a file from being counted both there and on its own
+        with self._archive_lock(shared=True):
+            for filename in os.listdir(self.metrics_dir):
+                if not filename.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(self.metrics_dir, filename)) as f:
+                        self._add(counters, histograms, json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return {'counters': counters, 'histograms': histograms}
+
+    def retire(self) -> None:
+        """
+        Fold this process's totals, and those of other processes that have
+        exited, into the archive file and delete their own files
+        Call when a worker exits; gunicorn recycles workers, so otherwise the
+        directory (and the work done per scrape) would grow without bound.
+        This process writes no more metric files afterwards.
+        """
+        if not self.metrics_dir:
+            return
+        self.flush()
+        self._retired_pid = os.getpid()
+        self.archive_exited()
+
+    def archive_exited(self) -> None:
+        """Merge the files of processes that are no longer running (and of this one, once retired) into the archive"""
+        if not self.metrics_dir:
+            return
+        archive_path = os.path.join(self.metrics_dir, ARCHIVE_FILE)
+        with self._archive_lock(shared=False):
+            exited = []
+            for filename in os.listdir(self.metrics_dir):
+                if not filename.endswith('.json') or filename == ARCHIVE_FILE:
+                    continue
+                pid = filename.split('-', 1)[0]
+                if pid.isdigit() and (int(pid) == self._retired_pid or not _running(int(pid))):
+                    exited.append(os.path.join(self.metrics_dir, filename))
+            if not exited:
+                return
+
+            counters: Dict[str, Dict[str, float]] = {}
+            histograms: Dict[str, Dict[str, List[float]]] = {}
+            for path in [archive_path] + exited:
+                try:
+                    with open(path) as f:
+                        self._add(counters, histograms, json.load(f))
+                except (OSError, ValueError):
+                    continue
+            fd, tmp_path = tempfile.mkstemp(dir=self.metrics_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump({'counters': counters, 'histograms': histograms}, f)
+                os.replace(tmp_path, archive_path)
+            except OSError as e:
+                print(f"Warning: Could not archive metrics: {e}")
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                return
+            for path in exited:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    @contextmanager
+    def _archive_lock(self, shared: bool) -> Iterator[None]:
+        """Readers share the lock; archiving holds it exclusively while it merges and deletes files"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.metrics_dir, ARCHIVE_LOCK), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        data = self.collect()
+        lines = []
+        for name in sorted(set(data['counters']) | set(data['histograms']) | set(self._definitions)):
+            kind, help_text, buckets = self._definitions.get(
+                name, ('histogram' if name in data['histograms'] else 'counter', '', ()))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == 'counter':
+                for key, value in sorted(data['counters'].get(name, {}).items()):
+                    lines.append(f"{name}{{{key}}} {_format_value(value)}" if key
+                                 else f"{name} {_format_value(value)}")
+                continue
+            for key, counts in sorted(data['histograms'].get(name, {}).items()):
+                prefix = f"{key}," if key else ''
+                cumulative = 0.0
+                for bound, count in zip(tuple(buckets) + (math.inf,), counts[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{prefix}le="{_format_value(bound)}"}} {_format_value(cumulative)}')
+                suffix = f"{{{key}}}" if key else ''
+                lines.append(f"{name}_sum{suffix} {_format_value(counts[-1])}")
+                lines.append(f"{name}_count{suffix} {_format_value(cumulative)}")
+        return '\n'.join(lines) + '\n'
+
+
+class Counter:
+    def __init__(self, registry: MetricsRegistry, name: str):
+        self.registry = registry
+        self.name = name
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        self.registry.inc(self.name, amount, labels)
+
+
+class Histogram:
+    def __init__(self, registry: MetricsRegistry, name: str):
+        self.registry = registry
+        self.name = name
+
+    def observe(self, value: float, **labels: Any) -> None:
+        self.registry.observe(self.name, value, labels)
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Observe the duration of the with-block, whether or not it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+# Shared by every module in the process; the app exposes it on /api/metrics
+registry = MetricsRegistry.from_env()
+
+STAGE_SECONDS = registry.histogram(
+    'mantleforge_stage_seconds', 'Time spent in each analysis stage')
+UPLOAD_BYTES = registry.histogram(
+    'mantleforge_upload_bytes', 'Size of uploaded PDFs', BYTES_BUCKETS)
+PDF_PAGES = registry.histogram(
+    'mantleforge_pdf_pages', 'Pages extracted per document', PAGES_BUCKETS)
+PDF_FALLBACKS = registry.counter(
+    'mantleforge_pdf_fallbacks_total', 'Extraction handed to another engine, by reason')
+ERRORS = registry.counter(
+    'mantleforge_errors_total', 'Failures by stage and error class')
+REQUESTS = registry.counter(
+    'mantleforge_requests_total', 'Handled requests by endpoint and HTTP status')
+REQUEST_SECONDS = registry.histogram(
+    'mantleforge_request_seconds', 'End-to-end request latency by endpoint')
@@ -0,0 +1,333 @@
+"""
+Parse Sandbox Module
+Runs PDF parsing in resource-limited worker processes that are killed and replaced when a document misbehaves
+"""
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import metrics
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; only the wall-clock timeout applies there
+    resource = None
+
+
+class SandboxError(Exception):
+    """A document that exceeded a sandbox limit or crashed its worker"""
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+    def __reduce__(self):
+        return (SandboxError, (self.code, self.message))
+
+
+class _CPULimitExceeded(BaseException):
+    """Raised inside a worker by SIGXCPU; BaseException so parser code cannot swallow it"""
+    pass
+
+
+def _on_cpu_limit(signum, frame):
+    raise _CPULimitExceeded()
+
+
+def _set_memory_limit(memory_bytes: int) -> None:
+    if resource is None or not memory_bytes:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        memory_bytes = min(memory_bytes, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, hard))
+
+
+def _set_cpu_limit(cpu_seconds: Optional[float]) -> None:
+    """
+    Allow cpu_seconds more CPU time from now (None lifts the limit)
+    RLIMIT_CPU counts the whole process lifetime, so the soft limit is
+    moved forward for each task; the hard limit is left untouched.
+    """
+    if resource is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if cpu_seconds is None:
+        soft = hard
+    else:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _sandbox_main(conn, memory_bytes: int, cpu_seconds: float) -> None:
+    """
+    Worker process loop
+    The worker never exits on its own while the parent may still be reading;
+    the parent retires it after max_tasks documents or a limit error.
+    """
+    _set_memory_limit(memory_bytes)
+    # Metrics recorded while parsing go back with each reply and are counted by the parent
+    metrics.registry.metrics_dir = None
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError) as e:
+            return
+        if task is None:
+            return
+
+        func, args, streaming = task
+        try:
+            _set_cpu_limit(cpu_seconds)
+            if streaming:
+                # Items go back as they are produced; the final reply carries the return value
+                items = func(*args)
+                while True:
+                    try:
+                        item = next(items)
+                    except StopIteration as stop:
+                        reply = ('ok', stop.value)
+                        break
+                    conn.send(('item', item, None))
+            else:
+                reply = ('ok', func(*args))
+        except _CPULimitExceeded:
+            reply = ('error', SandboxError('cpu_limit', f"PDF parsing exceeded the {cpu_seconds:g}s CPU limit"))
+        except MemoryError:
+            reply = ('error', SandboxError('memory_limit',
+                                           f"PDF parsing exceeded the {memory_bytes // (1024 * 1024)}MB memory limit"))
+        except Exception as e:
+            reply = ('error', e)
+        finally:
+            _set_cpu_limit(None)
+
+        recorded = metrics.registry.drain()
+        try:
+            conn.send(reply + (recorded,))
+        except Exception:
+            # The result or exception would not pickle; report it as text
+            conn.send(('error', Exception(str(reply[1])), recorded))
+
+
+class _Worker:
+    def __init__(self, ctx, memory_bytes: int, cpu_seconds: float):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_sandbox_main, args=(child_conn, memory_bytes, cpu_seconds),
+                                   name="pdf-sandbox", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+        # Set after a limit error: heap state after one is not worth trusting with another document
+        self.retired = False
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=1)
+        self.kill()
+
+
+class ParseSandbox:
+    def __init__(self, workers: int = 2, timeout: float = 60, cpu_seconds: float = 60,
+                 memory_bytes: int = 1024 * 1024 * 1024, max_tasks: int = 50):
+        """
+        Initialize parse sandbox
+
+        Args:
+            workers: Worker processes (and concurrent documents)
+            timeout: Wall-clock seconds per document before its worker is killed
+            cpu_seconds: CPU seconds per document (RLIMIT_CPU)
+            memory_bytes: Address-space limit per worker process (RLIMIT_AS)
+            max_tasks: Documents a worker parses before it is replaced
+        """
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.max_tasks = max(1, max_tasks)
+        # spawn keeps workers independent of the (threaded) server process
+        self._ctx = multiprocessing.get_context('spawn')
+        self._idle: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stats = {'tasks': 0, 'timeouts': 0, 'limit_errors': 0, 'crashes': 0, 'recycled': 0}
+
+    @classmethod
+    def from_env(cls) -> 'ParseSandbox':
+        """Build a sandbox from PDF_SANDBOX_* environment variables"""
+        return cls(
+            workers=int(os.getenv("PDF_SANDBOX_WORKERS", os.cpu_count() or 1)),
+            timeout=float(os.getenv("PDF_SANDBOX_TIMEOUT", 60)),
+            cpu_seconds=float(os.getenv("PDF_SANDBOX_CPU_SECONDS", 60)),
+            memory_bytes=int(os.getenv("PDF_SANDBOX_MEMORY_MB", 1024)) * 1024 * 1024,
+            max_tasks=int(os.getenv("PDF_SANDBOX_MAX_TASKS", 50)),
+        )
+
+    def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Call func(*args) in a sandboxed worker and wait for the result
+
+        Args:
+            func: Module-level function (it is pickled by reference)
+
+        Returns:
+            Whatever func returns
+
+        Raises:
+            SandboxError: on timeout, CPU or memory limit, or a crashed worker
+            Exception: whatever func raised, re-raised in the caller
+        """
+        with self._slots:
+            worker = self._checkout()
+            try:
+                return self._call(worker, func, args)
+            finally:
+                self._checkin(worker)
+
+    def stream(self, func: Callable[..., Iterator[Any]], *args: Any) -> Iterator[Any]:
+        """
+        Iterate the generator func(*args) in a sandboxed worker, yielding its items as they arrive
+        The time limit covers the whole iteration. Closing the returned
+        generator early kills the worker, since it is still mid-document.
+
+        Args:
+            func: Module-level generator function (it is pickled by reference)
+
+        Returns:
+            Generator of func's items; its return value (via `yield from`) is func's
+
+        Raises:
+            SandboxError: on timeout, CPU or memory limit, or a crashed worker
+            Exception: whatever func raised, re-raised in the caller
+        """
+        with self._slots:
+            worker = self._checkout()
+            finished = False
+            try:
+                self._start(worker, func, args, streaming=True)
+                deadline = time.monotonic() + self.timeout
+                while True:
+                    status, value, recorded = self._receive(worker, deadline)
+                    if status != 'item':
+                        finished = True
+                        return self._result(worker, status, value, recorded)
+                    yield value
+            finally:
+                if not finished:
+                    worker.kill()
+                self._checkin(worker)
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> Future:
+        """Like run(), but returns a Future; at most `workers` tasks run at once"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pdf-sandbox")
+            executor = self._executor
+        return executor.submit(self.run, func, *args)
+
+    def stats(self) -> Dict[str, Any]:
+        """Task and failure counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle_workers'] = len(self._idle)
+        stats['workers'] = self.workers
+        return stats
+
+    def shutdown(self) -> None:
+        """Stop idle workers and the submit executor"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        for worker in idle:
+            worker.stop()
+
+    def _checkout(self) -> _Worker:
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                worker.kill()
+        return _Worker(self._ctx, self.memory_bytes, self.cpu_seconds)
+
+    def _checkin(self, worker: _Worker) -> None:
+        if not worker.process.is_alive() or worker.retired:
+            worker.kill()
+        elif worker.tasks >= self.max_tasks:
+            self._count('recycled')
+            worker.stop()
+        else:
+            with self._lock:
+                self._idle.append(worker)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _call(self, worker: _Worker, func: Callable[..., Any], args: tuple) -> Any:
+        self._start(worker, func, args, streaming=False)
+        status, value, recorded = self._receive(worker, time.monotonic() + self.timeout)
+        return self._result(worker, status, value, recorded)
+
+    def _start(self, worker: _Worker, func: Callable[..., Any], args: tuple, streaming: bool) -> None:
+        self._count('tasks')
+        worker.tasks += 1
+        try:
+            worker.conn.send((func, args, streaming))
+        except OSError:
+            worker.process.join(timeout=1)
+            worker.kill()
+            raise self._crash_error(worker.process.exitcode)
+
+    def _receive(self, worker: _Worker, deadline: float) -> tuple:
+        """Next (status, value, recorded) message from the worker, or SandboxError past the deadline"""
+        try:
+            if not worker.conn.poll(max(0.0, deadline - time.monotonic())):
+                worker.kill()
+                self._count('timeouts')
+                raise SandboxError('timeout', f"PDF parsing exceeded the {self.timeout:g}s time limit")
+            return worker.conn.recv()
+        except (EOFError, OSError):
+            # Give the dying process a moment so its exit code says why
+            worker.process.join(timeout=1)
+            worker.kill()
+            raise self._crash_error(worker.process.exitcode)
+
+    def _result(self, worker: _Worker, status: str, value: Any, recorded: Optional[Dict[str, Any]]) -> Any:
+        metrics.registry.merge(recorded)
+        if status == 'ok':
+            return value
+        if isinstance(value, SandboxError):
+            worker.retired = True
+            self._count('limit_errors')
+        raise value
+
+    def _crash_error(self, exitcode: Optional[int]) -> SandboxError:
+        """Explain why a worker died mid-document"""
+        if resource is not None and exitcode == -signal.SIGXCPU:
+            # The kernel's default action when the CPU limit hit outside Python code
+            self._count('limit_errors')
+            return SandboxError('cpu_limit', f"PDF parsing exceeded the {self.cpu_seconds:g}s CPU limit")
+        self._count('crashes')
+        return SandboxError('worker_crashed', f"PDF parser process crashed (exit code {exitcode})")
@@ -2,126 +2,1126 @@
 PDF Parser Module
 Extracts text from PDF files using PyPDF2 and pdfplumber
 """
-import PyPDF2
-import pdfplumber
-from typing import Optional, Dict, Any
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Tuple, Union
 import io
+import mmap
+import multiprocessing
+import os
+import re
+import threading
+import time
+from metrics import STAGE_SECONDS, PDF_PAGES, PDF_FALLBACKS, ERRORS
+from parse_sandbox import ParseSandbox
+from profiling import profile_call
 
-class PDFParser:
-    def __init__(self):
-        """Initialize PDF parser"""
+# PyPDF2 and pdfplumber (which pulls in pdfminer) are imported on first use, not at
+# import time, so the service starts quickly; warm_up() imports them ahead of traffic
+
+# A PDF held in memory, or the path of a spooled upload on disk
+PDFSource = Union[bytes, str]
+
+# Triage inspects at most this many pages for fonts before calling a document image-only
+TRIAGE_SAMPLE_PAGES = 8
+
+# One-page document warm_up() runs through both engines
+_WARMUP_PDF = (
+    b'%PDF-1.4\n'
+    b'1 0 obj\n'
+    b'<< /Type /Catalog /Pages 2 0 R >>\n'
+    b'endobj\n'
+    b'2 0 obj\n'
+    b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>\n'
+    b'endobj\n'
+    b'3 0 obj\n'
+    b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 100] /Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>\n'
+    b'endobj\n'
+    b'4 0 obj\n'
+    b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>\n'
+    b'endobj\n'
+    b'5 0 obj\n'
+    b'<< /Length 57 >>\n'
+    b'stream\n'
+    b'BT /F1 10 Tf 10 50 Td (Warm-up invoice total $1.00) Tj ET\n'
+    b'endstream\n'
+    b'endobj\n'
+    b'xref\n'
+    b'0 6\n'
+    b'0000000000 65535 f \n'
+    b'0000000009 00000 n \n'
+    b'0000000058 00000 n \n'
+    b'0000000115 00000 n \n'
+    b'0000000241 00000 n \n'
+    b'0000000311 00000 n \n'
+    b'trailer\n'
+    b'<< /Size 6 /Root 1 0 R >>\n'
+    b'startxref\n'
+    b'418\n'
+    b'%%EOF\n'
+)
+
+# Auto mode re-extracts a PyPDF2 page with pdfplumber when less than this share of
+# its characters is printable, or when this share of its lines looks like table rows
+HYBRID_MIN_PRINTABLE_RATIO = 0.9
+HYBRID_TABLE_LINE_RATIO = 0.5
+
+_PAGE_RANGE = re.compile(r'(\d+)(?:-(\d*))?')
+_NUMBER_TOKEN = re.compile(r'[-+(]?[$€£]?\d[\d,.]*%?\)?')
+_CELL_GAP = re.compile(r'\s{2,}|\t')
+
+# PDF Info dictionary keys and the names they are reported under
+METADATA_KEYS = {
+    'title': 'Title',
+    'author': 'Author',
+    'subject': 'Subject',
+    'creator': 'Creator',
+    'producer': 'Producer',
+    'creation_date': 'CreationDate',
+    'modification_date': 'ModDate',
+}
+
+def _info_value(info, key: str) -> str:
+    """One Info dictionary entry as a plain str ('' when missing or unreadable)"""
+    try:
+        value = info.get(key)
+        if value is None:
+            return ''
+        # Entries may be indirect references to the actual string
+        return str(value.get_object() if hasattr(value, 'get_object') else value)
+    except Exception:
+        return ''
+
+def _page_count(pdf_reader) -> int:
+    """
+    Page count from the page tree root's /Count, without loading any page
+    len(reader.pages) walks and flattens the whole tree; it is only used
+    when the root carries no usable /Count.
+    """
+    try:
+        count = pdf_reader.trailer['/Root']['/Pages']['/Count']
+        if isinstance(count, int) and count >= 0:
+            return int(count)
+    except Exception:
         pass
+    return len(pdf_reader.pages)
+
+def _reader_iter(pdf_reader, indices: Optional[Iterable[int]] = None) -> Iterator[str]:
+    """Yield text page by page from an open PyPDF2 reader, optionally only the given page indices"""
+    if indices is None:
+        for page in pdf_reader.pages:
+            yield page.extract_text()
+        return
+    for index in indices:
+        yield pdf_reader.pages[index].extract_text()
+
+def _plumber_iter(pages) -> Iterator[str]:
+    """Yield text page by page from pdfplumber pages"""
+    for page in pages:
+        text = page.extract_text() or ''
+        # Drop cached layout objects so memory stays flat on long documents
+        page.flush_cache()
+        yield text
+
+def _take_pages(page_texts: Iterator[str], max_chars: Optional[int] = None,
+                max_pages: Optional[int] = None) -> List[str]:
+    """Pull page texts only until the character or page budget is met"""
+    texts = []
+    total = 0
+    if max_pages is not None and max_pages <= 0:
+        return texts
+    for text in page_texts:
+        texts.append(text)
+        total += len(text)
+        if max_pages is not None and len(texts) >= max_pages:
+            break
+        if max_chars is not None and total >= max_chars:
+            break
+    return texts
+
+def parse_page_selection(spec: str) -> str:
+    """
+    Validate a page selection like '1-3,10' or '5-' (page 5 to the end)
+    
+    Returns:
+        The selection in canonical form, with ranges sorted and overlaps merged
     
-    def extract_text_pypdf2(self, pdf_bytes: bytes) -> str:
+    Raises:
+        ValueError: for malformed parts, page 0 or reversed ranges
+    """
+    ranges = []
+    for part in spec.replace(' ', '').split(','):
+        match = _PAGE_RANGE.fullmatch(part)
+        if not match:
+            raise ValueError(f"Invalid page selection '{part}'; use e.g. 1-3,10")
+        start = int(match.group(1))
+        if match.group(2) is None:
+            end = start
+        else:
+            end = int(match.group(2)) if match.group(2) else None
+        if start < 1 or (end is not None and end < start):
+            raise ValueError(f"Invalid page range '{part}'")
+        ranges.append((start, end))
+    
+    merged: List[Tuple[int, Optional[int]]] = []
+    for start, end in sorted(ranges, key=lambda r: (r[0], r[1] is None, r[1] or 0)):
+        if merged:
+            first, last = merged[-1]
+            if last is None:
+                continue
+            if start <= last + 1:
+                merged[-1] = (first, None if end is None else max(last, end))
+                continue
+        merged.append((start, end))
+    return _format_ranges(merged)
+
+def _format_ranges(ranges) -> str:
+    return ','.join(f"{start}-" if end is None else str(start) if start == end else f"{start}-{end}"
+                    for start, end in ranges)
+
+def format_page_numbers(numbers: Iterable[int]) -> str:
+    """Compact form of ascending 1-based page numbers, e.g. [1, 2, 3, 10] -> '1-3,10'"""
+    ranges: List[List[int]] = []
+    for number in numbers:
+        if ranges and number == ranges[-1][1] + 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return _format_ranges(ranges)
+
+def _selection_indices(spec: str, total_pages: int) -> List[int]:
+    """0-based page indices a canonical selection covers in a document of total_pages"""
+    indices: List[int] = []
+    for part in spec.split(','):
+        first, dash, last = part.partition('-')
+        end = int(last) if last else (total_pages if dash else int(first))
+        indices.extend(range(int(first) - 1, min(end, total_pages)))
+    return indices
+
+def _is_table_row(line: str) -> bool:
+    """Whether a line reads like a flattened table row"""
+    numbers = sum(1 for token in line.split() if _NUMBER_TOKEN.fullmatch(token))
+    return numbers >= 3 or len(_CELL_GAP.split(line.strip())) >= 3
+
+def _poor_page_text(text: Optional[str]) -> Optional[str]:
+    """
+    Judge PyPDF2 output for one page
+
+    Returns:
+        Why the page should be re-extracted with pdfplumber ('empty',
+        'unprintable' or 'table'), or None if the text looks usable
+    """
+    if not text or not text.strip():
+        return 'empty'
+    printable = sum(1 for ch in text if (ch.isprintable() or ch.isspace()) and ch != '\ufffd')
+    if printable / len(text) < HYBRID_MIN_PRINTABLE_RATIO:
+        return 'unprintable'
+    lines = [line for line in text.splitlines() if line.strip()]
+    if len(lines) >= 3 and sum(map(_is_table_row, lines)) / len(lines) >= HYBRID_TABLE_LINE_RATIO:
+        return 'table'
+    return None
+
+def _plumber_page_texts(pages) -> List[str]:
+    """Extract text from a sequence of pdfplumber pages, in order"""
+    return list(_plumber_iter(pages))
+
+def _join_reader_texts(page_texts: List[str]) -> str:
+    """Join per-page text the way the PyPDF2 engine always has"""
+    return "".join(text + "\n" for text in page_texts).strip()
+
+def _join_page_texts(page_texts: List[str]) -> str:
+    """Join per-page text the way the pdfplumber engine always has"""
+    return "".join(text + "\n" for text in page_texts if text).strip()
+
+def join_pages(page_texts: List[str], engine: str) -> str:
+    """Join iter_pages output into the text full extraction with that engine returns"""
+    return _join_reader_texts(page_texts) if engine == 'pypdf2' else _join_page_texts(page_texts)
+
+def _plumber_text(pdf) -> str:
+    """Extract text from an open pdfplumber document"""
+    return _join_page_texts(_plumber_page_texts(pdf.pages))
+
+def _open_source(source: PDFSource):
+    """
+    Open a PDF source as a seekable stream
+    Files are memory-mapped so the parsers read from the page cache
+    instead of a private heap copy of the whole document.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    with open(source, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return io.BytesIO(b'')
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class PDFTriageError(Exception):
+    """
+    A document rejected before full extraction
+    code is one of: empty_file, not_pdf, truncated, broken_xref,
+    encrypted, no_pages, image_only, pages_out_of_range
+    """
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+    def __reduce__(self):
+        # Keep the code when the error crosses a process pool boundary
+        return (PDFTriageError, (self.code, self.message))
+
+def _source_ends(source: PDFSource, size: int = 4096) -> Tuple[bytes, bytes, int]:
+    """First and last `size` bytes of a source, plus its length, without reading the middle"""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source[:size]), bytes(source[-size:]), len(source)
+    with open(source, 'rb') as f:
+        length = os.fstat(f.fileno()).st_size
+        head = f.read(size)
+        f.seek(max(0, length - size))
+        return head, f.read(size), length
+
+def _has_fonts(resources, depth: int = 0) -> bool:
+    """Whether a resource dictionary (or a form XObject inside it) declares fonts"""
+    if not resources:
+        return False
+    resources = resources.get_object()
+    fonts = resources.get('/Font')
+    if fonts is not None and len(fonts.get_object()) > 0:
+        return True
+    if depth >= 2:
+        return False
+    xobjects = resources.get('/XObject')
+    if xobjects is None:
+        return False
+    for ref in xobjects.get_object().values():
+        xobject = ref.get_object()
+        if xobject.get('/Subtype') == '/Form' and _has_fonts(xobject.get('/Resources'), depth + 1):
+            return True
+    return False
+
+def _sample_indices(num_pages: int, sample: int) -> List[int]:
+    """
+    Up to `sample` page indices spread evenly over the document, always including the first
+    
+    Raises:
+        ValueError: if sample is less than 1
+    """
+    if sample < 1:
+        raise ValueError(f"sample must be at least 1, got {sample}")
+    if num_pages <= sample:
+        return list(range(num_pages))
+    step = num_pages / sample
+    return sorted({int(i * step) for i in range(sample)})
+
+def _plumber_range_worker(source: PDFSource, start: int, end: int) -> List[str]:
+    """Process pool task: extract pages [start, end) with pdfplumber"""
+    import pdfplumber
+    stream = _open_source(source)
+    try:
+        with pdfplumber.open(stream, pages=list(range(start + 1, end + 1))) as pdf:
+            return _plumber_page_texts(pdf.pages)
+    finally:
+        stream.close()
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the shared extraction pool, created on first use"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn keeps workers independent of the (threaded) server process
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+def _reset_process_pool() -> None:
+    """Discard a broken pool so the next call starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = None
+
+def _hybrid_range_worker(source: PDFSource, start: int, end: int) -> Dict[str, Any]:
+    """Process pool task: hybrid extraction of pages [start, end)"""
+    with ParsedDocument(source, 'auto') as doc:
+        texts = list(doc._hybrid_iter(range(start, end)))
+        return {'texts': texts, 'escalated': doc.escalated_pages,
+                'failed': doc.failed_pages, 'error': doc._page_error}
+
+def _split_range(num_pages: int, chunks: int) -> List[tuple]:
+    """Split [0, num_pages) into at most `chunks` contiguous ranges"""
+    chunks = max(1, min(chunks, num_pages))
+    size, extra = divmod(num_pages, chunks)
+    ranges = []
+    start = 0
+    for i in range(chunks):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+def _reader_metadata(pdf_reader) -> Dict[str, Any]:
+    """
+    Read the Info dictionary and page count from an open PyPDF2 reader
+    Only the trailer, the Info dictionary and the page tree root are read.
+    
+    Returns:
+        JSON-ready dict: str per METADATA_KEYS name ('' if absent), int num_pages
+    """
+    info = pdf_reader.trailer.get('/Info')
+    info = info.get_object() if info is not None else {}
+    result = {name: _info_value(info, f'/{key}') for name, key in METADATA_KEYS.items()}
+    result['num_pages'] = _page_count(pdf_reader)
+    return result
+
+def _plumber_metadata(pdf) -> Dict[str, Any]:
+    """Read Info dictionary and page count from an open pdfplumber document"""
+    metadata = pdf.metadata or {}
+    result = {}
+    for name, key in METADATA_KEYS.items():
+        value = metadata.get(key, '')
+        result[name] = value if isinstance(value, str) else str(value)
+    result['num_pages'] = len(pdf.pages)
+    return result
+
+
+class ParsedDocument:
+    """
+    A PDF opened once per engine
+    Text, metadata and page count are served from whichever parse
+    produced the text, so one upload is not re-read for each field.
+    """
+    def __init__(self, source: PDFSource, method: str = 'auto', workers: int = 1,
+                 parallel_min_pages: int = 0, max_chars: Optional[int] = None,
+                 max_pages: Optional[int] = None, page_selection: Optional[str] = None,
+                 sample: Optional[int] = None):
+        if method not in ('auto', 'pdfplumber', 'pypdf2'):
+            raise ValueError(f"Unknown extraction method: {method}")
+        self.source = source
+        self.method = method
+        self.workers = workers
+        self.parallel_min_pages = parallel_min_pages
+        self.max_chars = max_chars
+        self.max_pages = max_pages
+        # Only these pages are laid out: a selection such as '1-3,10', then an even sample of it
+        self.page_selection = parse_page_selection(page_selection) if page_selection else None
+        if sample is not None:
+            _sample_indices(0, sample)  # validate now rather than mid-extraction
+        self.sample = sample
+        self.engine: Optional[str] = None
+        # Pages actually extracted (count and 1-based numbers), and whether a
+        # budget stopped extraction before the end of the selected pages
+        self.pages_read = 0
+        self.pages_processed: List[int] = []
+        self.truncated = False
+        self._pages_selected = 0
+        # Auto mode: pages re-extracted with pdfplumber, and pages neither engine could read
+        self.escalated_pages: List[int] = []
+        self.failed_pages: List[int] = []
+        # Per-page text behind the extracted text, set once it is computed
+        self.page_texts: Optional[List[str]] = None
+        self._page_error: Optional[str] = None
+        self._plumber_error: Optional[Exception] = None
+        self._reader = None
+        self._plumber = None
+        self._text: Optional[str] = None
+        self._metadata: Optional[Dict[str, Any]] = None
+        self._streams = []
+
+    def __enter__(self) -> 'ParsedDocument':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Release the underlying parser handles"""
+        if self._plumber is not None:
+            self._plumber.close()
+            self._plumber = None
+        self._reader = None
+        for stream in self._streams:
+            stream.close()
+        self._streams = []
+
+    def _open(self):
+        stream = _open_source(self.source)
+        self._streams.append(stream)
+        return stream
+
+    @property
+    def reader(self):
+        """PyPDF2 reader, opened on first use"""
+        if self._reader is None:
+            import PyPDF2
+            self._reader = PyPDF2.PdfReader(self._open())
+        return self._reader
+
+    @property
+    def plumber(self):
+        """pdfplumber document, opened on first use"""
+        if self._plumber is None:
+            import pdfplumber
+            self._plumber = pdfplumber.open(self._open())
+        return self._plumber
+
+    @property
+    def text(self) -> str:
+        """Extracted text, computed once"""
+        if self._text is None:
+            start = time.perf_counter()
+            try:
+                self._text = self._extract_text()
+            except Exception as e:
+                ERRORS.inc(stage=f"extract_{self.method}", error=type(e).__name__)
+                raise
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage=f"extract_{self.method}")
+        return self._text
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
         """
-        Extract text using PyPDF2
-        Good for simple PDFs
+        PDF metadata from the engine already holding the document
+
+        Returns:
+            Dictionary with PDF metadata (all values converted to strings)
+        """
+        if self._metadata is None:
+            with STAGE_SECONDS.time(stage='metadata'):
+                try:
+                    if self.engine == 'pdfplumber':
+                        self._metadata = _plumber_metadata(self._plumber)
+                    else:
+                        self._metadata = _reader_metadata(self.reader)
+                except Exception as e:
+                    ERRORS.inc(stage='metadata', error=type(e).__name__)
+                    self._metadata = {'error': str(e), 'num_pages': 0}
+        return self._metadata
+
+    @property
+    def num_pages(self) -> int:
+        """Page count from the same parse as the metadata"""
+        return self.metadata.get('num_pages', 0)
+
+    def triage(self) -> Dict[str, Any]:
+        """
+        Cheap pre-flight check before full extraction
+        Looks at the header, EOF marker, cross-reference table, encryption,
+        page count and whether sampled pages carry any font resources; junk
+        uploads fail here instead of after a full pdfplumber pass.
+        
+        Returns:
+            {'num_pages': int, 'pages_sampled': int}
+        
+        Raises:
+            PDFTriageError: with a precise error code
         """
         try:
-            pdf_file = io.BytesIO(pdf_bytes)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
-            
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            
-            return text.strip()
+            with STAGE_SECONDS.time(stage='triage'):
+                return self._triage()
+        except PDFTriageError as e:
+            ERRORS.inc(stage='triage', error=e.code)
+            raise
+
+    def _triage(self) -> Dict[str, Any]:
+        head, tail, length = _source_ends(self.source)
+        if length == 0:
+            raise PDFTriageError('empty_file', "Uploaded file is empty")
+        if b'%PDF-' not in head[:1024]:
+            raise PDFTriageError('not_pdf', "File is not a PDF (missing %PDF header)")
+        
+        try:
+            reader = self.reader
+        except Exception as e:
+            if b'%%EOF' not in tail:
+                raise PDFTriageError('truncated', "PDF is truncated (missing %%EOF marker)")
+            raise PDFTriageError('broken_xref', f"PDF cross-reference table is unreadable: {str(e)}")
+        
+        if reader.is_encrypted:
+            try:
+                decrypted = reader.decrypt('')
+            except Exception:
+                decrypted = 0
+            if not decrypted:
+                raise PDFTriageError('encrypted', "PDF is password protected")
+        
+        try:
+            num_pages = len(reader.pages)
+        except Exception as e:
+            raise PDFTriageError('broken_xref', f"PDF page tree is unreadable: {str(e)}")
+        if num_pages == 0:
+            raise PDFTriageError('no_pages', "PDF has no pages")
+        
+        sampled = _sample_indices(num_pages, TRIAGE_SAMPLE_PAGES)
+        if not any(self._page_may_have_text(reader, index) for index in sampled):
+            raise PDFTriageError('image_only', "PDF pages contain no text layer (scanned or image-only)")
+        
+        return {'num_pages': num_pages, 'pages_sampled': len(sampled)}
+
+    @staticmethod
+    def _page_may_have_text(reader, index: int) -> bool:
+        try:
+            return _has_fonts(reader.pages[index].get('/Resources'))
+        except Exception:
+            # Unreadable resources are left for the extractors to judge
+            return True
+
+    def _select_pages(self, total_pages: int) -> List[int]:
+        """
+        0-based indices of the pages to extract, in document order
+        The page selection is applied first, then the sample spread over
+        it, then max_pages; pages outside the result are never laid out.
+        
+        Raises:
+            PDFTriageError: pages_out_of_range, when the selection misses every page
+        """
+        indices = _selection_indices(self.page_selection, total_pages) if self.page_selection \
+            else list(range(total_pages))
+        if self.page_selection and not indices:
+            raise PDFTriageError('pages_out_of_range',
+                                 f"Page selection {self.page_selection} is outside the document's {total_pages} pages")
+        if self.sample is not None:
+            indices = [indices[i] for i in _sample_indices(len(indices), self.sample)]
+        self._pages_selected = len(indices)
+        if self.max_pages is not None:
+            indices = indices[:max(0, self.max_pages)]
+        return indices
+
+    @property
+    def _selective(self) -> bool:
+        return self.page_selection is not None or self.sample is not None
+
+    def _finish(self, engine: str, page_texts: List[str], indices: List[int], text: str) -> str:
+        """Record which pages were read and apply the character budget"""
+        self.engine = engine
+        self.page_texts = page_texts
+        self.pages_read = len(page_texts)
+        self.pages_processed = [index + 1 for index in indices[:self.pages_read]]
+        PDF_PAGES.observe(self.pages_read)
+        if self.escalated_pages:
+            PDF_FALLBACKS.inc(len(self.escalated_pages), reason='page_escalated')
+        self.truncated = self.pages_read < self._pages_selected
+        if self.max_chars is not None and len(text) > self.max_chars:
+            self.truncated = True
+            text = text[:self.max_chars]
+        return text
+
+    def _extract_pypdf2(self) -> str:
+        try:
+            reader = self.reader
+            indices = self._select_pages(len(reader.pages))
+            page_texts = _take_pages(_reader_iter(reader, indices), self.max_chars)
+        except PDFTriageError:
+            raise
         except Exception as e:
             raise Exception(f"PyPDF2 extraction failed: {str(e)}")
+        return self._finish('pypdf2', page_texts, indices, _join_reader_texts(page_texts))
+
+    def _extract_pdfplumber(self) -> str:
+        try:
+            pages = self.plumber.pages
+            indices = self._select_pages(len(pages))
+            # A character budget is usually met within a few pages, and a page
+            # selection is usually short, so both stay serial
+            if self._parallel(len(indices)):
+                page_texts = self._extract_pdfplumber_parallel(len(indices))
+            else:
+                page_texts = _take_pages(_plumber_iter(pages[index] for index in indices), self.max_chars)
+        except PDFTriageError:
+            raise
+        except Exception as e:
+            raise Exception(f"pdfplumber extraction failed: {str(e)}")
+        return self._finish('pdfplumber', page_texts, indices, _join_page_texts(page_texts))
+
+    def _parallel(self, num_pages: int) -> bool:
+        """Whether to spread the leading num_pages pages over the process pool"""
+        return (self.workers > 1 and self.max_chars is None and not self._selective
+                and num_pages >= max(self.parallel_min_pages, 2))
+
+    def _extract_pdfplumber_parallel(self, num_pages: int) -> List[str]:
+        """Lay out page ranges on the process pool and reassemble in page order"""
+        pool = _get_process_pool(self.workers)
+        try:
+            futures = [pool.submit(_plumber_range_worker, self.source, start, end)
+                       for start, end in _split_range(num_pages, self.workers)]
+            page_texts = []
+            for future in futures:
+                page_texts.extend(future.result())
+        except BrokenProcessPool:
+            # A worker died; finish in-process and let the next call rebuild the pool
+            PDF_FALLBACKS.inc(reason='process_pool_broken')
+            _reset_process_pool()
+            return _plumber_page_texts(self.plumber.pages[:num_pages])
+        return page_texts
+
+    def _escalation_pages(self):
+        """pdfplumber pages for escalation, or None once pdfplumber has failed to open"""
+        if self._plumber_error is None:
+            try:
+                return self.plumber.pages
+            except Exception as e:
+                self._plumber_error = e
+        return None
+
+    def _hybrid_iter(self, indices) -> Iterator[str]:
+        """
+        Yield page texts using PyPDF2, escalating poor pages to pdfplumber
+        An error on one page only affects that page; a page neither engine
+        can read yields '' and is recorded in failed_pages.
+        """
+        reader = self.reader
+        for index in indices:
+            try:
+                text = reader.pages[index].extract_text() or ''
+                error = None
+            except Exception as e:
+                text = ''
+                error = e
+            if error is None and _poor_page_text(text) is None:
+                yield text
+                continue
+
+            self.escalated_pages.append(index)
+            pages = self._escalation_pages()
+            try:
+                if pages is None:
+                    raise self._plumber_error
+                page = pages[index]
+                better = page.extract_text() or ''
+                page.flush_cache()
+            except Exception as e:
+                if error is not None:
+                    self.failed_pages.append(index)
+                    self._page_error = f"page {index + 1}: {str(e)}"
+                yield text
+                continue
+            yield better if better.strip() else text
+
+    def _extract_hybrid(self) -> str:
+        """Auto mode: PyPDF2 speed, pdfplumber quality on the pages that need it"""
+        try:
+            total_pages = len(self.reader.pages)
+        except Exception:
+            # PyPDF2 cannot read the page tree at all; let pdfplumber take the whole document
+            PDF_FALLBACKS.inc(reason='pypdf2_unreadable')
+            self._reader = None
+            try:
+                return self._extract_pdfplumber()
+            except PDFTriageError:
+                raise
+            except Exception as e:
+                raise Exception(f"Both PDF extraction methods failed. Last error: {str(e)}")
+
+        indices = self._select_pages(total_pages)
+        if self._parallel(len(indices)):
+            page_texts = self._extract_hybrid_parallel(len(indices))
+        else:
+            page_texts = _take_pages(self._hybrid_iter(indices), self.max_chars)
+
+        if page_texts and len(self.failed_pages) == len(page_texts):
+            raise Exception(f"Both PDF extraction methods failed. Last error: {self._page_error}")
+        return self._finish('hybrid', page_texts, indices, _join_page_texts(page_texts))
+
+    def _extract_hybrid_parallel(self, num_pages: int) -> List[str]:
+        """Run hybrid extraction over page ranges on the process pool"""
+        pool = _get_process_pool(self.workers)
+        try:
+            futures = [pool.submit(_hybrid_range_worker, self.source, start, end)
+                       for start, end in _split_range(num_pages, self.workers)]
+            page_texts = []
+            for future in futures:
+                chunk = future.result()
+                page_texts.extend(chunk['texts'])
+                self.escalated_pages.extend(chunk['escalated'])
+                self.failed_pages.extend(chunk['failed'])
+                self._page_error = chunk['error'] or self._page_error
+        except BrokenProcessPool:
+            PDF_FALLBACKS.inc(reason='process_pool_broken')
+            _reset_process_pool()
+            self.escalated_pages, self.failed_pages = [], []
+            return list(self._hybrid_iter(range(num_pages)))
+        return page_texts
+
+    def iter_pages(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yield each selected page as soon as it is extracted, honouring max_chars and max_pages
+        Only the current page's text is held, so memory stays flat on long
+        documents. engine, pages_read, pages_processed and truncated are set
+        as pages arrive.
+        
+        Yields:
+            {'page': 1-based number, 'pages': pages to be extracted, 'text': str,
+             'chars': int, 'engine': str, 'escalated': bool, 'failed': bool, 'seconds': float}
+        """
+        start = time.perf_counter()
+        try:
+            yield from self._iter_pages()
+        except Exception as e:
+            ERRORS.inc(stage=f"extract_{self.method}", error=type(e).__name__)
+            raise
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage=f"extract_{self.method}")
+            PDF_PAGES.observe(self.pages_read)
+            if self.escalated_pages:
+                PDF_FALLBACKS.inc(len(self.escalated_pages), reason='page_escalated')
+
+    def _iter_pages(self) -> Iterator[Dict[str, Any]]:
+        engine = 'pdfplumber' if self.method == 'pdfplumber' else 'pypdf2'
+        try:
+            if self.method == 'auto':
+                try:
+                    indices = self._select_pages(len(self.reader.pages))
+                    engine = 'hybrid'
+                    page_texts = self._hybrid_iter(indices)
+                except PDFTriageError:
+                    raise
+                except Exception:
+                    # Same fallback as full extraction: pdfplumber takes the whole document
+                    PDF_FALLBACKS.inc(reason='pypdf2_unreadable')
+                    self._reader = None
+                    engine = 'pdfplumber'
+            if engine == 'pdfplumber':
+                pages = self.plumber.pages
+                indices = self._select_pages(len(pages))
+                page_texts = _plumber_iter(pages[index] for index in indices)
+            elif engine == 'pypdf2':
+                indices = self._select_pages(len(self.reader.pages))
+                page_texts = _reader_iter(self.reader, indices)
+        except PDFTriageError:
+            raise
+        except Exception as e:
+            raise Exception(f"{engine} extraction failed: {str(e)}")
+
+        self.engine = engine
+        self.truncated = len(indices) < self._pages_selected
+        chars = 0
+        for position, index in enumerate(indices):
+            start = time.perf_counter()
+            try:
+                text = next(page_texts) or ''
+            except StopIteration:
+                break
+            except Exception as e:
+                raise Exception(f"{engine} extraction failed on page {index + 1}: {str(e)}")
+            self.pages_read = position + 1
+            self.pages_processed.append(index + 1)
+            yield {
+                'page': index + 1,
+                'pages': len(indices),
+                'text': text,
+                'chars': len(text),
+                'engine': engine,
+                'escalated': index in self.escalated_pages[-1:],
+                'failed': index in self.failed_pages[-1:],
+                'seconds': round(time.perf_counter() - start, 6),
+            }
+            chars += len(text)
+            if self.max_chars is not None and chars >= self.max_chars:
+                self.truncated = self.truncated or position + 1 < len(indices)
+                break
+
+        if self.pages_read and len(self.failed_pages) == self.pages_read:
+            raise Exception(f"Both PDF extraction methods failed. Last error: {self._page_error}")
+
+    def _extract_text(self) -> str:
+        if self.method == 'pdfplumber':
+            return self._extract_pdfplumber()
+        if self.method == 'pypdf2':
+            return self._extract_pypdf2()
+        return self._extract_hybrid()
+
+
+def _document_result(doc: ParsedDocument, triage: bool, with_page_texts: bool) -> Dict[str, Any]:
+    if triage:
+        doc.triage()
+    result = {'text': doc.text, 'metadata': doc.metadata, 'truncated': doc.truncated,
+              'pages_processed': format_page_numbers(doc.pages_processed)}
+    if with_page_texts:
+        result['page_texts'] = doc.page_texts
+    return result
+
+
+def _extract_document_worker(source: PDFSource, method: str, max_chars: Optional[int] = None,
+                             max_pages: Optional[int] = None, triage: bool = False, with_page_texts: bool = False,
+                             page_selection: Optional[str] = None, sample: Optional[int] = None) -> Dict[str, Any]:
+    """Process pool / sandbox task: parse one whole document serially in the worker"""
+    with ParsedDocument(source, method, max_chars=max_chars, max_pages=max_pages,
+                        page_selection=page_selection, sample=sample) as doc:
+        return _document_result(doc, triage, with_page_texts)
+
+
+def _iter_pages_worker(source: PDFSource, method: str, max_chars: Optional[int] = None,
+                       max_pages: Optional[int] = None, triage: bool = False, page_selection: Optional[str] = None,
+                       sample: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Sandbox task: stream one document's pages; returns the document summary"""
+    with ParsedDocument(source, method, max_chars=max_chars, max_pages=max_pages,
+                        page_selection=page_selection, sample=sample) as doc:
+        if triage:
+            doc.triage()
+        yield from doc.iter_pages()
+        return {'metadata': doc.metadata, 'truncated': doc.truncated, 'pages_read': doc.pages_read,
+                'pages_processed': format_page_numbers(doc.pages_processed)}
+
+
+def _metadata_worker(source: PDFSource) -> Dict[str, Any]:
+    """Sandbox task: read one document's metadata without touching its pages"""
+    with ParsedDocument(source, 'pypdf2') as doc:
+        return doc.metadata
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    Import both engines and run each over a tiny embedded PDF in this process
+    so the first real document does not pay for imports and first-use setup
     
-    def extract_text_pdfplumber(self, pdf_bytes: bytes) -> str:
+    Returns:
+        Seconds spent per engine
+    """
+    timings = {}
+    for method in ('pypdf2', 'pdfplumber'):
+        start = time.perf_counter()
+        with ParsedDocument(_WARMUP_PDF, method) as doc:
+            doc.text
+            doc.metadata
+        timings[method] = round(time.perf_counter() - start, 4)
+    return timings
+
+
+class PDFParser:
+    def __init__(self, workers: Optional[int] = None, parallel_min_pages: Optional[int] = None,
+                 sandbox: Optional[ParseSandbox] = None):
         """
-        Extract text using pdfplumber
-        Better for complex PDFs with tables
+        Initialize PDF parser
+        
+        Args:
+            workers: Processes used for page-parallel extraction and for submit
+                (PDF_PARALLEL_WORKERS, defaults to the CPU count; 1 disables it).
+                Only applies without a sandbox: a sandboxed document is parsed
+                serially in one sandbox worker, and PDF_SANDBOX_WORKERS sets
+                how many documents run at once
+            parallel_min_pages: Documents with fewer pages stay single-process
+                (PDF_PARALLEL_MIN_PAGES, default 32)
+            sandbox: Resource-limited workers for extract_document / submit / iter_pages;
+                None parses in this process with no time or memory limit
+        """
+        if workers is None:
+            workers = int(os.getenv("PDF_PARALLEL_WORKERS", os.cpu_count() or 1))
+        if parallel_min_pages is None:
+            parallel_min_pages = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 32))
+        self.workers = max(1, workers)
+        self.parallel_min_pages = parallel_min_pages
+        self.sandbox = sandbox
+    
+    def parse(self, source: PDFSource, method: str = 'auto', max_chars: Optional[int] = None,
+              max_pages: Optional[int] = None, page_selection: Optional[str] = None,
+              sample: Optional[int] = None) -> ParsedDocument:
+        """
+        Open a PDF once for text, metadata and page count
+        
+        Args:
+            source: PDF file as bytes, or the path of a spooled upload
+            method: 'pypdf2', 'pdfplumber', or 'auto' (PyPDF2 per page, pdfplumber for poor pages)
+            max_chars: Stop extracting pages once this many characters are collected
+            max_pages: Extract at most this many leading pages
+            page_selection: Only lay out these 1-based pages, e.g. '1-3,10' or '5-'
+            sample: Only lay out this many pages spread evenly over the selection
+        
+        Returns:
+            ParsedDocument; close it (or use it as a context manager) when done
+        
+        Raises:
+            ValueError: for an unknown method or malformed page_selection
+        """
+        return ParsedDocument(source, method, workers=self.workers,
+                              parallel_min_pages=self.parallel_min_pages,
+                              max_chars=max_chars, max_pages=max_pages,
+                              page_selection=page_selection, sample=sample)
+    
+    def submit(self, source: PDFSource, method: str = 'auto', max_chars: Optional[int] = None,
+               max_pages: Optional[int] = None, triage: bool = False, with_page_texts: bool = False,
+               page_selection: Optional[str] = None, sample: Optional[int] = None) -> Future:
+        """
+        Extract text and metadata for one document on the shared process pool
+        Lets callers fan a batch of documents out across cores; runs
+        inline when only one worker is configured.
+        
+        Returns:
+            Future resolving to {'text': str, 'metadata': dict, 'truncated': bool,
+            'pages_processed': str}, plus 'page_texts' (per-page text) with with_page_texts=True;
+            with triage=True it fails with PDFTriageError for junk uploads
         """
+        args = (source, method, max_chars, max_pages, triage, with_page_texts, page_selection, sample)
+        if self.sandbox is not None:
+            return self.sandbox.submit(_extract_document_worker, *args)
+        if self.workers > 1:
+            try:
+                return _get_process_pool(self.workers).submit(_extract_document_worker, *args)
+            except BrokenProcessPool:
+                _reset_process_pool()
+                return _get_process_pool(self.workers).submit(_extract_document_worker, *args)
+        
+        future = Future()
         try:
-            pdf_file = io.BytesIO(pdf_bytes)
-            text = ""
-            
-            with pdfplumber.open(pdf_file) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-            
-            return text.strip()
+            future.set_result(_extract_document_worker(*args))
         except Exception as e:
-            raise Exception(f"pdfplumber extraction failed: {str(e)}")
+            future.set_exception(e)
+        return future
+    
+    def extract_document(self, source: PDFSource, method: str = 'auto', max_chars: Optional[int] = None,
+                         max_pages: Optional[int] = None, triage: bool = False, with_page_texts: bool = False,
+                         page_selection: Optional[str] = None, sample: Optional[int] = None,
+                         profile: bool = False) -> Dict[str, Any]:
+        """
+        Extract text and metadata for one document and wait for the result
+        Runs in the sandbox when one is configured, otherwise in this process
+        (where large documents can still use page-parallel extraction).
+        With profile=True a sandboxed parse is profiled inside its worker,
+        under the same limits; in-process work is left to the caller's profiler.
+        
+        Returns:
+            {'text': str, 'metadata': dict, 'truncated': bool, 'pages_processed': str}
+            ('1-3,10' style), plus 'page_texts' (per-page text) with with_page_texts=True
+            and 'profile' (the worker's profiling.profile_call recording) for a
+            sandboxed parse with profile=True
+        
+        Raises:
+            PDFTriageError: with triage=True, for junk uploads
+            SandboxError: if the document hit a sandbox time or resource limit
+        """
+        if self.sandbox is not None:
+            args = (source, method, max_chars, max_pages, triage, with_page_texts, page_selection, sample)
+            if profile:
+                result, recording = self.sandbox.run(profile_call, _extract_document_worker, *args)
+                result['profile'] = recording
+                return result
+            return self.sandbox.run(_extract_document_worker, *args)
+        with self.parse(source, method, max_chars=max_chars, max_pages=max_pages,
+                        page_selection=page_selection, sample=sample) as doc:
+            return _document_result(doc, triage, with_page_texts)
     
-    def extract_text(self, pdf_bytes: bytes, method: str = 'auto') -> str:
+    def iter_pages(self, source: PDFSource, method: str = 'auto', max_chars: Optional[int] = None,
+                   max_pages: Optional[int] = None, triage: bool = False, page_selection: Optional[str] = None,
+                   sample: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Extract a document page by page, yielding each page as soon as it is parsed
+        Runs in the sandbox when one is configured; close the generator to
+        abandon the document early.
+        
+        Args:
+            source: PDF file as bytes, or the path of a spooled upload
+            method: 'pypdf2', 'pdfplumber', or 'auto' (PyPDF2 per page, pdfplumber for poor pages)
+            max_chars: Stop after the page that brings the total to this many characters
+            max_pages: Extract at most this many leading pages
+            triage: Run the pre-flight check before the first page
+            page_selection: Only extract these 1-based pages, e.g. '1-3,10'
+            sample: Only extract this many pages spread evenly over the selection
+        
+        Returns:
+            Generator of page dicts (see ParsedDocument.iter_pages); its return
+            value, via `yield from`, is {'metadata': dict, 'truncated': bool,
+            'pages_read': int, 'pages_processed': str}
+        
+        Raises:
+            PDFTriageError: with triage=True, for junk uploads
+            SandboxError: if the document hit a sandbox time or resource limit
+        """
+        args = (source, method, max_chars, max_pages, triage, page_selection, sample)
+        if self.sandbox is not None:
+            return (yield from self.sandbox.stream(_iter_pages_worker, *args))
+        return (yield from _iter_pages_worker(*args))
+    
+    def warm_up(self, sandbox: bool = True) -> Dict[str, Any]:
+        """
+        Warm both engines in this process and, optionally, start every sandbox worker
+        Sandbox workers are separate interpreters that import the engines
+        themselves; leave them out in a pre-fork master, whose children
+        must start their own.
+        
+        Returns:
+            {'in_process': seconds per engine, 'sandbox': one timing dict per worker}
+        """
+        report: Dict[str, Any] = {'in_process': warm_up()}
+        if sandbox and self.sandbox is not None:
+            futures = [self.sandbox.submit(warm_up) for _ in range(self.sandbox.workers)]
+            report['sandbox'] = [future.result() for future in futures]
+        return report
+    
+    def extract_text_pypdf2(self, pdf_bytes: bytes, max_chars: Optional[int] = None,
+                            max_pages: Optional[int] = None, page_selection: Optional[str] = None,
+                            sample: Optional[int] = None) -> str:
+        """
+        Extract text using PyPDF2
+        Good for simple PDFs
+        """
+        with self.parse(pdf_bytes, 'pypdf2', max_chars=max_chars, max_pages=max_pages,
+                        page_selection=page_selection, sample=sample) as doc:
+            return doc.text
+    
+    def extract_text_pdfplumber(self, pdf_bytes: bytes, max_chars: Optional[int] = None,
+                                max_pages: Optional[int] = None, page_selection: Optional[str] = None,
+                                sample: Optional[int] = None) -> str:
+        """
+        Extract text using pdfplumber
+        Better for complex PDFs with tables
+        """
+        with self.parse(pdf_bytes, 'pdfplumber', max_chars=max_chars, max_pages=max_pages,
+                        page_selection=page_selection, sample=sample) as doc:
+            return doc.text
+    
+    def extract_text(self, pdf_bytes: bytes, method: str = 'auto', max_chars: Optional[int] = None,
+                     max_pages: Optional[int] = None, page_selection: Optional[str] = None,
+                     sample: Optional[int] = None) -> str:
         """
         Extract text from PDF bytes
         
         Args:
             pdf_bytes: PDF file as bytes
-            method: 'pypdf2', 'pdfplumber', or 'auto' (tries both)
+            method: 'pypdf2', 'pdfplumber', or 'auto' (PyPDF2 per page, pdfplumber for poor pages)
+            max_chars: Stop once this many characters are extracted (text is cut to it)
+            max_pages: Extract at most this many leading pages
+            page_selection: Only lay out these 1-based pages, e.g. '1-3,10' or '5-'
+            sample: Only lay out this many pages spread evenly over the selection
         
         Returns:
             Extracted text as string
         """
-        if method == 'auto':
-            # Try pdfplumber first (better for complex PDFs)
-            try:
-                return self.extract_text_pdfplumber(pdf_bytes)
-            except:
-                # Fallback to PyPDF2
-                try:
-                    return self.extract_text_pypdf2(pdf_bytes)
-                except Exception as e:
-                    raise Exception(f"Both PDF extraction methods failed. Last error: {str(e)}")
-        elif method == 'pdfplumber':
-            return self.extract_text_pdfplumber(pdf_bytes)
-        elif method == 'pypdf2':
-            return self.extract_text_pypdf2(pdf_bytes)
-        else:
-            raise ValueError(f"Unknown extraction method: {method}")
+        return self.extract_document(pdf_bytes, method, max_chars=max_chars, max_pages=max_pages,
+                                     page_selection=page_selection, sample=sample)['text']
+    
+    def triage(self, source: PDFSource) -> Dict[str, Any]:
+        """
+        Pre-flight check without extracting any text
+        
+        Raises:
+            PDFTriageError: if the document is not worth a full extraction
+        """
+        with self.parse(source, 'pypdf2') as doc:
+            return doc.triage()
     
-    def extract_metadata(self, pdf_bytes: bytes) -> Dict[str, Any]:
+    def extract_metadata(self, source: PDFSource) -> Dict[str, Any]:
         """
         Extract metadata from PDF
+        Reads only the trailer, Info dictionary and page tree root, so the
+        cost does not grow with the page count. Runs in the sandbox when one
+        is configured.
+        
+        Args:
+            source: PDF file as bytes, or the path of a spooled upload
         
         Returns:
-            Dictionary with PDF metadata (all values converted to strings)
-        """
-        def safe_get_metadata(metadata_dict, key, default=''):
-            """Safely extract metadata value, handling IndirectObject types"""
-            try:
-                value = metadata_dict.get(key, default)
-                # Handle IndirectObject and other non-serializable types
-                if hasattr(value, '__str__'):
-                    # Convert to string, handling IndirectObject
-                    str_value = str(value)
-                    # If it's an IndirectObject representation, try to get actual value
-                    if 'IndirectObject' in str(type(value)):
-                        try:
-                            # Try to resolve the indirect object
-                            if hasattr(value, 'get_object'):
-                                resolved = value.get_object()
-                                return str(resolved) if resolved else default
-                        except:
-                            pass
-                    return str_value
-                return str(value) if value else default
-            except Exception:
-                return default
+            JSON-ready dict: title, author, subject, creator, producer,
+            creation_date, modification_date (str, '' if absent) and num_pages (int);
+            {'error': str, 'num_pages': 0} if the document cannot be read
         
-        try:
-            pdf_file = io.BytesIO(pdf_bytes)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            metadata = pdf_reader.metadata or {}
-            
-            return {
-                'title': safe_get_metadata(metadata, '/Title', ''),
-                'author': safe_get_metadata(metadata, '/Author', ''),
-                'subject': safe_get_metadata(metadata, '/Subject', ''),
-                'creator': safe_get_metadata(metadata, '/Creator', ''),
-                'producer': safe_get_metadata(metadata, '/Producer', ''),
-                'creation_date': safe_get_metadata(metadata, '/CreationDate', ''),
-                'modification_date': safe_get_metadata(metadata, '/ModDate', ''),
-                'num_pages': len(pdf_reader.pages)
-            }
-        except Exception as e:
-            return {
-                'error': str(e),
-                'num_pages': 0
-            }
+        Raises:
+            SandboxError: if the document hit a sandbox time or resource limit
+        """
+        if self.sandbox is not None:
+            return self.sandbox.run(_metadata_worker, source)
+        return _metadata_worker(source)
@@ -0,0 +1,162 @@
+"""
+Portfolio Scorer Module
+Scores a columnar batch of asset records in one NumPy-vectorized pass for risk sentinel sweeps
+"""
+from datetime import date
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+from fingerprint_store import FingerprintStore, make_fingerprint
+from risk_analyzer import (BASE_RISK, LARGE_VALUATION, LARGE_VALUATION_PENALTY, MODEL_VERSION,
+                           OVERDUE_PENALTY_PER_WEEK, OVERDUE_PENALTY_MAX)
+
+DEFAULT_BASE_RISK = 20
+
+# Weeks overdue past which the overdue penalty no longer grows
+OVERDUE_WEEKS_CAP = -(-OVERDUE_PENALTY_MAX // OVERDUE_PENALTY_PER_WEEK)
+
+# Columns a portfolio request may send; only asset_type is required
+COLUMNS = ('id', 'asset_type', 'valuation', 'due_date', 'last_risk')
+
+
+class PortfolioError(ValueError):
+    """A malformed portfolio request"""
+    pass
+
+
+class PortfolioScorer:
+    def __init__(self, max_assets: int = 100000, store: Optional[FingerprintStore] = None):
+        """
+        Initialize portfolio scorer
+
+        Args:
+            max_assets: Largest portfolio accepted in one request
+            store: Fingerprints and last scores for incremental sweeps
+        """
+        self.max_assets = max_assets
+        self.store = store
+
+    def score(self, columns: Dict[str, List[Any]], threshold: float = 0,
+              as_of: Optional[str] = None, incremental: bool = False) -> Dict[str, Any]:
+        """
+        Score every asset and report those whose risk moved
+
+        Args:
+            columns: Equal-length lists keyed by COLUMNS; valuation, due_date
+                (ISO date) and last_risk entries may be null
+            threshold: Assets are reported when |new - last_risk| exceeds this
+                (assets without a last_risk are always reported)
+            as_of: ISO date overdue days are counted from (default today)
+            incremental: Re-score only assets whose inputs or overdue week
+                changed since the last sweep; needs an id column and a store
+
+        Returns:
+            {'count': n, 'changed': k, 'recomputed': r, 'results': columnar
+            id / index / risk_score / previous_risk lists for the changed assets}
+
+        Raises:
+            PortfolioError: if the columns are missing, ragged or malformed
+        """
+        if not isinstance(columns, dict) or not isinstance(columns.get('asset_type'), list):
+            raise PortfolioError("assets.asset_type must be a list")
+        unknown = set(columns) - set(COLUMNS)
+        if unknown:
+            raise PortfolioError(f"Unknown asset columns: {', '.join(sorted(unknown))}")
+        n = len(columns['asset_type'])
+        if n > self.max_assets:
+            raise PortfolioError(f"Portfolio exceeds maximum of {self.max_assets} assets")
+        for name, values in columns.items():
+            if not isinstance(values, list) or len(values) != n:
+                raise PortfolioError(f"assets.{name} must be a list of {n} values")
+
+        try:
+            types = np.array(columns['asset_type'], dtype=str)
+            valuations = self._floats(columns.get('valuation'), n)
+            last_risks = self._floats(columns.get('last_risk'), n)
+            due_dates = np.array(columns.get('due_date', [None] * n), dtype='datetime64[D]')
+            today = np.datetime64(as_of or date.today().isoformat(), 'D')
+        except (TypeError, ValueError) as e:
+            raise PortfolioError(f"Invalid asset values: {str(e)}")
+
+        ids = columns.get('id')
+        if incremental and ids is None:
+            raise PortfolioError("Incremental scoring needs an assets.id column")
+        if incremental and self.store is not None:
+            scores, recomputed = self._score_incremental(columns, types, valuations, due_dates, today)
+        else:
+            scores, recomputed = self._score_arrays(types, valuations, due_dates, today), n
+
+        changed = np.isnan(last_risks) | (np.abs(scores - last_risks) > threshold)
+        indices = np.flatnonzero(changed)
+        previous = last_risks[indices]
+        return {
+            'count': n,
+            'changed': int(indices.size),
+            'recomputed': recomputed,
+            'results': {
+                'index': indices.tolist(),
+                'id': [ids[i] for i in indices] if ids is not None else None,
+                'risk_score': scores[indices].astype(int).tolist(),
+                'previous_risk': [None if np.isnan(value) else float(value) for value in previous],
+            }
+        }
+
+    def _score_incremental(self, columns: Dict[str, List[Any]], types: np.ndarray, valuations: np.ndarray,
+                           due_dates: np.ndarray, today: np.datetime64) -> Tuple[np.ndarray, int]:
+        """Reuse stored scores for assets whose fingerprint is unchanged; score and store the rest"""
+        n = types.size
+        # The overdue week is the only time-based input, so a new week is a new fingerprint
+        weeks = self._overdue_weeks(due_dates, today).astype(int).tolist()
+        valuation_column = columns.get('valuation') or [None] * n
+        due_column = columns.get('due_date') or [None] * n
+        fingerprints = [
+            make_fingerprint({'model': MODEL_VERSION, 'asset_type': asset_type, 'valuation': valuation,
+                              'due_date': due_date, 'overdue_weeks': week})
+            for asset_type, valuation, due_date, week in zip(columns['asset_type'], valuation_column,
+                                                              due_column, weeks)
+        ]
+
+        ids = columns['id']
+        stored = self.store.get_many(ids)
+        scores = np.empty(n, dtype=float)
+        stale = np.ones(n, dtype=bool)
+        for i, (asset_id, fingerprint) in enumerate(zip(ids, fingerprints)):
+            entry = stored.get(str(asset_id))
+            if entry is not None and entry[0] == fingerprint:
+                scores[i] = entry[1]
+                stale[i] = False
+
+        indices = np.flatnonzero(stale)
+        if indices.size:
+            scores[indices] = self._score_arrays(types[indices], valuations[indices], due_dates[indices], today)
+            self.store.put_many([(ids[i], fingerprints[i], float(scores[i])) for i in indices])
+        return scores, int(indices.size)
+
+    @staticmethod
+    def _floats(values: Optional[List[Any]], n: int) -> np.ndarray:
+        """Numeric column as float64, with nulls as NaN"""
+        if values is None:
+            return np.full(n, np.nan)
+        return np.array([np.nan if value is None else value for value in values], dtype=float)
+
+    @staticmethod
+    def _score_arrays(types: np.ndarray, valuations: np.ndarray, due_dates: np.ndarray,
+                      today: np.datetime64) -> np.ndarray:
+        """RiskAnalyzer's rules, applied to whole columns at once"""
+        scores = np.full(types.shape, DEFAULT_BASE_RISK, dtype=float)
+        for asset_type, risk in BASE_RISK.items():
+            scores[types == asset_type] = risk
+
+        scores += np.where(np.nan_to_num(valuations) >= LARGE_VALUATION, LARGE_VALUATION_PENALTY, 0)
+        scores += np.minimum(PortfolioScorer._overdue_weeks(due_dates, today) * OVERDUE_PENALTY_PER_WEEK,
+                             OVERDUE_PENALTY_MAX)
+
+        return np.clip(scores, 0, 100)
+
+    @staticmethod
+    def _overdue_weeks(due_dates: np.ndarray, today: np.datetime64) -> np.ndarray:
+        """Started weeks past the due date, capped where the penalty stops growing"""
+        days_overdue = (today - due_dates).astype('timedelta64[D]').astype(float)
+        days_overdue[np.isnat(due_dates)] = 0
+        return np.minimum(np.ceil(np.clip(days_overdue, 0, None) / 7), OVERDUE_WEEKS_CAP)
@@ -0,0 +1,227 @@
+"""
+Request Profiling Module
+Opt-in cProfile and tracemalloc capture of single requests, stored with sampling and retention limits
+"""
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Callable, Iterator, List, Tuple
+
+PROFILE_HEADER = 'X-Profile-Token'
+
+# Allocation sites a worker sends back with its recording; reports keep the first top_n
+_RECORDED_ALLOCATIONS = 100
+
+
+class _RecordedStats:
+    """cProfile results received from another process, in the shape pstats.Stats loads"""
+    def __init__(self, stats: Dict[Any, Any]):
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
+
+
+def _allocation_sites(snapshot: tracemalloc.Snapshot, limit: int) -> List[Dict[str, Any]]:
+    # Leave out the profiler's own bookkeeping
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, cProfile.__file__),
+        tracemalloc.Filter(False, pstats.__file__),
+    ])
+    return [{'site': str(stat.traceback[0]), 'bytes': stat.size, 'blocks': stat.count}
+            for stat in snapshot.statistics('lineno')[:limit]]
+
+
+def profile_call(func: Callable[..., Any], *args: Any) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Call func(*args) under cProfile and tracemalloc, for work done in another process
+    Sandbox workers run profiled parses through this, so the parse keeps the
+    sandbox's limits; the recording is pickled back and added to the request's
+    report by setting it as info['sandbox'] (see RequestProfiler.profile).
+
+    Returns:
+        (func's result, recording)
+    """
+    profiler = cProfile.Profile()
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(10)
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        result = func(*args)
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if started_tracing:
+            tracemalloc.stop()
+    profiler.create_stats()
+    return result, {'stats': profiler.stats, 'wall_seconds': elapsed, 'peak_traced_bytes': peak,
+                    'top_allocations': _allocation_sites(snapshot, _RECORDED_ALLOCATIONS)}
+
+
+class RequestProfiler:
+    def __init__(self, token: Optional[str] = None, output_dir: Optional[str] = None,
+                 sample_rate: float = 1.0, max_profiles: int = 50, max_age_seconds: float = 7 * 24 * 3600,
+                 top_n: int = 30, trace_frames: int = 10):
+        """
+        Initialize request profiler
+
+        Args:
+            token: Admin secret a request must send in PROFILE_HEADER; None disables profiling
+            output_dir: Directory for .prof and .json reports
+            sample_rate: Fraction of authorized requests actually profiled (0..1)
+            max_profiles: Reports kept; the oldest are deleted beyond this
+            max_age_seconds: Reports older than this are deleted
+            top_n: Functions and allocation sites listed in each JSON report
+            trace_frames: Stack depth tracemalloc records per allocation
+        """
+        self.token = token or None
+        self.output_dir = output_dir or os.path.join(tempfile.gettempdir(), "mantleforge-profiles")
+        self.sample_rate = sample_rate
+        self.max_profiles = max_profiles
+        self.max_age_seconds = max_age_seconds
+        self.top_n = top_n
+        self.trace_frames = trace_frames
+        # cProfile and tracemalloc are process-wide, so one profile runs at a time
+        self._busy = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'RequestProfiler':
+        """Build a profiler from PROFILE_* environment variables"""
+        return cls(
+            token=os.getenv("PROFILE_TOKEN") or None,
+            output_dir=os.getenv("PROFILE_DIR") or None,
+            sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", 1.0)),
+            max_profiles=int(os.getenv("PROFILE_MAX_PROFILES", 50)),
+            max_age_seconds=float(os.getenv("PROFILE_MAX_AGE", 7 * 24 * 3600)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.token is not None
+
+    def requested(self, headers) -> bool:
+        """Whether this request carries the admin token and falls within the sample rate"""
+        supplied = headers.get(PROFILE_HEADER)
+        if not self.enabled or not supplied:
+            return False
+        if not hmac.compare_digest(supplied.encode(), self.token.encode()):
+            return False
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    @contextmanager
+    def profile(self, label: str) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        Run the with-block under cProfile and tracemalloc and store a report
+
+        Yields a dict that receives 'profile_id' once the report is written,
+        or None when another profile is already running (the block still runs,
+        unprofiled). Allocations by concurrent requests are traced too. Work
+        done in another process is included when the block stores that
+        process's profile_call recording in the dict as 'sandbox'.
+        """
+        if not self._busy.acquire(blocking=False):
+            yield None
+            return
+
+        info: Dict[str, Any] = {}
+        profiler = cProfile.Profile()
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(self.trace_frames)
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                yield info
+            finally:
+                profiler.disable()
+                elapsed = time.perf_counter() - start
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                if started_tracing:
+                    tracemalloc.stop()
+                # Failed requests are kept too; they are often the slow ones
+                info['profile_id'] = self._write(label, profiler, snapshot, elapsed, peak, info.get('sandbox'))
+        finally:
+            self._busy.release()
+
+    def _write(self, label: str, profiler: cProfile.Profile, snapshot: tracemalloc.Snapshot,
+               elapsed: float, peak: int, sandbox: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        Save <id>.prof (pstats) and <id>.json (summary), then apply retention
+        A sandbox recording's functions are merged into both; its allocations
+        are listed separately, since they happened in another process.
+        """
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            stats = pstats.Stats(profiler, stream=io.StringIO())
+            if sandbox is not None:
+                stats.add(_RecordedStats(sandbox['stats']))
+            stats.dump_stats(os.path.join(self.output_dir, f"{profile_id}.prof"))
+            report = {
+                'profile_id': profile_id,
+                'label': label,
+                'created_at': time.time(),
+                'wall_seconds': round(elapsed, 6),
+                'peak_traced_bytes': peak,
+                'top_functions': self._top_functions(stats),
+                'top_allocations': _allocation_sites(snapshot, self.top_n),
+            }
+            if sandbox is not None:
+                report['sandbox'] = {
+                    'wall_seconds': round(sandbox['wall_seconds'], 6),
+                    'peak_traced_bytes': sandbox['peak_traced_bytes'],
+                    'top_allocations': sandbox['top_allocations'][:self.top_n],
+                }
+            with open(os.path.join(self.output_dir, f"{profile_id}.json"), 'w') as f:
+                json.dump(report, f, indent=2)
+        except OSError as e:
+            print(f"Warning: Could not write profile: {e}")
+            return None
+        self._enforce_retention()
+        return profile_id
+
+    def _top_functions(self, stats: pstats.Stats) -> List[Dict[str, Any]]:
+        rows = []
+        for (filename, line, name), (_, calls, total, cumulative, _) in stats.stats.items():
+            rows.append({'function': f"{filename}:{line}({name})", 'calls': calls,
+                         'total_seconds': round(total, 6), 'cumulative_seconds': round(cumulative, 6)})
+        rows.sort(key=lambda row: row['cumulative_seconds'], reverse=True)
+        return rows[:self.top_n]
+
+    def _enforce_retention(self) -> None:
+        """Delete reports past max_age_seconds, then the oldest beyond max_profiles"""
+        try:
+            reports = sorted((entry for entry in os.scandir(self.output_dir) if entry.name.endswith('.json')),
+                             key=lambda entry: entry.stat().st_mtime)
+        except OSError:
+            return
+        cutoff = time.time() - self.max_age_seconds
+        expired = [entry for entry in reports if entry.stat().st_mtime < cutoff]
+        kept = [entry for entry in reports if entry.stat().st_mtime >= cutoff]
+        expired.extend(kept[:max(0, len(kept) - self.max_profiles)])
+        for entry in expired:
+            base = entry.path[:-len('.json')]
+            for path in (entry.path, f"{base}.prof"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,221 @@
+"""
+Result Cache Module
+Content-addressed cache for /api/analyze responses, keyed by PDF hash
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+from risk_analyzer import MODEL_VERSION
+
+# Disk writes between full rescans of the cache directory; in between, the size is tracked per write
+DISK_RESCAN_PUTS = 100
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 256, cache_dir: Optional[str] = None,
+                 max_disk_bytes: int = 256 * 1024 * 1024, ttl_seconds: float = 24 * 3600):
+        """
+        Initialize result cache
+
+        Args:
+            max_entries: Maximum number of results kept in the in-memory LRU tier
+            cache_dir: Directory for the on-disk tier (None disables it)
+            max_disk_bytes: Size budget for the on-disk tier
+            ttl_seconds: Age after which on-disk entries are treated as stale
+        """
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        # Bytes on disk as of the last rescan plus this process's writes since; None until the first rescan
+        self._disk_bytes: Optional[int] = None
+        self._disk_puts = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> 'ResultCache':
+        """Build a cache from RESULT_CACHE_* environment variables"""
+        return cls(
+            max_entries=int(os.getenv("RESULT_CACHE_SIZE", 256)),
+            cache_dir=os.getenv("RESULT_CACHE_DIR") or None,
+            max_disk_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+            ttl_seconds=float(os.getenv("RESULT_CACHE_TTL", 24 * 3600)),
+        )
+
+    @staticmethod
+    def digest(pdf_bytes: bytes) -> str:
+        """Hex SHA-256 of the document content"""
+        return hashlib.sha256(pdf_bytes).hexdigest()
+
+    @staticmethod
+    def make_key(digest: str, asset_type: str, method: str, **options: Any) -> str:
+        """
+        Build a cache key from the document digest and analysis parameters
+
+        Args:
+            options: Further parameters that change the result (e.g. max_pages); None values are ignored
+
+        Returns:
+            Hex SHA-256 over the PDF digest, asset type, extraction method, options
+            and the scoring rules' MODEL_VERSION
+        """
+        parts = [digest, asset_type, method, MODEL_VERSION]
+        parts.extend(f"{name}={value}" for name, value in sorted(options.items()) if value is not None)
+        return hashlib.sha256(":".join(parts).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached result, promoting disk hits into memory"""
+        if self.max_entries > 0:
+            with self._lock:
+                result = self._memory.get(key)
+                if result is not None:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return result
+
+        result = self._disk_get(key)
+        with self._lock:
+            if result is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['disk_hits'] += 1
+        self._memory_put(key, result)
+        return result
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        """Store a result in both tiers"""
+        self._memory_put(key, result)
+        self._disk_put(key, result)
+        with self._lock:
+            self._stats['stores'] += 1
+
+    def clear(self) -> None:
+        """Drop every cached result"""
+        with self._lock:
+            self._memory.clear()
+        if self.cache_dir:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.json'):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and tier sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['disk_enabled'] = bool(self.cache_dir)
+        return stats
+
+    def _memory_put(self, key: str, result: Dict[str, Any]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _disk_get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                os.remove(path)
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key: str, result: Dict[str, Any]) -> None:
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+                size = f.tell()
+            try:
+                size -= os.path.getsize(path)
+            except OSError:
+                pass
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Warning: Result cache write failed: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        # Rescanning the directory costs a stat per entry, so it only happens when this
+        # process's running total goes over budget or every DISK_RESCAN_PUTS writes,
+        # which also picks up other processes' writes and expired entries
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += size
+            self._disk_puts += 1
+            rescan = (self._disk_bytes is None or self._disk_bytes > self.max_disk_bytes
+                      or self._disk_puts >= DISK_RESCAN_PUTS)
+            if rescan:
+                self._disk_puts = 0
+        if rescan:
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        """Remove expired entries, then the oldest ones until under the size budget, and reset the running total"""
+        now = time.time()
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if now - st.st_mtime > self.ttl_seconds:
+                self._remove(path)
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            self._remove(path)
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+            with self._lock:
+                self._stats['evictions'] += 1
+        except OSError:
+            pass
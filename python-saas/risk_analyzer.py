@@ -3,19 +3,140 @@ Risk Analysis Module
 Handles AI-powered risk scoring for RWA assets using EmbedAPI
 """
 import os
-import requests
-from typing import Dict, Any
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional
+from http_client import HTTPClient, CircuitOpen, default_client
+from field_extractor import FieldExtractor, FIELD_WEIGHTS
+from metrics import STAGE_SECONDS, ERRORS
+
+# Starting risk score per asset type, before document-specific adjustments
+BASE_RISK = {
+    "invoice": 10,
+    "real_estate": 25,
+    "bond": 15
+}
+
+# Scoring rules shared by per-document and portfolio scoring.
+# Bump MODEL_VERSION whenever they change so stored fingerprints and cached results are invalidated
+MODEL_VERSION = "rules-1"
+LARGE_VALUATION = 1_000_000
+LARGE_VALUATION_PENALTY = 5
+MISSING_FIELD_PENALTY = 5
+NO_IBAN_PENALTY = 3
+# Portfolio sweeps: risk added per started week past the due date, up to a cap
+OVERDUE_PENALTY_PER_WEEK = 2
+OVERDUE_PENALTY_MAX = 30
+
+# Asset types whose fields the local extractor understands
+LOCAL_SCORING_ASSET_TYPES = ('invoice',)
+
+class RiskBatcher:
+    def __init__(self, send_batch: Callable[[List[Dict[str, Any]]], List[Any]], max_batch: int = 16,
+                 max_wait_ms: float = 20, max_in_flight: int = 4):
+        """
+        Collect concurrent requests into batches
+        
+        Args:
+            send_batch: Sends a list of items and returns one result per item, in order
+            max_batch: Largest batch sent at once
+            max_wait_ms: Longest a request waits for others to join its batch
+            max_in_flight: Batches that may be sending at the same time
+        """
+        self.send_batch = send_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self.max_in_flight = max(1, max_in_flight)
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    def submit(self, item: Dict[str, Any]) -> Future:
+        """Queue one item; the Future resolves to its result or the batch's exception"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+    
+    def _ensure_started(self) -> None:
+        """Start the dispatcher on first use, and again in a forked child"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue()
+            self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="risk-batch")
+            threading.Thread(target=self._dispatch, args=(self._queue, self._executor),
+                             name="risk-batcher", daemon=True).start()
+    
+    def _dispatch(self, pending: "queue.Queue[tuple]", executor: ThreadPoolExecutor) -> None:
+        while True:
+            batch = [pending.get()]
+            # The first request's deadline bounds the latency batching adds
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            executor.submit(self._send, batch)
+    
+    def _send(self, batch: List[tuple]) -> None:
+        try:
+            results = self.send_batch([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Batch response has {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
 
 class RiskAnalyzer:
-    def __init__(self):
+    def __init__(self, http_client: Optional[HTTPClient] = None, batch: Optional[bool] = None):
+        """
+        Initialize risk analyzer
+        
+        Args:
+            http_client: Client for backend/EmbedAPI calls (defaults to the shared pooled client)
+            batch: Micro-batch concurrent backend calls (RISK_BATCH_ENABLED, default off)
+        """
         # For Python, we'll use EmbedAPI REST API
         # Or call the backend which has embedapi/core
         self.api_key = os.getenv("EMBEDAPI_KEY")
+        self.embedapi_url = os.getenv("EMBEDAPI_URL")
         self.backend_url = os.getenv("BACKEND_URL", "http://localhost:3000")
-        self.use_backend = os.getenv("USE_BACKEND_AI", "true").lower() == "true"
+        self.backend_risk_path = os.getenv("BACKEND_RISK_PATH", "/api/analyze-risk")
+        # Opt-in: the backend does not serve BACKEND_RISK_PATH unless it has been deployed with it
+        self.use_backend = os.getenv("USE_BACKEND_AI", "false").lower() == "true"
+        self.http = http_client or default_client()
+        
+        if batch is None:
+            batch = os.getenv("RISK_BATCH_ENABLED", "false").lower() == "true"
+        self.backend_batch_path = os.getenv("BACKEND_RISK_BATCH_PATH", "/api/analyze-risk/batch")
+        self.batcher: Optional[RiskBatcher] = None
+        if batch:
+            self.batcher = RiskBatcher(
+                self._send_backend_batch,
+                max_batch=int(os.getenv("RISK_BATCH_MAX_ITEMS", 16)),
+                max_wait_ms=float(os.getenv("RISK_BATCH_MAX_WAIT_MS", 20)),
+            )
+        
+        # Documents whose fields are extracted confidently enough are scored without a remote call
+        self.field_extractor = FieldExtractor()
+        self.local_scoring = os.getenv("LOCAL_SCORING", "true").lower() == "true"
+        self.local_min_confidence = float(os.getenv("LOCAL_SCORING_MIN_CONFIDENCE", 0.8))
         
         if not self.api_key and not self.use_backend:
-            print("⚠️  EMBEDAPI_KEY not set. Risk analysis will use mock data or call backend.")
+            print("⚠️  EMBEDAPI_KEY not set and USE_BACKEND_AI off. Risk analysis will use local scoring or mock data.")
     
     def analyze(self, pdf_text: str, asset_type: str = "invoice") -> Dict[str, Any]:
         """
@@ -28,6 +149,17 @@ class RiskAnalyzer:
         Returns:
             Dictionary with risk_score, valuation, and extracted data
         """
+        with STAGE_SECONDS.time(stage='risk_analysis'):
+            return self._analyze(pdf_text, asset_type)
+    
+    def _analyze(self, pdf_text: str, asset_type: str) -> Dict[str, Any]:
+        # Option 0: Score locally when the fields were found with high confidence
+        if self.local_scoring and asset_type in LOCAL_SCORING_ASSET_TYPES:
+            with STAGE_SECONDS.time(stage='field_extraction'):
+                fields = self.field_extractor.extract(pdf_text)
+            if fields['confidence'] >= self.local_min_confidence:
+                return self._local_analysis(fields, asset_type)
+        
         # Option 1: Use backend's EmbedAPI (recommended)
         if self.use_backend:
             return self._analyze_via_backend(pdf_text, asset_type)
@@ -40,33 +172,101 @@ class RiskAnalyzer:
         return self._mock_analysis(asset_type)
     
     def _analyze_via_backend(self, pdf_text: str, asset_type: str) -> Dict[str, Any]:
-        """Call backend's EmbedAPI integration"""
+        """Call backend's EmbedAPI integration (POST {BACKEND_URL}/api/analyze-risk)"""
+        url = f"{self.backend_url.rstrip('/')}{self.backend_risk_path}"
         try:
-            # Backend will handle the AI analysis
-            # For now, return structured response
-            # In production, backend can expose an /api/analyze-risk endpoint
+            if self.batcher is not None:
+                data = self.batcher.submit({"pdf_text": pdf_text, "asset_type": asset_type}).result()
+            else:
+                data = self.http.post_json(url, {"pdf_text": pdf_text, "asset_type": asset_type})
+            return self._normalize_response(data, asset_type)
+        except CircuitOpen:
+            # Backend is known to be down; score locally without another attempt
+            ERRORS.inc(stage='risk_backend', error='CircuitOpen')
             return self._mock_analysis(asset_type)
         except Exception as e:
+            ERRORS.inc(stage='risk_backend', error=type(e).__name__)
             print(f"Error calling backend: {e}")
             return self._mock_analysis(asset_type)
     
+    def _send_backend_batch(self, items: List[Dict[str, Any]]) -> List[Any]:
+        """POST {BACKEND_URL}/api/analyze-risk/batch with {"items": [...]}; returns results in item order"""
+        url = f"{self.backend_url.rstrip('/')}{self.backend_batch_path}"
+        data = self.http.post_json(url, {"items": items})
+        results = data.get('results') if isinstance(data, dict) else data
+        if not isinstance(results, list):
+            raise ValueError("Batch response has no results list")
+        return results
+    
     def _analyze_via_embedapi(self, pdf_text: str, asset_type: str) -> Dict[str, Any]:
-        """Use EmbedAPI REST API directly"""
+        """Use EmbedAPI REST API directly (POST {EMBEDAPI_URL})"""
+        if not self.embedapi_url:
+            return self._mock_analysis(asset_type)
         try:
-            # TODO: Implement EmbedAPI REST API call if available
-            # For now, use mock
+            data = self.http.post_json(self.embedapi_url, {"text": pdf_text, "asset_type": asset_type},
+                                       headers={"Authorization": f"Bearer {self.api_key}"})
+            return self._normalize_response(data, asset_type)
+        except CircuitOpen:
+            ERRORS.inc(stage='risk_embedapi', error='CircuitOpen')
             return self._mock_analysis(asset_type)
         except Exception as e:
+            ERRORS.inc(stage='risk_embedapi', error=type(e).__name__)
             print(f"Error in EmbedAPI analysis: {e}")
             return self._mock_analysis(asset_type)
     
+    def _normalize_response(self, data: Any, asset_type: str) -> Dict[str, Any]:
+        """
+        Shape a remote analysis like _mock_analysis
+        
+        Raises:
+            ValueError: if the response has no numeric risk_score
+        """
+        if isinstance(data, dict) and isinstance(data.get('data'), dict):
+            data = data['data']
+        if not isinstance(data, dict) or not isinstance(data.get('risk_score'), (int, float)):
+            raise ValueError("Response has no numeric risk_score")
+        
+        extracted = data.get('extracted_data')
+        extracted = dict(extracted) if isinstance(extracted, dict) else {}
+        extracted.setdefault('asset_type', asset_type)
+        valuation = data.get('valuation', extracted.get('amount', 0))
+        return {
+            "risk_score": max(0, min(100, data['risk_score'])),
+            "valuation": valuation if isinstance(valuation, (int, float)) else 0,
+            "extracted_data": extracted,
+            "confidence": data.get('confidence', 0.85)
+        }
+    
+    def _local_analysis(self, fields: Dict[str, Any], asset_type: str) -> Dict[str, Any]:
+        """Deterministic risk score from locally extracted fields"""
+        risk = BASE_RISK.get(asset_type, 20)
+        # Each missing core field makes the document harder to verify
+        risk += MISSING_FIELD_PENALTY * sum(1 for name in FIELD_WEIGHTS if not fields.get(name))
+        if fields.get('iban') is None:
+            risk += NO_IBAN_PENALTY
+        if (fields.get('amount') or 0) >= LARGE_VALUATION:
+            risk += LARGE_VALUATION_PENALTY
+        
+        return {
+            "risk_score": max(0, min(100, risk)),
+            "valuation": fields.get('amount') or 0,
+            "extracted_data": {
+                "amount": fields['amount'],
+                "currency": fields['currency'],
+                "date": fields['date'],
+                "invoice_number": fields['invoice_number'],
+                "iban": fields['iban'],
+                "parties": fields['parties'],
+                "asset_type": asset_type,
+                "field_confidence": fields['field_confidence'],
+                "scoring": "local"
+            },
+            "confidence": fields['confidence']
+        }
+    
     def _mock_analysis(self, asset_type: str) -> Dict[str, Any]:
         """Mock risk analysis for development"""
-        base_risk = {
-            "invoice": 10,
-            "real_estate": 25,
-            "bond": 15
-        }.get(asset_type, 20)
+        base_risk = BASE_RISK.get(asset_type, 20)
         
         return {
             "risk_score": base_risk,
@@ -0,0 +1,195 @@
+"""
+Single-Flight Module
+Coalesces concurrent identical work so one caller computes and the others share its result, across threads and processes
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; coalescing then stays within one process
+    fcntl = None
+
+# How often a process waiting on another process's lock retries it
+LOCK_POLL_SECONDS = 0.02
+
+
+class _Call:
+    """One in-flight computation that later callers with the same key wait on"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    def __init__(self, lock_dir: Optional[str] = None, timeout: float = 90, handoff_seconds: float = 60):
+        """
+        Initialize single-flight coalescing
+
+        Args:
+            lock_dir: Directory for per-key lock files and result hand-off files,
+                shared by the worker processes on this host; None coalesces
+                within this process only. Hand-offs are trusted as results, so
+                it must be private to this user (created 0o700 if missing)
+            timeout: Longest a caller waits for another's result before computing it itself
+            handoff_seconds: Age after which hand-off files are deleted
+
+        Raises:
+            PermissionError: if lock_dir belongs to another user or others can write to it
+        """
+        self.lock_dir = lock_dir
+        self.timeout = timeout
+        self.handoff_seconds = handoff_seconds
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats = {'leaders': 0, 'shared': 0, 'shared_across_processes': 0, 'timeouts': 0}
+
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, mode=0o700, exist_ok=True)
+            st = os.stat(self.lock_dir)
+            if (hasattr(os, 'getuid') and st.st_uid != os.getuid()) or st.st_mode & 0o022:
+                raise PermissionError(f"Single-flight directory {self.lock_dir} must be private to this user")
+
+    @classmethod
+    def from_env(cls) -> 'SingleFlight':
+        """Build from SINGLE_FLIGHT_DIR and SINGLE_FLIGHT_TIMEOUT"""
+        return cls(
+            lock_dir=os.getenv("SINGLE_FLIGHT_DIR") or None,
+            timeout=float(os.getenv("SINGLE_FLIGHT_TIMEOUT", 90)),
+        )
+
+    def do(self, key: str, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run func() once for all concurrent callers with the same key
+
+        Callers in this process wait for the first one's result (or exception).
+        With a lock_dir, the first caller in each process also takes a file
+        lock, and a process that had to wait reuses the JSON result the lock
+        holder left behind. A failed computation is not shared across processes.
+
+        Returns:
+            (result, shared) where shared is True if another caller computed it
+
+        Raises:
+            Exception: whatever func raised, re-raised in every waiting caller in this process
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats['leaders'] += 1
+
+        if not leader:
+            if not call.done.wait(self.timeout):
+                self._count('timeouts')
+                return func(), False
+            if call.error is not None:
+                raise call.error
+            self._count('shared')
+            return call.result, True
+
+        try:
+            call.result, shared = self._do_locked(key, func)
+            return call.result, shared
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # New callers start a fresh flight; this one's waiters are released below
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        """Coalescing counters for this process"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _do_locked(self, key: str, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run func under the key's file lock, or reuse a result written while waiting for it"""
+        if not self.lock_dir or fcntl is None:
+            return func(), False
+
+        name = hashlib.sha256(key.encode()).hexdigest()
+        lock_path = os.path.join(self.lock_dir, f"{name}.lock")
+        handoff_path = os.path.join(self.lock_dir, f"{name}.json")
+        started = time.time()
+        with open(lock_path, 'a') as lock_file:
+            acquired = self._acquire(lock_file, time.monotonic() + self.timeout)
+            if not acquired:
+                self._count('timeouts')
+            try:
+                # Only a result finished after this caller arrived counts as in-flight work
+                handoff = self._read_handoff(handoff_path, started)
+                if handoff is not None:
+                    self._count('shared_across_processes')
+                    return handoff['result'], True
+                result = func()
+                self._write_handoff(handoff_path, result)
+                return result, False
+            finally:
+                if acquired:
+                    # Later arrivals start from a new lock file; waiters already holding this one still see the hand-off
+                    try:
+                        os.remove(lock_path)
+                    except OSError:
+                        pass
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _acquire(lock_file, deadline: float) -> bool:
+        """Take an exclusive lock on the file, polling so the wait can time out"""
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(LOCK_POLL_SECONDS)
+
+    @staticmethod
+    def _read_handoff(path: str, since: float) -> Optional[Dict[str, Any]]:
+        try:
+            if os.stat(path).st_mtime < since:
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_handoff(self, path: str, result: Any) -> None:
+        """Atomically store the result for processes waiting on the lock, then drop old hand-offs"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.lock_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'result': result}, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Warning: Could not share single-flight result: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        cutoff = time.time() - self.handoff_seconds
+        try:
+            for entry in os.scandir(self.lock_dir):
+                if entry.name.endswith('.json') and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+        except OSError:
+            pass
@@ -0,0 +1,67 @@
+"""
+SQLite Files Module
+Shared setup for the SQLite-backed stores: private database files, WAL mode and short-lived connections
+"""
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Any, Iterator, List
+
+# SQLite limits bound parameters per statement; IN (...) lookups go in chunks of this many keys
+CHUNK = 500
+
+
+def create_private_db(db_path: str) -> None:
+    """
+    Create the database file readable by this user only, and its directory 0o700 if missing
+    An existing file is tightened to 0o600; SQLite creates its WAL and
+    shared-memory files with the same mode.
+
+    Raises:
+        OSError: if db_path is a symlink or belongs to another user
+    """
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    fd = os.open(db_path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+    try:
+        st = os.fstat(fd)
+        if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+            raise PermissionError(f"Database {db_path} belongs to another user")
+        if st.st_mode & 0o077:
+            os.fchmod(fd, 0o600)
+    finally:
+        os.close(fd)
+
+
+def open_db(db_path: str, *schema: str) -> None:
+    """
+    Prepare a database shared by several worker processes
+    Creates the file privately (see create_private_db), switches it to WAL
+    so readers do not block the writer, and runs the schema statements.
+
+    Raises:
+        OSError: if db_path is a symlink or belongs to another user
+    """
+    create_private_db(db_path)
+    with connect(db_path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in schema:
+            conn.execute(statement)
+
+
+@contextmanager
+def connect(db_path: str) -> Iterator[sqlite3.Connection]:
+    """Short-lived connection that commits on success and always closes"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def chunked(keys: List[Any]) -> Iterator[List[Any]]:
+    """Split keys into CHUNK-sized lists for IN (...) lookups"""
+    for start in range(0, len(keys), CHUNK):
+        yield keys[start:start + CHUNK]
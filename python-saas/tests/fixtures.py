@@ -0,0 +1,128 @@
+"""
+Fixtures for tests
+Builds small, valid PDFs in memory and runs a local HTTP stub, without extra dependencies
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+
+def _escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def build_pdf(page_texts: List[str], info: Optional[Dict[str, str]] = None,
+              image_only: bool = False) -> bytes:
+    """
+    Build a PDF with one page per entry in page_texts
+
+    Args:
+        page_texts: Text for each page; newlines start a new line on the page
+        info: Optional Info dictionary entries, e.g. {'Title': 'Invoice'}
+        image_only: Draw a small image instead of text and declare no fonts,
+            like a scanned document
+
+    Returns:
+        PDF file as bytes
+    """
+    objects = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(b'')
+    pages = add(b'')
+    font = add(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+    pixels = b'\x80' * 4
+    image = add(b'<< /Type /XObject /Subtype /Image /Width 2 /Height 2 /ColorSpace /DeviceGray '
+                b'/BitsPerComponent 8 /Length %d >>\nstream\n' % len(pixels) + pixels + b'\nendstream')
+
+    kids = []
+    for text in page_texts:
+        if image_only:
+            stream = b'q 400 0 0 600 100 100 cm /Im1 Do Q'
+            resources = b'<< /XObject << /Im1 %d 0 R >> >>' % image
+        else:
+            lines = [f'({_escape(line)}) Tj T*' for line in text.split('\n')]
+            stream = f'BT /F1 12 Tf 14 TL 72 720 Td {" ".join(lines)} ET'.encode('latin-1')
+            resources = b'<< /Font << /F1 %d 0 R >> >>' % font
+        content = add(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+        kids.append(add(
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] '
+            b'/Resources %s /Contents %d 0 R >>' % (pages, resources, content)
+        ))
+
+    objects[catalog - 1] = b'<< /Type /Catalog /Pages %d 0 R >>' % pages
+    objects[pages - 1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % kid for kid in kids), len(kids))
+
+    info_ref = None
+    if info:
+        entries = ' '.join(f'/{key} ({_escape(value)})' for key, value in info.items())
+        info_ref = add(f'<< {entries} >>'.encode('latin-1'))
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    trailer = b'/Size %d /Root %d 0 R' % (len(objects) + 1, catalog)
+    if info_ref:
+        trailer += b' /Info %d 0 R' % info_ref
+    out += b'trailer\n<< ' + trailer + b' >>\nstartxref\n%d\n%%%%EOF\n' % xref
+    return bytes(out)
+
+
+class StubServer:
+    """
+    Local JSON HTTP server for client tests
+    `responses` is consumed in order, one (status, body) per request; the
+    last entry repeats. Each request records its path, JSON body, headers
+    and client port (so keep-alive reuse is visible).
+    """
+    def __init__(self, responses: List[Tuple[int, Dict]], delay: float = 0):
+        self.responses = list(responses)
+        self.delay = delay
+        self.requests: List[Dict] = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'null')
+                stub.requests.append({'path': self.path, 'json': body, 'headers': dict(self.headers),
+                                      'port': self.client_address[1]})
+                if stub.delay:
+                    threading.Event().wait(stub.delay)
+                status, payload = stub.responses.pop(0) if len(stub.responses) > 1 else stub.responses[0]
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+
+    def __enter__(self) -> 'StubServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.server.shutdown()
+        self.server.server_close()
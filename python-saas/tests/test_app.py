@@ -2,8 +2,28 @@
 Unit tests for Flask App
 """
 import unittest
+import io
 import json
-from app import app
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+import time
+import zipfile
+import app as app_module
+from parse_sandbox import SandboxError
+from profiling import RequestProfiler
+from app import app, result_cache, job_queue
+from job_queue import QueueFull
+from text_store import TextStore
+from tests.fixtures import build_pdf
+
+TEST_PDF = Path(__file__).parent / "test.pdf"
 
 class TestApp(unittest.TestCase):
     def setUp(self):
@@ -60,6 +80,440 @@ class TestApp(unittest.TestCase):
         # Should return 400 for invalid file type
         self.assertIn(response.status_code, [200, 400])
 
+    def test_analyze_repeat_upload_served_from_cache(self):
+        """Test repeat upload of the same PDF hits the result cache"""
+        result_cache.clear()
+        pdf_bytes = TEST_PDF.read_bytes()
+
+        first = self.app.post('/api/analyze', data={'pdf': (io.BytesIO(pdf_bytes), 'test.pdf')})
+        second = self.app.post('/api/analyze', data={'pdf': (io.BytesIO(pdf_bytes), 'test.pdf')})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.headers.get('X-Cache'), 'MISS')
+        self.assertEqual(second.headers.get('X-Cache'), 'HIT')
+        self.assertEqual(json.loads(first.data), json.loads(second.data))
+
+        stats = json.loads(self.app.get('/api/cache/stats').data)['cache']
+        self.assertGreaterEqual(stats['memory_hits'], 1)
+
+    def test_concurrent_identical_uploads_parse_once(self):
+        """Test identical uploads in flight at the same time share one parse and analysis"""
+        result_cache.clear()
+        pdf_bytes = build_pdf(['Invoice No: INV-22 Total due: $42.00'])
+        parse = app_module.pdf_parser.extract_document
+        started, release = threading.Event(), threading.Event()
+
+        def slow_parse(*args, **kwargs):
+            started.set()
+            release.wait(5)
+            return parse(*args, **kwargs)
+
+        def upload():
+            return app.test_client().post('/api/analyze', data={'pdf': (io.BytesIO(pdf_bytes), 'a.pdf')})
+
+        with patch.object(app_module.pdf_parser, 'extract_document', side_effect=slow_parse) as extract:
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                first = executor.submit(upload)
+                self.assertTrue(started.wait(5))
+                others = [executor.submit(upload) for _ in range(2)]
+                time.sleep(0.2)
+                release.set()
+                responses = [first.result()] + [future.result() for future in others]
+        self.assertEqual(extract.call_count, 1)
+        self.assertEqual([response.headers['X-Cache'] for response in responses], ['MISS', 'SHARED', 'SHARED'])
+        self.assertTrue(all(json.loads(response.data) == json.loads(responses[0].data) for response in responses))
+
+    def test_analyze_parses_spooled_upload(self):
+        """Test uploads over the spool threshold are parsed from disk"""
+        result_cache.clear()
+        with patch('app.PDF_SPOOL_THRESHOLD', 100):
+            response = self.app.post('/api/analyze', data={'pdf': (io.BytesIO(TEST_PDF.read_bytes()), 'test.pdf')})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(json.loads(response.data)['extracted_data']['text_length'], 10)
+
+    def test_analyze_rejects_oversized_upload(self):
+        """Test uploads over MAX_UPLOAD_BYTES are rejected with 413"""
+        with patch('app.MAX_UPLOAD_BYTES', 1024):
+            response = self.app.post('/api/analyze', data={'pdf': (io.BytesIO(b'%PDF-1.4' + b'0' * 4096), 'big.pdf')})
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(json.loads(response.data)['status'], 'error')
+
+    def test_analyze_max_pages_parameter(self):
+        """Test max_pages limits extraction and is part of the cache key"""
+        pdf_bytes = build_pdf(['Invoice cover page', 'Line items page', 'Terms page'])
+        full = json.loads(self.app.post('/api/analyze', data={'pdf': (io.BytesIO(pdf_bytes), 'a.pdf')}).data)
+        limited = json.loads(self.app.post('/api/analyze?max_pages=1',
+                                           data={'pdf': (io.BytesIO(pdf_bytes), 'a.pdf')}).data)
+        self.assertFalse(full['extracted_data']['text_truncated'])
+        self.assertTrue(limited['extracted_data']['text_truncated'])
+        self.assertNotIn('Terms', limited['pdf_text'])
+        self.assertIn('Terms', full['pdf_text'])
+
+    def test_analyze_pages_and_sample_parameters(self):
+        """Test pages / sample limit extraction, are reported back and are part of the cache key"""
+        result_cache.clear()
+        pdf_bytes = build_pdf([f'Section {i} of the lease' for i in range(1, 11)])
+        selected = self.app.post('/api/analyze?pages=9,2-3', data={'pdf': (io.BytesIO(pdf_bytes), 'a.pdf')})
+        data = json.loads(selected.data)
+        self.assertEqual(data['extracted_data']['pages_processed'], '2-3,9')
+        self.assertIn('Section 9', data['pdf_text'])
+        self.assertNotIn('Section 4', data['pdf_text'])
+
+        # Same selection written differently hits the cache
+        same = self.app.post('/api/analyze', data={'pdf': (io.BytesIO(pdf_bytes), 'a.pdf'), 'pages': '2,3,9'})
+        self.assertEqual(same.headers['X-Cache'], 'HIT')
+
+        sampled = json.loads(self.app.post('/api/analyze', data={'pdf': (io.BytesIO(pdf_bytes), 'a.pdf'),
+                                                                 'sample': '3'}).data)
+        self.assertEqual(sampled['extracted_data']['pages_processed'], '1,4,7')
+        full = json.loads(self.app.post('/api/analyze', data={'pdf': (io.BytesIO(pdf_bytes), 'a.pdf')}).data)
+        self.assertEqual(full['extracted_data']['pages_processed'], '1-10')
+
+        events = [json.loads(line) for line in self.app.post(
+            '/api/analyze/stream?pages=10', data={'pdf': (io.BytesIO(pdf_bytes), 'a.pdf')}
+        ).get_data(as_text=True).splitlines()]
+        self.assertEqual([event['page'] for event in events if event['type'] == 'page'], [10])
+        self.assertEqual(events[-1]['extracted_data']['pages_processed'], '10')
+
+    def test_analyze_rejects_invalid_page_selection(self):
+        """Test malformed pages / sample values are client errors"""
+        for data in ({'pages': '3-1'}, {'pages': 'first'}, {'pages': '0'}, {'sample': '0'}):
+            data['pdf'] = (io.BytesIO(TEST_PDF.read_bytes()), 'test.pdf')
+            response = self.app.post('/api/analyze', data=data)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(json.loads(response.data)['status'], 'error')
+
+    def test_analyze_rejects_selection_outside_document(self):
+        """Test a page selection past the last page is a client error with its own code"""
+        pdf_bytes = build_pdf(['Only page'])
+        response = self.app.post('/api/analyze?pages=4-6', data={'pdf': (io.BytesIO(pdf_bytes), 'a.pdf')})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data)['error_code'], 'pages_out_of_range')
+
+    def test_analyze_rejects_invalid_limit(self):
+        """Test a non-numeric limit is a client error"""
+        response = self.app.post('/api/analyze', data={'pdf': (io.BytesIO(TEST_PDF.read_bytes()), 'test.pdf'),
+                                                       'max_chars': 'lots'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_analyze_rejects_image_only_pdf_with_code(self):
+        """Test triage rejects a scanned PDF before extraction"""
+        pdf_bytes = build_pdf(['scan'], image_only=True)
+        with patch.object(app_module.pdf_parser, 'extract_text') as extract:
+            response = self.app.post('/api/analyze', data={'pdf': (io.BytesIO(pdf_bytes), 'scan.pdf')})
+            extract.assert_not_called()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data)['error_code'], 'image_only')
+
+    def test_analyze_reports_sandbox_limit(self):
+        """Test a document that hits a parse limit returns a clear error code"""
+        pdf_bytes = build_pdf(['Slow document'])
+        error = SandboxError('timeout', "PDF parsing exceeded the 60s time limit")
+        with patch.object(app_module.pdf_parser, 'extract_document', side_effect=error):
+            response = self.app.post('/api/analyze', data={'pdf': (io.BytesIO(pdf_bytes), 'slow.pdf')})
+        self.assertEqual(response.status_code, 400)
+        data = json.loads(response.data)
+        self.assertEqual(data['error_code'], 'timeout')
+        self.assertIn('time limit', data['message'])
+
+    def test_analyze_stream_emits_pages_then_result(self):
+        """Test /api/analyze/stream sends NDJSON page events and the same result as /api/analyze"""
+        result_cache.clear()
+        pdf_bytes = build_pdf(['Invoice No: INV-7 Total due: $10.00', 'Terms page'])
+        response = self.app.post('/api/analyze/stream', data={'pdf': (io.BytesIO(pdf_bytes), 'a.pdf')})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([event['type'] for event in events], ['start', 'page', 'page', 'result'])
+        self.assertEqual(events[2]['text'].strip(), 'Terms page')
+        self.assertEqual(events[-1]['cache'], 'MISS')
+
+        # Same cache key as the non-streaming endpoint
+        regular = self.app.post('/api/analyze', data={'pdf': (io.BytesIO(pdf_bytes), 'a.pdf')})
+        self.assertEqual(regular.headers.get('X-Cache'), 'HIT')
+        result = {key: value for key, value in events[-1].items() if key not in ('type', 'cache')}
+        self.assertEqual(json.loads(regular.data), result)
+
+    def test_analyze_stream_errors(self):
+        """Test stream rejects bad requests up front and reports parse failures as an error event"""
+        response = self.app.post('/api/analyze/stream', data={})
+        self.assertEqual(response.status_code, 400)
+        response = self.app.post('/api/analyze/stream', data={'pdf': (io.BytesIO(b'not a pdf'), 'junk.pdf')})
+        events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(events[-1]['type'], 'error')
+        self.assertEqual(events[-1]['error_code'], 'not_pdf')
+
+    def test_reanalyze_rescores_stored_text_without_parsing(self):
+        """Test /api/analyze stores the text and /api/reanalyze re-scores it by document_hash"""
+        result_cache.clear()
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, True)
+        store = TextStore(os.path.join(tmpdir, 'texts.sqlite3'))
+        pdf_bytes = build_pdf(['Invoice No: INV-23 Total due: $10.00', 'Terms page'])
+        with patch.object(app_module, 'text_store', store):
+            analyzed = json.loads(self.app.post('/api/analyze',
+                                                data={'pdf': (io.BytesIO(pdf_bytes), 'a.pdf')}).data)
+            document_hash = analyzed['document_hash']
+            self.assertEqual(store.get(document_hash, 'auto')['pages'][1].strip(), 'Terms page')
+
+            with patch.object(app_module.pdf_parser, 'extract_document') as extract, \
+                    patch.object(app_module.risk_analyzer, 'analyze',
+                                 return_value={'risk_score': 77, 'valuation': 10, 'extracted_data': {}}):
+                response = self.app.post('/api/reanalyze', json={'document_hashes': [document_hash, 'f' * 64]})
+                extract.assert_not_called()
+                data = json.loads(response.data)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual((data['succeeded'], data['failed']), (1, 1))
+                self.assertEqual(data['results'][0]['risk_score'], 77)
+                self.assertEqual(data['results'][0]['pdf_text'], analyzed['pdf_text'])
+                self.assertEqual(data['results'][1]['error_code'], 'not_found')
+
+                # The new score replaces the cached one
+                again = self.app.post('/api/analyze', data={'pdf': (io.BytesIO(pdf_bytes), 'a.pdf')})
+                self.assertEqual(again.headers['X-Cache'], 'HIT')
+                self.assertEqual(json.loads(again.data)['risk_score'], 77)
+
+                # Backfill pages through every stored document
+                page = json.loads(self.app.post('/api/reanalyze', json={'limit': 1}).data)
+                self.assertEqual([r['document_hash'] for r in page['results']], [document_hash])
+                self.assertEqual(page['next_after'], document_hash)
+
+            # A page selection is its own stored extraction and keeps its page list
+            self.app.post('/api/analyze', data={'pdf': (io.BytesIO(pdf_bytes), 'a.pdf'), 'pages': '2'})
+            selected = json.loads(self.app.post('/api/reanalyze', json={'document_hashes': [document_hash],
+                                                                        'pages': '2'}).data)
+            self.assertEqual(selected['results'][0]['extracted_data']['pages_processed'], '2')
+            self.assertIn('Terms page', selected['results'][0]['pdf_text'])
+
+    def test_reanalyze_rejects_bad_input(self):
+        """Test reanalyze validates its body and reports a disabled store"""
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, True)
+        with patch.object(app_module, 'text_store', TextStore(os.path.join(tmpdir, 'texts.sqlite3'))):
+            for body in ({'document_hashes': 'abc'}, {'document_hashes': [], 'max_pages': 0},
+                         {'document_hashes': [], 'pages': '2-1'}):
+                self.assertEqual(self.app.post('/api/reanalyze', json=body).status_code, 400)
+        with patch.object(app_module, 'text_store', None):
+            self.assertEqual(self.app.post('/api/reanalyze', json={}).status_code, 503)
+
+    def test_metadata_endpoint(self):
+        """Test /api/metadata returns the Info dictionary and page count without extracting text"""
+        pdf_bytes = build_pdf(['One', 'Two', 'Three'], info={'Title': 'Lease'})
+        with patch.object(app_module.pdf_parser, 'extract_document') as extract:
+            response = self.app.post('/api/metadata', data={'pdf': (io.BytesIO(pdf_bytes), 'lease.pdf')})
+            extract.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['metadata']['title'], 'Lease')
+        self.assertEqual(data['metadata']['num_pages'], 3)
+        self.assertEqual(len(data['document_hash']), 64)
+
+        response = self.app.post('/api/metadata', data={'pdf': (io.BytesIO(b'not a pdf'), 'junk.pdf')})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.app.post('/api/metadata', data={}).status_code, 400)
+
+    def test_metrics_report_each_stage(self):
+        """Test /api/metrics exposes per-stage histograms, including stages run in the parse sandbox"""
+        pdf_bytes = build_pdf(['Metrics invoice total due: $120.00'])
+        self.app.post('/api/analyze', data={'pdf': (io.BytesIO(pdf_bytes), 'metrics.pdf')})
+        self.app.post('/api/analyze', data={'pdf': (io.BytesIO(b'not a pdf at all'), 'junk.pdf')})
+
+        response = self.app.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        for stage in ('upload_read', 'parse', 'triage', 'extract_auto', 'metadata', 'risk_analysis'):
+            self.assertIn(f'mantleforge_stage_seconds_count{{stage="{stage}"}}', text)
+        self.assertIn('mantleforge_upload_bytes_count', text)
+        self.assertIn('mantleforge_pdf_pages_bucket', text)
+        self.assertIn('mantleforge_errors_total{error="not_pdf",stage="triage"}', text)
+        self.assertIn('mantleforge_requests_total{endpoint="/api/analyze",status="200"}', text)
+
+    def test_analyze_profiled_with_admin_token(self):
+        """Test X-Profile-Token profiles one request, bypassing the cache, and reports the profile id"""
+        pdf_bytes = build_pdf(['Profiled invoice total due: $42.00'])
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir, True)
+        profiler = RequestProfiler(token='admin-secret', output_dir=output_dir)
+        with patch.object(app_module, 'request_profiler', profiler):
+            self.app.post('/api/analyze', data={'pdf': (io.BytesIO(pdf_bytes), 'p.pdf')})
+            plain = self.app.post('/api/analyze', data={'pdf': (io.BytesIO(pdf_bytes), 'p.pdf')},
+                                  headers={'X-Profile-Token': 'wrong'})
+            profiled = self.app.post('/api/analyze', data={'pdf': (io.BytesIO(pdf_bytes), 'p.pdf')},
+                                     headers={'X-Profile-Token': 'admin-secret'})
+
+        self.assertNotIn('X-Profile-Id', plain.headers)
+        self.assertEqual(profiled.status_code, 200)
+        self.assertEqual(profiled.headers.get('X-Cache'), 'MISS')
+        profile_id = profiled.headers['X-Profile-Id']
+        with open(os.path.join(output_dir, f"{profile_id}.json")) as f:
+            report = json.load(f)
+        self.assertTrue(any('pdf_parser' in row['function'] for row in report['top_functions']))
+        # With the sandbox on, the parse was profiled inside the sandbox worker
+        self.assertEqual('sandbox' in report, app_module.parse_sandbox is not None)
+
+    def test_warmup_endpoint(self):
+        """Test /api/warmup loads the parsers and reports timings"""
+        response = self.app.post('/api/warmup')
+        self.assertEqual(response.status_code, 200)
+        report = json.loads(response.data)['warmup']
+        self.assertEqual(set(report['pdf_parser']['in_process']), {'pypdf2', 'pdfplumber'})
+        self.assertIn('total_seconds', report)
+
+    def test_import_does_not_load_heavy_libraries(self):
+        """Test importing the app leaves PDF engines, NumPy and requests for first use"""
+        probe = ("import sys, app; print('loaded:' + ','.join(name for name in "
+                 "('PyPDF2', 'pdfplumber', 'pdfminer', 'numpy', 'requests') if name in sys.modules))")
+        output = subprocess.run([sys.executable, '-c', probe], cwd=Path(__file__).parent.parent,
+                                capture_output=True, text=True, check=True).stdout
+        self.assertIn('loaded:\n', output)
+
+    def test_batch_mixed_items_report_per_item_errors(self):
+        """Test batch returns one result per PDF part and isolates failures"""
+        result_cache.clear()
+        response = self.app.post('/api/analyze/batch', data={
+            'pdf': [
+                (io.BytesIO(build_pdf(['Invoice 1001 total 500 EUR'])), 'a.pdf'),
+                (io.BytesIO(b'not a pdf at all'), 'broken.pdf'),
+                (io.BytesIO(b'text'), 'notes.txt'),
+            ],
+            'items': json.dumps([{'pdf_text': 'Bond coupon schedule', 'asset_type': 'bond'}]),
+        })
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['count'], 4)
+        self.assertEqual(data['succeeded'], 2)
+        statuses = [r['status'] for r in data['results']]
+        self.assertEqual(statuses, ['success', 'error', 'error', 'success'])
+        self.assertEqual(data['results'][3]['asset_type'], 'bond')
+
+    def test_batch_zip_archive(self):
+        """Test PDFs inside a zip archive are analyzed individually"""
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('one.pdf', build_pdf(['First invoice document']))
+            zf.writestr('two.pdf', build_pdf(['Second invoice document']))
+            zf.writestr('readme.txt', 'ignored')
+        archive.seek(0)
+        response = self.app.post('/api/analyze/batch', data={'archive': (archive, 'book.zip')})
+        data = json.loads(response.data)
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([r['name'] for r in data['results']], ['book.zip/one.pdf', 'book.zip/two.pdf'])
+        self.assertEqual(data['failed'], 0)
+
+    def test_batch_zip_over_item_cap_not_expanded(self):
+        """Test an archive with more PDFs than the batch allows is rejected before any member is read"""
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for i in range(3):
+                zf.writestr(f'{i}.pdf', b'\0' * (1024 * 1024))
+        archive.seek(0)
+        with patch('app.BATCH_MAX_ITEMS', 2), patch('app.spool_upload') as spool:
+            response = self.app.post('/api/analyze/batch', data={'archive': (archive, 'many.zip')})
+            spool.assert_not_called()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('maximum of 2 items', json.loads(response.data)['message'])
+
+    def test_batch_zip_bomb_rejected(self):
+        """Test archives whose PDFs expand beyond the batch budget are rejected without being expanded"""
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('small.pdf', build_pdf(['Small invoice document']))
+            zf.writestr('bomb.pdf', b'\0' * (4 * 1024 * 1024))
+        self.assertLess(archive.tell(), 64 * 1024)
+        archive.seek(0)
+        with patch('app.BATCH_MAX_BYTES', 1024 * 1024), patch('app.spool_upload') as spool:
+            response = self.app.post('/api/analyze/batch', data={'archive': (archive, 'bomb.zip')})
+            spool.assert_not_called()
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(json.loads(response.data)['status'], 'error')
+
+    def test_batch_zip_budget_shared_across_archives(self):
+        """Test the decompressed-byte budget covers every archive in the batch, not each one separately"""
+        def zipped(name, size):
+            archive = io.BytesIO()
+            with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+                zf.writestr(name, b'\0' * size)
+            archive.seek(0)
+            return archive
+        with patch('app.BATCH_MAX_BYTES', 3 * 1024 * 1024):
+            response = self.app.post('/api/analyze/batch', data={
+                'archive': [(zipped('a.pdf', 2 * 1024 * 1024), 'a.zip'), (zipped('b.pdf', 2 * 1024 * 1024), 'b.zip')]
+            })
+        self.assertEqual(response.status_code, 413)
+
+    def test_batch_pdf_parts_share_budget(self):
+        """Test direct PDF parts count against the batch budget and are cut off while the body streams"""
+        parts = [(io.BytesIO(b'%PDF-1.4 ' + b'0' * (1024 * 1024)), f'{i}.pdf') for i in range(4)]
+        with tempfile.TemporaryDirectory() as spool_dir, \
+                patch('app.BATCH_MAX_BYTES', 2 * 1024 * 1024), \
+                patch('app.PDF_SPOOL_THRESHOLD', 1024), patch('app.UPLOAD_SPOOL_DIR', spool_dir):
+            response = self.app.post('/api/analyze/batch', data={'pdf': parts})
+            self.assertEqual(os.listdir(spool_dir), [])
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('combined maximum', json.loads(response.data)['message'])
+
+    def test_batch_json_items(self):
+        """Test a JSON array of pdf_text items"""
+        response = self.app.post('/api/analyze/batch',
+                                 data=json.dumps([{'pdf_text': 'Invoice'}, {'pdf_text': ''}]),
+                                 content_type='application/json')
+        data = json.loads(response.data)
+        self.assertEqual([r['status'] for r in data['results']], ['success', 'error'])
+
+    def test_batch_empty(self):
+        """Test an empty batch is rejected"""
+        response = self.app.post('/api/analyze/batch', data={})
+        self.assertEqual(response.status_code, 400)
+
+    def test_analysis_job_round_trip(self):
+        """Test a queued PDF job can be polled to its result"""
+        response = self.app.post('/api/analyze/jobs', data={'pdf': (io.BytesIO(TEST_PDF.read_bytes()), 'test.pdf')})
+        self.assertEqual(response.status_code, 202)
+        job_id = json.loads(response.data)['job_id']
+
+        deadline = time.time() + 10
+        while True:
+            job = json.loads(self.app.get(f'/api/analyze/jobs/{job_id}').data)['job']
+            if job['status'] in ('succeeded', 'failed') or time.time() > deadline:
+                break
+            time.sleep(0.05)
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['result']['status'], 'success')
+
+    def test_analysis_job_queue_full(self):
+        """Test a full job queue answers 429"""
+        with patch.object(job_queue, 'submit', side_effect=QueueFull('full')):
+            response = self.app.post('/api/analyze/jobs', data=json.dumps({'pdf_text': 'Invoice'}),
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+
+    def test_analysis_job_dir_must_be_private(self):
+        """Test job uploads are refused in a shared directory and stored 0o600 in a private one"""
+        with tempfile.TemporaryDirectory() as root:
+            shared = os.path.join(root, 'shared')
+            os.mkdir(shared)
+            os.chmod(shared, 0o777)
+            with patch('app.JOBS_DIR', shared), patch.object(job_queue, 'submit') as submit:
+                response = self.app.post('/api/analyze/jobs',
+                                         data={'pdf': (io.BytesIO(TEST_PDF.read_bytes()), 'test.pdf')})
+                submit.assert_not_called()
+            self.assertEqual(response.status_code, 500)
+            self.assertEqual(os.listdir(shared), [])
+
+            private = os.path.join(root, 'jobs')
+            with patch('app.JOBS_DIR', private), patch.object(job_queue, 'submit', return_value='job') as submit:
+                response = self.app.post('/api/analyze/jobs',
+                                         data={'pdf': (io.BytesIO(TEST_PDF.read_bytes()), 'test.pdf')})
+                path = submit.call_args[0][0]['path']
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(os.stat(private).st_mode & 0o777, 0o700)
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+
+    def test_analysis_job_not_found(self):
+        """Test polling an unknown job answers 404"""
+        self.assertEqual(self.app.get('/api/analyze/jobs/missing').status_code, 404)
+
     def test_cors_headers(self):
         """Test CORS headers are present"""
         response = self.app.get('/api/health')
@@ -67,7 +521,25 @@ class TestApp(unittest.TestCase):
         # Check if Access-Control-Allow-Origin is present
         self.assertIn('Access-Control-Allow-Origin', str(response.headers))
 
+    def test_portfolio_returns_changed_assets(self):
+        """Test one portfolio request scores every asset and returns the movers"""
+        response = self.app.post('/api/risk/portfolio', json={
+            'assets': {'id': ['a', 'b'], 'asset_type': ['invoice', 'bond'], 'last_risk': [10, 0]},
+            'threshold': 5
+        })
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['results']['id'], ['b'])
+        self.assertEqual(data['results']['risk_score'], [15])
+
+    def test_portfolio_rejects_bad_input(self):
+        """Test malformed portfolio requests return 400"""
+        for body in ({}, {'assets': {'asset_type': ['invoice'], 'valuation': []}},
+                     {'assets': {'asset_type': ['invoice']}, 'threshold': -1}):
+            response = self.app.post('/api/risk/portfolio', json=body)
+            self.assertEqual(response.status_code, 400)
+
 if __name__ == '__main__':
-    import io
     unittest.main()
 
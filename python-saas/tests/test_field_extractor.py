@@ -0,0 +1,71 @@
+"""
+Unit tests for Field Extractor
+"""
+import unittest
+from field_extractor import FieldExtractor, _iban_valid, _parse_amount
+
+INVOICE_TEXT = """ACME Supplies Ltd
+Invoice No: INV-2024-0042
+Invoice Date: 15/03/2024
+Bill To: Globex Corporation
+From: ACME Supplies Ltd
+Bolts 10 $2.50 $25.00
+Subtotal $1,200.00
+Total due: $1,440.00
+IBAN: DE89 3704 0044 0532 0130 00
+"""
+
+class TestFieldExtractor(unittest.TestCase):
+    def setUp(self):
+        self.extractor = FieldExtractor()
+
+    def test_extracts_invoice_fields(self):
+        """Test every field is found in a typical invoice"""
+        fields = self.extractor.extract(INVOICE_TEXT)
+        self.assertEqual(fields['amount'], 1440.0)
+        self.assertEqual(fields['currency'], 'USD')
+        self.assertEqual(fields['date'], '2024-03-15')
+        self.assertEqual(fields['invoice_number'], 'INV-2024-0042')
+        self.assertEqual(fields['iban'], 'DE89370400440532013000')
+        self.assertEqual(fields['parties'], ['Globex Corporation', 'ACME Supplies Ltd'])
+        self.assertGreaterEqual(fields['confidence'], 0.9)
+
+    def test_unlabeled_values_get_lower_confidence(self):
+        """Test unlabeled amounts and dates are used with reduced confidence"""
+        fields = self.extractor.extract("Payment of EUR 2.500,00 received on March 3, 2024")
+        self.assertEqual(fields['amount'], 2500.0)
+        self.assertEqual(fields['currency'], 'EUR')
+        self.assertEqual(fields['date'], '2024-03-03')
+        self.assertLess(fields['field_confidence']['amount'], 0.9)
+        self.assertLess(fields['confidence'], 0.8)
+
+    def test_no_fields(self):
+        """Test plain text yields empty fields and zero confidence"""
+        fields = self.extractor.extract("Sample invoice text")
+        self.assertIsNone(fields['amount'])
+        self.assertEqual(fields['parties'], [])
+        self.assertEqual(fields['confidence'], 0.0)
+        self.assertEqual(self.extractor.extract('')['confidence'], 0.0)
+
+    def test_invalid_values_are_ignored(self):
+        """Test impossible dates and IBANs failing mod-97 are dropped"""
+        fields = self.extractor.extract("Date: 31/02/2024\nIBAN DE00 3704 0044 0532 0130 00")
+        self.assertIsNone(fields['date'])
+        self.assertIsNone(fields['iban'])
+
+    def test_values_start_at_word_boundaries(self):
+        """Test digits inside an identifier are not read as an amount, while indented labels still are"""
+        fields = self.extractor.extract("Ref X100 EUR\n   Bill To: Globex Corporation\nTotal:€90")
+        self.assertEqual((fields['amount'], fields['currency']), (90.0, 'EUR'))
+        self.assertEqual(fields['parties'], ['Globex Corporation'])
+
+    def test_helpers(self):
+        """Test amount parsing and the IBAN checksum"""
+        self.assertEqual(_parse_amount('1,234.56'), 1234.56)
+        self.assertEqual(_parse_amount('1.234,56'), 1234.56)
+        self.assertEqual(_parse_amount('1,234'), 1234.0)
+        self.assertTrue(_iban_valid('GB82 WEST 1234 5698 7654 32'))
+        self.assertFalse(_iban_valid('GB82 WEST 1234 5698 7654 33'))
+
+if __name__ == '__main__':
+    unittest.main()
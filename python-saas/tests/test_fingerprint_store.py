@@ -0,0 +1,59 @@
+"""
+Unit tests for Fingerprint Store
+"""
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+from unittest.mock import patch
+from fingerprint_store import FingerprintStore, make_fingerprint
+
+class TestFingerprintStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = FingerprintStore(os.path.join(self.tmpdir, 'fingerprints.sqlite3'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_from_env_is_opt_in(self):
+        """Test no store is built unless RISK_FINGERPRINT_DB is set"""
+        with patch.dict(os.environ, {'RISK_FINGERPRINT_DB': ''}):
+            self.assertIsNone(FingerprintStore.from_env())
+
+    def test_store_is_private(self):
+        """Test the database is 0o600 in a 0o700 directory and a planted symlink is rejected"""
+        path = os.path.join(self.tmpdir, 'private', 'fingerprints.sqlite3')
+        FingerprintStore(path).put_many([(1, 'fp1', 10.0)])
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode), 0o700)
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+
+        link = os.path.join(self.tmpdir, 'link.sqlite3')
+        os.symlink(path, link)
+        with self.assertRaises(OSError):
+            FingerprintStore(link)
+
+    def test_make_fingerprint_is_order_independent(self):
+        """Test fingerprints depend on content, not key order"""
+        self.assertEqual(make_fingerprint({'a': 1, 'b': 2}), make_fingerprint({'b': 2, 'a': 1}))
+        self.assertNotEqual(make_fingerprint({'a': 1}), make_fingerprint({'a': 2}))
+
+    def test_put_and_get_many(self):
+        """Test rows round-trip and ids are matched as strings"""
+        self.store.put_many([(1, 'fp1', 10.0), ('b', 'fp2', {'score': 5})])
+        found = self.store.get_many([1, 'b', 'missing'])
+        self.assertEqual(found, {'1': ('fp1', 10.0), 'b': ('fp2', {'score': 5})})
+
+        self.store.put_many([(1, 'fp3', 12.0)])
+        self.assertEqual(self.store.get_many(['1'])['1'], ('fp3', 12.0))
+
+    def test_get_many_chunks_large_lookups(self):
+        """Test lookups beyond the SQLite parameter limit"""
+        self.store.put_many([(i, f'fp{i}', i) for i in range(1200)])
+        self.assertEqual(len(self.store.get_many(range(1200))), 1200)
+        self.store.clear()
+        self.assertEqual(self.store.get_many(range(1200)), {})
+
+if __name__ == '__main__':
+    unittest.main()
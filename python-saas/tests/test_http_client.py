@@ -0,0 +1,93 @@
+"""
+Unit tests for HTTP Client
+"""
+import unittest
+from unittest.mock import patch
+import requests
+from http_client import HTTPClient, CircuitBreaker, CircuitOpen
+from tests.fixtures import StubServer
+
+
+def _client(**kwargs):
+    options = dict(connect_timeout=1, read_timeout=2, retries=2, backoff=0.01, failure_threshold=2,
+                   reset_timeout=60)
+    options.update(kwargs)
+    return HTTPClient(**options)
+
+
+class TestHTTPClient(unittest.TestCase):
+    def test_post_json_reuses_one_connection(self):
+        """Test consecutive calls share a keep-alive connection"""
+        client = _client()
+        with StubServer([(200, {'ok': True})]) as stub:
+            for _ in range(3):
+                self.assertEqual(client.post_json(f"{stub.url}/api/analyze-risk", {'n': 1}), {'ok': True})
+        self.assertEqual(len({r['port'] for r in stub.requests}), 1)
+        self.assertEqual(stub.requests[0]['path'], '/api/analyze-risk')
+        self.assertEqual(stub.requests[0]['json'], {'n': 1})
+
+    def test_retries_retryable_status_then_succeeds(self):
+        """Test 503s are retried and the eventual success is returned"""
+        client = _client()
+        with StubServer([(503, {}), (503, {}), (200, {'risk_score': 12})]) as stub:
+            self.assertEqual(client.post_json(stub.url, {}), {'risk_score': 12})
+        self.assertEqual(len(stub.requests), 3)
+        self.assertEqual(client.breaker(stub.url).state, 'closed')
+
+    def test_client_errors_are_not_retried(self):
+        """Test a 400 fails at once and does not count against the host"""
+        client = _client()
+        with StubServer([(400, {'error': 'bad'})]) as stub:
+            with self.assertRaises(requests.HTTPError):
+                client.post_json(stub.url, {})
+        self.assertEqual(len(stub.requests), 1)
+        self.assertEqual(client.breaker(stub.url).state, 'closed')
+
+    def test_read_timeout(self):
+        """Test a slow response fails after the read timeout"""
+        client = _client(read_timeout=0.2, retries=0)
+        with StubServer([(200, {})], delay=1) as stub:
+            with self.assertRaises(requests.Timeout):
+                client.post_json(stub.url, {})
+
+    def test_circuit_opens_after_failures(self):
+        """Test an unhealthy host is short-circuited without further requests"""
+        client = _client(retries=1)
+        with StubServer([(500, {})]) as stub:
+            for _ in range(2):
+                with self.assertRaises(requests.HTTPError):
+                    client.post_json(stub.url, {})
+            with self.assertRaises(CircuitOpen):
+                client.post_json(stub.url, {})
+        self.assertEqual(len(stub.requests), 4)
+
+    def test_breaker_half_open_trial(self):
+        """Test one trial call after reset_timeout closes or reopens the circuit"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'half_open')
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.allow())
+
+    def test_unexpected_error_ends_half_open_trial(self):
+        """Test a trial call failing with any other RequestException still reopens, then recovers"""
+        client = _client(failure_threshold=1, reset_timeout=0)
+        with StubServer([(200, {'ok': True})]) as stub:
+            breaker = client.breaker(stub.url)
+            breaker.record_failure()
+            with patch.object(client.session, 'post', side_effect=requests.exceptions.ChunkedEncodingError):
+                with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                    client.post_json(stub.url, {})
+            self.assertEqual(breaker.state, 'half_open')
+            self.assertEqual(client.post_json(stub.url, {}), {'ok': True})
+        self.assertEqual(breaker.state, 'closed')
+
+if __name__ == '__main__':
+    unittest.main()
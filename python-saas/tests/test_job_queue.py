@@ -0,0 +1,84 @@
+"""
+Unit tests for Job Queue
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from job_queue import JobQueue, QueueFull
+
+def wait_for(queue, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in ('succeeded', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+class TestJobQueue(unittest.TestCase):
+    def test_job_succeeds(self):
+        """Test a job runs on a worker and exposes its result"""
+        queue = JobQueue(lambda payload: {'doubled': payload['n'] * 2}, workers=1)
+        job = wait_for(queue, queue.submit({'n': 21}))
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['result'], {'doubled': 42})
+
+    def test_job_failure_records_error(self):
+        """Test handler exceptions mark the job failed"""
+        def handler(payload):
+            raise ValueError('bad document')
+        cleaned = []
+        queue = JobQueue(handler, workers=1, cleanup=cleaned.append)
+        job = wait_for(queue, queue.submit({'n': 1}))
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error'], 'bad document')
+        self.assertEqual(cleaned, [{'n': 1}])
+
+    def test_queue_full(self):
+        """Test submit rejects once max_queue jobs are waiting"""
+        release = threading.Event()
+        queue = JobQueue(lambda payload: release.wait(5) and {}, workers=1, max_queue=1)
+        first = queue.submit({})
+        deadline = time.time() + 5
+        while queue.get(first)['status'] != 'running' and time.time() < deadline:
+            time.sleep(0.01)
+        queue.submit({})
+        with self.assertRaises(QueueFull):
+            queue.submit({})
+        release.set()
+
+    def test_unknown_job(self):
+        """Test unknown ids return None"""
+        self.assertIsNone(JobQueue(lambda payload: {}).get('missing'))
+
+    def test_sqlite_persistence_and_recovery(self):
+        """Test results are readable from SQLite and orphaned jobs are requeued"""
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'jobs.db')
+            queue = JobQueue(lambda payload: {'ok': payload['n']}, workers=1, db_path=db_path)
+            # Payloads carry document text and paths, so the file is private like the other stores
+            self.assertEqual(os.stat(db_path).st_mode & 0o777, 0o600)
+            job_id = queue.submit({'n': 1})
+            wait_for(queue, job_id)
+            queue._queue.join()
+
+            # A different process (fresh instance) reads the finished job from SQLite
+            reader = JobQueue(lambda payload: {}, db_path=db_path)
+            self.assertEqual(reader.get(job_id)['result'], {'ok': 1})
+
+            # A queued job whose owner process is gone is picked up on start, before any submit
+            with sqlite3.connect(db_path) as conn:
+                conn.execute("INSERT INTO jobs (job_id, status, payload, owner, created_at)"
+                             " VALUES ('orphan', 'queued', '{\"n\": 7}', 999999999, 0)")
+            recovering = JobQueue(lambda payload: {'ok': payload['n']}, workers=1, db_path=db_path)
+            recovering.start()
+            self.assertEqual(wait_for(recovering, 'orphan')['result'], {'ok': 7})
+            second = recovering.submit({'n': 2})
+            wait_for(recovering, second)
+            recovering._queue.join()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+"""
+Tests for Metrics Registry
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from metrics import MetricsRegistry
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.seconds = self.registry.histogram('test_seconds', 'Test latency', (0.1, 1))
+        self.errors = self.registry.counter('test_errors_total', 'Test errors')
+
+    def test_counter_renders_per_label_set(self):
+        self.errors.inc(stage='triage', error='not_pdf')
+        self.errors.inc(2, stage='triage', error='not_pdf')
+        self.errors.inc(stage='metadata', error='KeyError')
+        text = self.registry.render()
+        self.assertIn('# TYPE test_errors_total counter', text)
+        self.assertIn('test_errors_total{error="not_pdf",stage="triage"} 3', text)
+        self.assertIn('test_errors_total{error="KeyError",stage="metadata"} 1', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        for value in (0.05, 0.5, 5):
+            self.seconds.observe(value, stage='parse')
+        text = self.registry.render()
+        self.assertIn('test_seconds_bucket{stage="parse",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{stage="parse",le="1"} 2', text)
+        self.assertIn('test_seconds_bucket{stage="parse",le="+Inf"} 3', text)
+        self.assertIn('test_seconds_sum{stage="parse"} 5.55', text)
+        self.assertIn('test_seconds_count{stage="parse"} 3', text)
+
+    def test_time_records_even_when_block_raises(self):
+        with self.assertRaises(ValueError):
+            with self.seconds.time(stage='extract'):
+                raise ValueError("boom")
+        self.assertIn('test_seconds_count{stage="extract"} 1', self.registry.render())
+
+    def test_label_values_are_escaped(self):
+        self.errors.inc(error='say "hi"\n')
+        self.assertIn('test_errors_total{error="say \\"hi\\"\\n"} 1', self.registry.render())
+
+    def test_drain_and_merge_move_totals(self):
+        self.errors.inc(stage='triage')
+        self.seconds.observe(0.5)
+        drained = self.registry.drain()
+        self.assertNotIn('test_errors_total{', self.registry.render())
+
+        parent = MetricsRegistry()
+        parent.histogram('test_seconds', 'Test latency', (0.1, 1))
+        parent.counter('test_errors_total', 'Test errors')
+        parent.merge(drained)
+        parent.merge(drained)
+        text = parent.render()
+        self.assertIn('test_errors_total{stage="triage"} 2', text)
+        self.assertIn('test_seconds_count 2', text)
+
+
+class TestMultiProcessAggregation(unittest.TestCase):
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+
+    def test_scrape_sums_every_process_file(self):
+        worker = MetricsRegistry(self.metrics_dir, flush_interval=0)
+        worker.counter('test_requests_total', 'Requests').inc(3, endpoint='/api/analyze')
+        # Stands in for a second gunicorn worker sharing the directory
+        other = MetricsRegistry(self.metrics_dir, flush_interval=0)
+        other.counter('test_requests_total', 'Requests').inc(2, endpoint='/api/analyze')
+
+        files = [name for name in os.listdir(self.metrics_dir) if name.endswith('.json')]
+        self.assertEqual(len(files), 2)
+        self.assertIn('test_requests_total{endpoint="/api/analyze"} 5', worker.render())
+
+    def test_retire_folds_totals_into_archive(self):
+        """Test recycled workers' files are merged into the archive, keeping the scraped totals"""
+        survivor = MetricsRegistry(self.metrics_dir, flush_interval=0)
+        survivor.counter('test_requests_total', 'Requests').inc(2)
+        worker = ("import sys; from metrics import MetricsRegistry; r = MetricsRegistry(sys.argv[1], 0); "
+                  "r.counter('test_requests_total', 'Requests').inc(1); "
+                  "r.histogram('test_seconds', 'Latency', (1,)).observe(0.5); r.retire(); "
+                  "r.counter('test_requests_total', 'Requests').inc(100)")
+        for _ in range(3):
+            subprocess.run([sys.executable, '-c', worker, self.metrics_dir], check=True,
+                           cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+        files = sorted(name for name in os.listdir(self.metrics_dir) if name.endswith('.json'))
+        self.assertEqual(files, sorted(['archive.json', os.path.basename(survivor._file)]))
+        text = survivor.render()
+        self.assertIn('test_requests_total 5', text)
+        self.assertIn('test_seconds_count 3', text)
+
+    def test_archive_exited_picks_up_dead_processes_only(self):
+        """Test files of processes that are gone are archived, and live ones are left alone"""
+        dead = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+        with open(os.path.join(self.metrics_dir, f"{dead}-deadbeef.json"), 'w') as f:
+            json.dump({'counters': {'test_requests_total': {'': 4}}, 'histograms': {}}, f)
+        live = MetricsRegistry(self.metrics_dir, flush_interval=0)
+        live.counter('test_requests_total', 'Requests').inc(1)
+
+        live.archive_exited()
+        files = sorted(name for name in os.listdir(self.metrics_dir) if name.endswith('.json'))
+        self.assertEqual(files, sorted(['archive.json', os.path.basename(live._file)]))
+        self.assertIn('test_requests_total 5', live.render())
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+    def test_forked_child_starts_from_zero(self):
+        """Test a forked worker does not publish the totals its parent recorded before the fork"""
+        master = MetricsRegistry(self.metrics_dir, flush_interval=0)
+        requests = master.counter('test_requests_total', 'Requests')
+        requests.inc(2)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                requests.inc(1)
+                master.retire()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertIn('test_requests_total 3', master.render())
+
+    def test_shared_directory_must_be_private(self):
+        """Test a directory other users can write to is refused, and a new one is created 0o700"""
+        os.chmod(self.metrics_dir, 0o777)
+        with self.assertRaises(PermissionError):
+            MetricsRegistry(self.metrics_dir)
+        created = os.path.join(self.metrics_dir, 'run')
+        MetricsRegistry(created)
+        self.assertEqual(os.stat(created).st_mode & 0o777, 0o700)
+
+
+if __name__ == '__main__':
+    unittest.main()
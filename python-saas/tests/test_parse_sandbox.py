@@ -0,0 +1,149 @@
+"""
+Unit tests for Parse Sandbox
+"""
+import os
+import time
+import unittest
+from parse_sandbox import ParseSandbox, SandboxError
+from pdf_parser import PDFParser, PDFTriageError
+from tests.fixtures import build_pdf
+
+
+def _pid():
+    return os.getpid()
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+    return 'done'
+
+
+def _spin():
+    while True:
+        pass
+
+
+def _allocate(size):
+    return len(bytearray(size))
+
+
+def _fail():
+    raise ValueError('bad object stream')
+
+
+def _crash():
+    os._exit(3)
+
+
+def _count_to(n, fail=False):
+    for i in range(n):
+        yield i
+    if fail:
+        raise ValueError('bad page')
+    return 'counted'
+
+
+class TestParseSandbox(unittest.TestCase):
+    def setUp(self):
+        self.sandbox = ParseSandbox(workers=1, timeout=10, cpu_seconds=10,
+                                    memory_bytes=512 * 1024 * 1024, max_tasks=50)
+
+    def tearDown(self):
+        self.sandbox.shutdown()
+
+    def assertSandboxCode(self, code, func, *args):
+        with self.assertRaises(SandboxError) as ctx:
+            self.sandbox.run(func, *args)
+        self.assertEqual(ctx.exception.code, code)
+
+    def test_runs_in_a_reused_worker_process(self):
+        """Test tasks run out of process on the same worker until it is recycled"""
+        first = self.sandbox.run(_pid)
+        self.assertNotEqual(first, os.getpid())
+        self.assertEqual(self.sandbox.run(_pid), first)
+
+    def test_worker_recycled_after_max_tasks(self):
+        """Test a worker is replaced after max_tasks documents"""
+        sandbox = ParseSandbox(workers=1, max_tasks=2)
+        try:
+            pids = [sandbox.run(_pid) for _ in range(3)]
+            self.assertEqual(pids[0], pids[1])
+            self.assertNotEqual(pids[1], pids[2])
+            self.assertEqual(sandbox.stats()['recycled'], 1)
+        finally:
+            sandbox.shutdown()
+
+    def test_wall_clock_timeout_kills_worker(self):
+        """Test a document running past the timeout fails and the worker is replaced"""
+        self.sandbox.timeout = 0.5
+        self.assertSandboxCode('timeout', _sleep, 30)
+        self.assertEqual(self.sandbox.run(_sleep, 0), 'done')
+        self.assertEqual(self.sandbox.stats()['timeouts'], 1)
+
+    def test_cpu_limit(self):
+        """Test a CPU-bound document is stopped by RLIMIT_CPU"""
+        sandbox = ParseSandbox(workers=1, timeout=30, cpu_seconds=1)
+        try:
+            with self.assertRaises(SandboxError) as ctx:
+                sandbox.run(_spin)
+            self.assertEqual(ctx.exception.code, 'cpu_limit')
+        finally:
+            sandbox.shutdown()
+
+    def test_memory_limit(self):
+        """Test an oversized allocation fails with memory_limit, not a dead server"""
+        self.assertSandboxCode('memory_limit', _allocate, 2 * 1024 * 1024 * 1024)
+        self.assertEqual(self.sandbox.run(_allocate, 1024), 1024)
+
+    def test_task_exceptions_are_reraised(self):
+        """Test ordinary parse errors reach the caller unchanged"""
+        with self.assertRaises(ValueError):
+            self.sandbox.run(_fail)
+        self.assertEqual(self.sandbox.run(_sleep, 0), 'done')
+
+    def test_crashed_worker_reported(self):
+        """Test a worker that dies mid-document is reported and replaced"""
+        self.assertSandboxCode('worker_crashed', _crash)
+        self.assertEqual(self.sandbox.run(_sleep, 0), 'done')
+
+    def test_stream_yields_items_and_return_value(self):
+        """Test stream() relays items as they are produced and the generator's return value"""
+        def consume():
+            return (yield from self.sandbox.stream(_count_to, 3))
+        items = consume()
+        self.assertEqual([next(items), next(items), next(items)], [0, 1, 2])
+        with self.assertRaises(StopIteration) as ctx:
+            next(items)
+        self.assertEqual(ctx.exception.value, 'counted')
+        self.assertEqual(self.sandbox.stats()['idle_workers'], 1)
+
+    def test_stream_errors_after_items(self):
+        """Test an exception raised mid-stream reaches the caller after the items before it"""
+        items = self.sandbox.stream(_count_to, 2, True)
+        self.assertEqual([next(items), next(items)], [0, 1])
+        with self.assertRaises(ValueError):
+            next(items)
+
+    def test_stream_closed_early_kills_worker(self):
+        """Test abandoning a stream replaces its worker instead of reusing it mid-document"""
+        items = self.sandbox.stream(_count_to, 100)
+        next(items)
+        items.close()
+        self.assertEqual(self.sandbox.stats()['idle_workers'], 0)
+        self.assertEqual(list(self.sandbox.stream(_count_to, 2)), [0, 1])
+
+    def test_pdf_parser_uses_sandbox(self):
+        """Test PDFParser extraction and triage errors go through the sandbox"""
+        parser = PDFParser(workers=1, sandbox=self.sandbox)
+        pdf_bytes = build_pdf(['Sandboxed page'], info={'Title': 'Boxed'})
+        extraction = parser.extract_document(pdf_bytes)
+        self.assertIn('Sandboxed page', extraction['text'])
+        self.assertEqual(extraction['metadata']['title'], 'Boxed')
+        self.assertIn('Sandboxed page', parser.submit(pdf_bytes).result()['text'])
+        with self.assertRaises(PDFTriageError):
+            parser.extract_document(b'not a pdf', triage=True)
+        pages = list(parser.iter_pages(build_pdf(['First', 'Second'])))
+        self.assertEqual([page['text'].strip() for page in pages], ['First', 'Second'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,11 @@ Unit tests for PDF Parser
 """
 import unittest
 import io
-from pdf_parser import PDFParser
+import tempfile
+from unittest.mock import Mock, patch
+from pdf_parser import (PDFParser, PDFTriageError, _poor_page_text, format_page_numbers, join_pages,
+                        parse_page_selection, warm_up)
+from tests.fixtures import build_pdf
 
 class TestPDFParser(unittest.TestCase):
     def setUp(self):
@@ -53,6 +57,325 @@ class TestPDFParser(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.parser.extract_text(self.sample_pdf_bytes, method='invalid')
 
+    def test_parse_serves_text_and_metadata_from_one_parse(self):
+        """Test parsed document reuses the engine that produced the text"""
+        pdf_bytes = build_pdf(['Invoice 42', 'Total due 1000'], info={'Title': 'Invoice'})
+        with self.parser.parse(pdf_bytes) as doc:
+            self.assertIn('Invoice 42', doc.text)
+            self.assertIn('Total due 1000', doc.text)
+            self.assertEqual(doc.engine, 'hybrid')
+            self.assertEqual(doc.metadata['title'], 'Invoice')
+            self.assertEqual(doc.num_pages, 2)
+            # Clean pages never needed pdfplumber
+            self.assertIsNone(doc._plumber)
+            self.assertEqual(doc.escalated_pages, [])
+
+    def test_auto_escalates_only_poor_pages(self):
+        """Test auto mode re-extracts table-like and empty pages with pdfplumber"""
+        table = 'Item  Qty  Price\nBolts 10 2.50 25.00\nNuts 20 1.25 25.00\nTotal 30 3.75 50.00'
+        pdf_bytes = build_pdf(['Plain prose page', table, ''])
+        with self.parser.parse(pdf_bytes) as doc:
+            text = doc.text
+            self.assertEqual(doc.escalated_pages, [1, 2])
+            self.assertIsNotNone(doc._plumber)
+        self.assertIn('Plain prose page', text)
+        self.assertIn('Bolts 10 2.50 25.00', text)
+
+    def test_auto_recovers_from_page_errors(self):
+        """Test a page PyPDF2 cannot read is taken from pdfplumber alone"""
+        pdf_bytes = build_pdf(['First page', 'Second page'])
+        with self.parser.parse(pdf_bytes) as doc:
+            doc.reader.pages[1].extract_text = Mock(side_effect=ValueError('bad content stream'))
+            text = doc.text
+            self.assertEqual(doc.escalated_pages, [1])
+            self.assertEqual(doc.failed_pages, [])
+        self.assertIn('First page', text)
+        self.assertIn('Second page', text)
+
+    def test_auto_fails_when_no_page_is_readable(self):
+        """Test auto mode reports failure only when every page fails in both engines"""
+        pdf_bytes = build_pdf(['Only page'])
+        with self.parser.parse(pdf_bytes) as doc:
+            doc.reader.pages[0].extract_text = Mock(side_effect=ValueError('bad'))
+            doc.plumber.pages[0].extract_text = Mock(side_effect=ValueError('worse'))
+            with self.assertRaises(Exception) as ctx:
+                doc.text
+        self.assertIn('Both PDF extraction methods failed', str(ctx.exception))
+
+    def test_poor_page_text_heuristics(self):
+        """Test the checks that decide when a page needs pdfplumber"""
+        self.assertEqual(_poor_page_text('  \n'), 'empty')
+        self.assertEqual(_poor_page_text('\ufffd\ufffd\ufffdab'), 'unprintable')
+        self.assertEqual(_poor_page_text('A 1 2 3\nB 4 5 6\nC 7 8 9'), 'table')
+        self.assertIsNone(_poor_page_text('Invoice 42\nPayment due in 30 days'))
+
+    def test_parse_pypdf2_metadata_matches_extract_metadata(self):
+        """Test PyPDF2 parse reports the same metadata as extract_metadata"""
+        pdf_bytes = build_pdf(['Page one'], info={'Author': 'Acme'})
+        with self.parser.parse(pdf_bytes, method='pypdf2') as doc:
+            self.assertIn('Page one', doc.text)
+            self.assertEqual(doc.metadata, self.parser.extract_metadata(pdf_bytes))
+            self.assertEqual(doc.metadata['author'], 'Acme')
+
+    def test_metadata_does_not_load_pages(self):
+        """Test metadata comes from the page tree root and Info dictionary, as plain JSON types"""
+        pdf_bytes = build_pdf([f'Page {i}' for i in range(1, 31)], info={'Title': 'Deed', 'Author': 'Acme'})
+        with self.parser.parse(pdf_bytes, method='pypdf2') as doc:
+            metadata = doc.metadata
+            self.assertIsNone(doc.reader.flattened_pages)
+        self.assertEqual(metadata['num_pages'], 30)
+        self.assertEqual((metadata['title'], metadata['author'], metadata['subject']), ('Deed', 'Acme', ''))
+        self.assertTrue(all(type(value) is str for name, value in metadata.items() if name != 'num_pages'))
+        self.assertIs(type(metadata['num_pages']), int)
+
+    def test_extract_metadata_unreadable(self):
+        """Test an unreadable document reports an error instead of raising"""
+        metadata = self.parser.extract_metadata(b'not a pdf')
+        self.assertIn('error', metadata)
+        self.assertEqual(metadata['num_pages'], 0)
+
+    def test_parallel_extraction_matches_serial(self):
+        """Test page-parallel extraction keeps page order and content"""
+        pages = [f'Page number {i}' for i in range(1, 8)]
+        pdf_bytes = build_pdf(pages)
+        serial = PDFParser(workers=1).extract_text_pdfplumber(pdf_bytes)
+        parallel_parser = PDFParser(workers=2, parallel_min_pages=4)
+        parallel = parallel_parser.extract_text_pdfplumber(pdf_bytes)
+
+        self.assertEqual(parallel, serial)
+        self.assertLess(parallel.index('Page number 2'), parallel.index('Page number 7'))
+        self.assertEqual(parallel_parser.extract_text(pdf_bytes), PDFParser(workers=1).extract_text(pdf_bytes))
+
+    def test_parallel_threshold_keeps_small_documents_in_process(self):
+        """Test documents below the page threshold are not sent to the pool"""
+        pdf_bytes = build_pdf(['One', 'Two'])
+        parser = PDFParser(workers=2, parallel_min_pages=10)
+        with patch('pdf_parser._get_process_pool') as get_pool:
+            self.assertIn('Two', parser.extract_text(pdf_bytes))
+            get_pool.assert_not_called()
+
+    def test_submit_returns_text_and_metadata(self):
+        """Test submit resolves to the same extraction on and off the pool"""
+        pdf_bytes = build_pdf(['Batched page'], info={'Title': 'Batch'})
+        for workers in (1, 2):
+            extraction = PDFParser(workers=workers).submit(pdf_bytes).result()
+            self.assertIn('Batched page', extraction['text'])
+            self.assertEqual(extraction['metadata']['title'], 'Batch')
+
+    def test_parse_from_file_path(self):
+        """Test a spooled file path parses like the same bytes"""
+        pdf_bytes = build_pdf(['Spooled page'], info={'Title': 'Scan'})
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as f:
+            f.write(pdf_bytes)
+            f.flush()
+            for method in ('pdfplumber', 'pypdf2'):
+                with self.parser.parse(f.name, method=method) as doc:
+                    self.assertIn('Spooled page', doc.text)
+                    self.assertEqual(doc.metadata['title'], 'Scan')
+
+    def test_max_pages_stops_early(self):
+        """Test both engines stop after max_pages and report truncation"""
+        pdf_bytes = build_pdf([f'Section {i}' for i in range(1, 11)])
+        for method in ('pdfplumber', 'pypdf2'):
+            with self.parser.parse(pdf_bytes, method=method, max_pages=2) as doc:
+                self.assertIn('Section 2', doc.text)
+                self.assertNotIn('Section 3', doc.text)
+                self.assertEqual(doc.pages_read, 2)
+                self.assertTrue(doc.truncated)
+                self.assertEqual(doc.num_pages, 10)
+
+    def test_max_chars_stops_early(self):
+        """Test max_chars stops iterating pages and cuts the text"""
+        pdf_bytes = build_pdf(['A' * 40, 'B' * 40, 'C' * 40])
+        for method in ('pdfplumber', 'pypdf2'):
+            with self.parser.parse(pdf_bytes, method=method, max_chars=50) as doc:
+                self.assertEqual(len(doc.text), 50)
+                self.assertEqual(doc.pages_read, 2)
+                self.assertTrue(doc.truncated)
+            self.assertEqual(len(self.parser.extract_text(pdf_bytes, method=method, max_chars=50)), 50)
+
+    def test_budget_not_truncated_when_document_fits(self):
+        """Test generous budgets read everything and report no truncation"""
+        pdf_bytes = build_pdf(['Short'])
+        with self.parser.parse(pdf_bytes, max_chars=1000, max_pages=5) as doc:
+            self.assertEqual(doc.text, 'Short')
+            self.assertFalse(doc.truncated)
+
+    def test_parse_page_selection(self):
+        """Test page selections are validated and put in canonical form"""
+        self.assertEqual(parse_page_selection('10, 1-3'), '1-3,10')
+        self.assertEqual(parse_page_selection('2-4,3-6,8'), '2-6,8')
+        self.assertEqual(parse_page_selection('1,2,3'), '1-3')
+        self.assertEqual(parse_page_selection('5-,7,2'), '2,5-')
+        for spec in ('', '0', '3-1', 'a-b', '1-3-5', '1,,2'):
+            with self.assertRaises(ValueError):
+                parse_page_selection(spec)
+        self.assertEqual(format_page_numbers([1, 2, 3, 10]), '1-3,10')
+        self.assertEqual(format_page_numbers([]), '')
+
+    def test_page_selection_extracts_only_selected_pages(self):
+        """Test every engine extracts just the selected pages and reports them"""
+        pdf_bytes = build_pdf([f'Section {i}' for i in range(1, 11)])
+        for method in ('auto', 'pdfplumber', 'pypdf2'):
+            extraction = self.parser.extract_document(pdf_bytes, method, page_selection='2-3,9,12')
+            self.assertEqual(extraction['pages_processed'], '2-3,9')
+            self.assertIn('Section 9', extraction['text'])
+            self.assertNotIn('Section 1\n', extraction['text'] + '\n')
+            self.assertNotIn('Section 4', extraction['text'])
+            self.assertFalse(extraction['truncated'])
+
+            pages = list(self.parser.iter_pages(pdf_bytes, method, page_selection='9-'))
+            self.assertEqual([page['page'] for page in pages], [9, 10])
+            self.assertEqual(pages[0]['pages'], 2)
+
+    def test_unselected_pages_are_not_laid_out(self):
+        """Test neither engine calls text extraction on pages outside the selection"""
+        pdf_bytes = build_pdf([f'Section {i}' for i in range(1, 11)])
+        with patch('PyPDF2.PageObject.extract_text', autospec=True, return_value='text') as pypdf2_text:
+            self.parser.extract_document(pdf_bytes, 'pypdf2', page_selection='4')
+        self.assertEqual(pypdf2_text.call_count, 1)
+        with patch('pdfplumber.page.Page.extract_text', autospec=True, return_value='text') as plumber_text:
+            self.parser.extract_document(pdf_bytes, 'pdfplumber', page_selection='4,6')
+        self.assertEqual(plumber_text.call_count, 2)
+
+    def test_sample_spreads_pages_over_selection(self):
+        """Test sample picks evenly spaced pages, within the selection and before max_pages"""
+        pdf_bytes = build_pdf([f'Section {i}' for i in range(1, 11)])
+        for method in ('auto', 'pdfplumber', 'pypdf2'):
+            with self.parser.parse(pdf_bytes, method, sample=3) as doc:
+                self.assertIn('Section 7', doc.text)
+                self.assertEqual(doc.pages_processed, [1, 4, 7])
+                self.assertFalse(doc.truncated)
+            with self.parser.parse(pdf_bytes, method, page_selection='5-', sample=2, max_pages=1) as doc:
+                self.assertIn('Section 5', doc.text)
+                self.assertEqual(doc.pages_processed, [5])
+                self.assertTrue(doc.truncated)
+
+    def test_engine_methods_accept_page_selection(self):
+        """Test the per-engine extract_text methods take pages and sample like extract_document"""
+        pdf_bytes = build_pdf([f'Section {i}' for i in range(1, 11)])
+        for extract in (self.parser.extract_text_pypdf2, self.parser.extract_text_pdfplumber, self.parser.extract_text):
+            text = extract(pdf_bytes, page_selection='3,8')
+            self.assertIn('Section 8', text)
+            self.assertNotIn('Section 4', text)
+            sampled = extract(pdf_bytes, sample=2)
+            self.assertIn('Section 6', sampled)
+            self.assertNotIn('Section 5', sampled)
+
+    def test_selection_outside_document_is_rejected(self):
+        """Test a selection that misses every page fails with its own code in every engine and when streaming"""
+        pdf_bytes = build_pdf(['One', 'Two'])
+        for method in ('pypdf2', 'pdfplumber', 'auto'):
+            with self.assertRaises(PDFTriageError) as caught:
+                self.parser.extract_document(pdf_bytes, method, page_selection='5-9')
+            self.assertEqual(caught.exception.code, 'pages_out_of_range')
+            with self.assertRaises(PDFTriageError):
+                list(self.parser.iter_pages(pdf_bytes, method, page_selection='5-'))
+        # Partly outside is fine: the pages that exist are extracted
+        self.assertIn('Two', self.parser.extract_text(pdf_bytes, page_selection='2-9'))
+
+    def test_sample_must_be_positive(self):
+        """Test a sample below 1 is rejected up front, whoever the caller is"""
+        pdf_bytes = build_pdf(['One', 'Two'])
+        for sample in (0, -3):
+            with self.assertRaises(ValueError):
+                self.parser.parse(pdf_bytes, sample=sample)
+            with self.assertRaises(ValueError):
+                self.parser.extract_text_pypdf2(pdf_bytes, sample=sample)
+
+    def test_selection_skips_parallel_extraction(self):
+        """Test a page selection is extracted in-process even on a pooled parser"""
+        parser = PDFParser(workers=2, parallel_min_pages=2)
+        pdf_bytes = build_pdf([f'Section {i}' for i in range(1, 7)])
+        with patch('pdf_parser._get_process_pool') as pool:
+            with parser.parse(pdf_bytes, 'pdfplumber', page_selection='2,5') as doc:
+                self.assertIn('Section 5', doc.text)
+                self.assertEqual(doc.pages_processed, [2, 5])
+        pool.assert_not_called()
+
+    def assertTriageCode(self, source, code):
+        with self.assertRaises(PDFTriageError) as ctx:
+            self.parser.triage(source)
+        self.assertEqual(ctx.exception.code, code)
+
+    def test_triage_accepts_text_pdf(self):
+        """Test triage passes a normal text PDF"""
+        report = self.parser.triage(build_pdf(['Invoice', 'Terms']))
+        self.assertEqual(report['num_pages'], 2)
+
+    def test_triage_error_codes(self):
+        """Test triage short-circuits junk uploads with precise codes"""
+        valid = build_pdf(['Invoice text'])
+        self.assertTriageCode(b'', 'empty_file')
+        self.assertTriageCode(b'PK\x03\x04 zip file', 'not_pdf')
+        self.assertTriageCode(valid[:len(valid) // 3], 'truncated')
+        self.assertTriageCode(build_pdf(['scan', 'scan'], image_only=True), 'image_only')
+
+    def test_triage_error_survives_process_pool(self):
+        """Test the error code is kept when triage runs in a pool worker"""
+        future = PDFParser(workers=2).submit(build_pdf(['x'], image_only=True), triage=True)
+        with self.assertRaises(PDFTriageError) as ctx:
+            future.result()
+        self.assertEqual(ctx.exception.code, 'image_only')
+
+    def test_iter_pages_matches_full_extraction(self):
+        """Test iter_pages yields every page in order and joins to the same text as extract_document"""
+        pdf_bytes = build_pdf(['Invoice cover', 'Line items', 'Terms'], info={'Title': 'Pages'})
+        for method in ('auto', 'pdfplumber', 'pypdf2'):
+            pages = self.parser.iter_pages(pdf_bytes, method)
+            collected = []
+            while True:
+                try:
+                    collected.append(next(pages))
+                except StopIteration as stop:
+                    summary = stop.value
+                    break
+            self.assertEqual([page['page'] for page in collected], [1, 2, 3])
+            self.assertEqual(collected[0]['pages'], 3)
+            self.assertEqual(collected[1]['chars'], len(collected[1]['text']))
+            text = join_pages([page['text'] for page in collected], collected[0]['engine'])
+            self.assertEqual(text, self.parser.extract_document(pdf_bytes, method)['text'])
+            self.assertEqual(summary['metadata']['title'], 'Pages')
+            self.assertFalse(summary['truncated'])
+
+    def test_extract_document_returns_pages_on_request(self):
+        """Test with_page_texts=True adds the per-page text behind the extracted text"""
+        pdf_bytes = build_pdf(['First page', 'Second page'])
+        for method in ('auto', 'pdfplumber', 'pypdf2'):
+            extraction = self.parser.extract_document(pdf_bytes, method, with_page_texts=True)
+            self.assertEqual([page.strip() for page in extraction['page_texts']], ['First page', 'Second page'])
+        self.assertNotIn('page_texts', self.parser.extract_document(pdf_bytes))
+
+    def test_iter_pages_budgets(self):
+        """Test iter_pages stops at max_pages / max_chars and reports truncation"""
+        pdf_bytes = build_pdf(['A' * 40, 'B' * 40, 'C' * 40])
+        pages = list(self.parser.iter_pages(pdf_bytes, max_pages=1))
+        self.assertEqual(len(pages), 1)
+        self.assertEqual(pages[0]['pages'], 1)
+        self.assertEqual(len(list(self.parser.iter_pages(pdf_bytes, 'pypdf2', max_chars=50))), 2)
+
+    def test_iter_pages_triage(self):
+        """Test triage=True rejects junk before the first page"""
+        with self.assertRaises(PDFTriageError):
+            next(self.parser.iter_pages(build_pdf(['x'], image_only=True), triage=True))
+
+    def test_parse_invalid_method(self):
+        """Test parse rejects unknown methods"""
+        with self.assertRaises(ValueError):
+            self.parser.parse(self.sample_pdf_bytes, method='invalid')
+
+class TestWarmUp(unittest.TestCase):
+    def test_warm_up_runs_both_engines(self):
+        """Test warm-up exercises PyPDF2 and pdfplumber on the embedded PDF"""
+        timings = warm_up()
+        self.assertEqual(set(timings), {'pypdf2', 'pdfplumber'})
+
+    def test_parser_warm_up_without_sandbox(self):
+        """Test PDFParser.warm_up reports in-process timings only when no sandbox is set"""
+        report = PDFParser(workers=1).warm_up()
+        self.assertIn('pdfplumber', report['in_process'])
+        self.assertNotIn('sandbox', report)
+
 if __name__ == '__main__':
     unittest.main()
 
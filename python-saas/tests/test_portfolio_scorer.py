@@ -0,0 +1,96 @@
+"""
+Unit tests for Portfolio Scorer
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from fingerprint_store import FingerprintStore
+from portfolio_scorer import PortfolioScorer, PortfolioError
+from risk_analyzer import RiskAnalyzer
+
+class TestPortfolioScorer(unittest.TestCase):
+    def setUp(self):
+        self.scorer = PortfolioScorer()
+
+    def test_scores_match_base_rules(self):
+        """Test base risk per asset type, valuation and overdue penalties"""
+        result = self.scorer.score({
+            'id': ['a', 'b', 'c', 'd', 'e'],
+            'asset_type': ['invoice', 'real_estate', 'bond', 'art', 'invoice'],
+            'valuation': [1000, None, 2_000_000, 10, 5000],
+            'due_date': [None, None, None, None, '2024-05-18'],
+        }, as_of='2024-06-01')
+        self.assertEqual(result['count'], 5)
+        self.assertEqual(result['results']['id'], ['a', 'b', 'c', 'd', 'e'])
+        # Invoice 14 days overdue: two weeks at 2 points each
+        self.assertEqual(result['results']['risk_score'], [10, 25, 20, 20, 14])
+
+    def test_base_risk_matches_risk_analyzer(self):
+        """Test an unremarkable asset scores the same as RiskAnalyzer's base table"""
+        analyzer = RiskAnalyzer()
+        for asset_type in ('invoice', 'real_estate', 'bond', 'other'):
+            result = self.scorer.score({'asset_type': [asset_type]})
+            self.assertEqual(result['results']['risk_score'][0], analyzer._mock_analysis(asset_type)['risk_score'])
+
+    def test_only_changed_assets_returned(self):
+        """Test assets within the threshold of their last risk are left out"""
+        result = self.scorer.score({
+            'id': [1, 2, 3],
+            'asset_type': ['invoice', 'invoice', 'invoice'],
+            'due_date': [None, '2024-01-01', None],
+            'last_risk': [10, 10, None],
+        }, threshold=5, as_of='2024-06-01')
+        self.assertEqual(result['changed'], 2)
+        self.assertEqual(result['results']['id'], [2, 3])
+        self.assertEqual(result['results']['risk_score'], [40, 10])
+        self.assertEqual(result['results']['previous_risk'], [10.0, None])
+
+    def test_incremental_rescoring_skips_unchanged_assets(self):
+        """Test only new, edited or newly overdue-by-a-week assets are recomputed"""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            scorer = PortfolioScorer(store=FingerprintStore(os.path.join(tmpdir, 'fp.sqlite3')))
+            columns = {
+                'id': ['a', 'b', 'c'],
+                'asset_type': ['invoice', 'bond', 'invoice'],
+                'valuation': [100, 200, 300],
+                'due_date': [None, None, '2024-05-30'],
+            }
+            first = scorer.score(columns, as_of='2024-06-01', incremental=True)
+            self.assertEqual(first['recomputed'], 3)
+
+            # Same week, same inputs: nothing to do
+            again = scorer.score(columns, as_of='2024-06-03', incremental=True)
+            self.assertEqual(again['recomputed'], 0)
+            self.assertEqual(again['results']['risk_score'], first['results']['risk_score'])
+
+            # Asset b edited, asset c enters its second overdue week
+            columns['valuation'][1] = 2_000_000
+            later = scorer.score(columns, as_of='2024-06-08', incremental=True)
+            self.assertEqual(later['recomputed'], 2)
+            self.assertEqual(later['results']['risk_score'], [10, 20, 14])
+            self.assertEqual(later['results']['risk_score'],
+                             scorer.score(columns, as_of='2024-06-08')['results']['risk_score'])
+
+            with self.assertRaises(PortfolioError):
+                scorer.score({'asset_type': ['invoice']}, incremental=True)
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    def test_invalid_columns(self):
+        """Test ragged, unknown and malformed columns are rejected"""
+        bad = [
+            {'asset_type': 'invoice'},
+            {'asset_type': ['invoice'], 'valuation': [1, 2]},
+            {'asset_type': ['invoice'], 'colour': ['red']},
+            {'asset_type': ['invoice'], 'due_date': ['not a date']},
+        ]
+        for columns in bad:
+            with self.assertRaises(PortfolioError):
+                self.scorer.score(columns)
+        with self.assertRaises(PortfolioError):
+            PortfolioScorer(max_assets=1).score({'asset_type': ['invoice', 'bond']})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Tests for Request Profiler
+"""
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from profiling import RequestProfiler, PROFILE_HEADER, profile_call
+
+
+def _busy_work():
+    return sorted(str(i) * 3 for i in range(20000))
+
+
+class TestRequestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.profiler = RequestProfiler(token='secret', output_dir=self.output_dir, top_n=5)
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def test_disabled_without_token(self):
+        profiler = RequestProfiler(output_dir=self.output_dir)
+        self.assertFalse(profiler.enabled)
+        self.assertFalse(profiler.requested({PROFILE_HEADER: 'anything'}))
+
+    def test_requires_matching_token(self):
+        self.assertTrue(self.profiler.requested({PROFILE_HEADER: 'secret'}))
+        self.assertFalse(self.profiler.requested({PROFILE_HEADER: 'guess'}))
+        self.assertFalse(self.profiler.requested({}))
+
+    def test_sample_rate_zero_never_profiles(self):
+        self.profiler.sample_rate = 0
+        self.assertFalse(any(self.profiler.requested({PROFILE_HEADER: 'secret'}) for _ in range(20)))
+
+    def test_profile_writes_stats_and_allocations(self):
+        with self.profiler.profile('POST /api/analyze') as info:
+            _busy_work()
+        profile_id = info['profile_id']
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, f"{profile_id}.prof")))
+        with open(os.path.join(self.output_dir, f"{profile_id}.json")) as f:
+            report = json.load(f)
+        self.assertEqual(report['label'], 'POST /api/analyze')
+        self.assertLessEqual(len(report['top_functions']), 5)
+        self.assertTrue(any('_busy_work' in row['function'] for row in report['top_functions']))
+        self.assertTrue(report['top_allocations'])
+        self.assertGreater(report['peak_traced_bytes'], 0)
+
+    def test_recording_from_another_process_is_merged(self):
+        """Test a profile_call recording set as info['sandbox'] lands in the stats and the report"""
+        result, recording = profile_call(_busy_work)
+        self.assertEqual(len(result), 20000)
+        with self.profiler.profile('sandboxed') as info:
+            info['sandbox'] = pickle.loads(pickle.dumps(recording))
+        with open(os.path.join(self.output_dir, f"{info['profile_id']}.json")) as f:
+            report = json.load(f)
+        self.assertTrue(any('_busy_work' in row['function'] for row in report['top_functions']))
+        self.assertLessEqual(len(report['sandbox']['top_allocations']), 5)
+        self.assertGreater(report['sandbox']['peak_traced_bytes'], 0)
+
+    def test_failed_block_is_still_profiled(self):
+        with self.assertRaises(RuntimeError):
+            with self.profiler.profile('failing') as info:
+                raise RuntimeError("slow and broken")
+        self.assertIn('profile_id', info)
+
+    def test_only_one_profile_at_a_time(self):
+        inner = []
+        with self.profiler.profile('outer'):
+            thread = threading.Thread(target=lambda: inner.append(self.profiler.profile('inner').__enter__()))
+            thread.start()
+            thread.join()
+        self.assertEqual(inner, [None])
+
+    def test_retention_keeps_newest_profiles(self):
+        self.profiler.max_profiles = 2
+        ids = []
+        for label in ('first', 'second', 'third'):
+            with self.profiler.profile(label) as info:
+                pass
+            ids.append(info['profile_id'])
+            time.sleep(0.01)
+        remaining = sorted(name for name in os.listdir(self.output_dir) if name.endswith('.json'))
+        self.assertEqual(remaining, sorted(f"{profile_id}.json" for profile_id in ids[1:]))
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, f"{ids[0]}.prof")))
+
+
+if __name__ == '__main__':
+    unittest.main()
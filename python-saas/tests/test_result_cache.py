@@ -0,0 +1,92 @@
+"""
+Unit tests for Result Cache
+"""
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from result_cache import DISK_RESCAN_PUTS, ResultCache
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResultCache(max_entries=2)
+
+    def test_key_depends_on_content_and_parameters(self):
+        """Test key changes with bytes, asset type and method"""
+        a = ResultCache.digest(b'%PDF-1.4 a')
+        key = ResultCache.make_key(a, 'invoice', 'auto')
+        self.assertEqual(key, ResultCache.make_key(ResultCache.digest(b'%PDF-1.4 a'), 'invoice', 'auto'))
+        self.assertNotEqual(key, ResultCache.make_key(ResultCache.digest(b'%PDF-1.4 b'), 'invoice', 'auto'))
+        self.assertNotEqual(key, ResultCache.make_key(a, 'bond', 'auto'))
+        self.assertNotEqual(key, ResultCache.make_key(a, 'invoice', 'pypdf2'))
+        self.assertNotEqual(key, ResultCache.make_key(a, 'invoice', 'auto', max_pages=2))
+        self.assertEqual(key, ResultCache.make_key(a, 'invoice', 'auto', max_pages=None))
+        with patch('result_cache.MODEL_VERSION', 'rules-next'):
+            self.assertNotEqual(key, ResultCache.make_key(a, 'invoice', 'auto'))
+
+    def test_memory_hit_and_miss(self):
+        """Test hits and misses are counted"""
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.put('a', {'risk_score': 10})
+        self.assertEqual(self.cache.get('a'), {'risk_score': 10})
+
+        stats = self.cache.stats()
+        self.assertEqual(stats['memory_hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_lru_eviction(self):
+        """Test least recently used entry is evicted first"""
+        self.cache.put('a', {'n': 1})
+        self.cache.put('b', {'n': 2})
+        self.cache.get('a')
+        self.cache.put('c', {'n': 3})
+
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_disk_tier_survives_new_instance(self):
+        """Test on-disk tier serves results to a fresh cache"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            ResultCache(max_entries=2, cache_dir=cache_dir).put('a', {'n': 1})
+            fresh = ResultCache(max_entries=2, cache_dir=cache_dir)
+            self.assertEqual(fresh.get('a'), {'n': 1})
+            self.assertEqual(fresh.stats()['disk_hits'], 1)
+
+    def test_disk_ttl_expiry(self):
+        """Test stale on-disk entries are ignored"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ResultCache(max_entries=0, cache_dir=cache_dir, ttl_seconds=60)
+            cache.put('a', {'n': 1})
+            old = time.time() - 120
+            os.utime(os.path.join(cache_dir, 'a.json'), (old, old))
+            self.assertIsNone(cache.get('a'))
+
+    def test_disk_size_eviction(self):
+        """Test oldest on-disk entries are evicted over the size budget"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ResultCache(max_entries=0, cache_dir=cache_dir, max_disk_bytes=100)
+            cache.put('a', {'text': 'x' * 60})
+            old = time.time() - 10
+            os.utime(os.path.join(cache_dir, 'a.json'), (old, old))
+            cache.put('b', {'text': 'y' * 60})
+            self.assertIsNone(cache.get('a'))
+            self.assertIsNotNone(cache.get('b'))
+
+    def test_disk_rescans_only_when_needed(self):
+        """Test writes under the budget are tracked without listing the directory each time"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ResultCache(max_entries=0, cache_dir=cache_dir)
+            with patch.object(cache, '_evict_disk', wraps=cache._evict_disk) as evict:
+                for i in range(DISK_RESCAN_PUTS):
+                    cache.put(str(i), {'n': i})
+                self.assertEqual(evict.call_count, 1)
+                cache.put('again', {'n': 0})
+                self.assertEqual(evict.call_count, 2)
+            self.assertEqual(cache._disk_bytes, sum(os.path.getsize(os.path.join(cache_dir, name))
+                                                    for name in os.listdir(cache_dir)))
+
+if __name__ == '__main__':
+    unittest.main()
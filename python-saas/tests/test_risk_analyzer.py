@@ -3,8 +3,11 @@ Unit tests for Risk Analyzer
 """
 import unittest
 import os
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, MagicMock
-from risk_analyzer import RiskAnalyzer
+from risk_analyzer import RiskAnalyzer, RiskBatcher
+from http_client import HTTPClient
+from tests.fixtures import StubServer
 
 class TestRiskAnalyzer(unittest.TestCase):
     def setUp(self):
@@ -50,12 +53,109 @@ class TestRiskAnalyzer(unittest.TestCase):
         result = self.analyzer._analyze_via_backend("Sample text", "invoice")
         self.assertIsInstance(result, dict)
 
+    def test_analyze_via_backend_uses_remote_score(self):
+        """Test the backend's analysis is used when it answers"""
+        client = HTTPClient(retries=0)
+        with StubServer([(200, {'risk_score': 42, 'valuation': 99000,
+                                'extracted_data': {'amount': 99000}, 'confidence': 0.7})]) as stub:
+            with patch.dict(os.environ, {'BACKEND_URL': stub.url, 'USE_BACKEND_AI': 'true'}):
+                analyzer = RiskAnalyzer(http_client=client)
+            result = analyzer.analyze("Invoice text", "invoice")
+        self.assertEqual(stub.requests[0]['path'], '/api/analyze-risk')
+        self.assertEqual(stub.requests[0]['json'], {'pdf_text': 'Invoice text', 'asset_type': 'invoice'})
+        self.assertEqual(result['risk_score'], 42)
+        self.assertEqual(result['valuation'], 99000)
+        self.assertEqual(result['extracted_data']['asset_type'], 'invoice')
+
+    def test_backend_failure_falls_back_to_local_scoring(self):
+        """Test an unhealthy backend falls back to local scoring and trips the breaker"""
+        client = HTTPClient(retries=0, failure_threshold=1)
+        with StubServer([(503, {})]) as stub:
+            with patch.dict(os.environ, {'BACKEND_URL': stub.url, 'USE_BACKEND_AI': 'true'}):
+                analyzer = RiskAnalyzer(http_client=client)
+            first = analyzer.analyze("Invoice text", "invoice")
+            second = analyzer.analyze("Invoice text", "invoice")
+        self.assertEqual(first['risk_score'], 10)
+        self.assertEqual(second['risk_score'], 10)
+        # The second call never reached the server
+        self.assertEqual(len(stub.requests), 1)
+
+    def test_batched_backend_calls(self):
+        """Test concurrent analyses share one batched backend request"""
+        client = HTTPClient(retries=0)
+        results = [{'risk_score': 30 + i} for i in range(4)]
+        with StubServer([(200, {'results': results})]) as stub:
+            env = {'BACKEND_URL': stub.url, 'USE_BACKEND_AI': 'true', 'RISK_BATCH_MAX_ITEMS': '4',
+                   'RISK_BATCH_MAX_WAIT_MS': '2000'}
+            with patch.dict(os.environ, env):
+                analyzer = RiskAnalyzer(http_client=client, batch=True)
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                scores = list(pool.map(lambda i: analyzer.analyze(f"Doc {i}", "bond")['risk_score'], range(4)))
+        self.assertEqual(len(stub.requests), 1)
+        self.assertEqual(stub.requests[0]['path'], '/api/analyze-risk/batch')
+        self.assertEqual(len(stub.requests[0]['json']['items']), 4)
+        self.assertEqual(sorted(scores), [30, 31, 32, 33])
+
+    def test_confident_invoice_scored_locally(self):
+        """Test a clearly structured invoice is scored without a remote call"""
+        text = ("Invoice No: INV-7\nInvoice Date: 2024-05-01\nBill To: Globex Corporation\n"
+                "Total due: $12,500.00\nIBAN: GB82 WEST 1234 5698 7654 32")
+        with patch.object(self.analyzer, '_analyze_via_backend') as backend:
+            result = self.analyzer.analyze(text, 'invoice')
+            backend.assert_not_called()
+        self.assertEqual(result['risk_score'], 10)
+        self.assertEqual(result['valuation'], 12500.0)
+        self.assertEqual(result['extracted_data']['scoring'], 'local')
+        self.assertEqual(result['extracted_data']['parties'], ['Globex Corporation'])
+
+    def test_low_confidence_text_uses_ai_path(self):
+        """Test vague text still goes to the backend path when it is enabled"""
+        self.analyzer.use_backend = True
+        with patch.object(self.analyzer, '_analyze_via_backend', return_value={'risk_score': 1}) as backend:
+            self.analyzer.analyze("Sample invoice text", 'invoice')
+            backend.assert_called_once()
+
+    def test_backend_is_opt_in(self):
+        """Test no backend request is made unless USE_BACKEND_AI is set"""
+        with patch.dict(os.environ, {}, clear=True):
+            analyzer = RiskAnalyzer(http_client=MagicMock())
+        self.assertFalse(analyzer.use_backend)
+        analyzer.analyze("Sample invoice text", 'invoice')
+        analyzer.http.post_json.assert_not_called()
+
     def test_empty_text(self):
         """Test analysis with empty text"""
         result = self.analyzer.analyze("", "invoice")
         self.assertIsInstance(result, dict)
         self.assertIn('risk_score', result)
 
+class TestRiskBatcher(unittest.TestCase):
+    def test_results_fan_back_in_order(self):
+        """Test each caller gets the result for its own item"""
+        sizes = []
+        
+        def send(items):
+            sizes.append(len(items))
+            return [item * 10 for item in items]
+        
+        batcher = RiskBatcher(send, max_batch=5, max_wait_ms=500)
+        futures = [batcher.submit(i) for i in range(5)]
+        self.assertEqual([f.result(timeout=5) for f in futures], [0, 10, 20, 30, 40])
+        self.assertEqual(sizes, [5])
+
+    def test_max_wait_bounds_latency(self):
+        """Test a lone request is sent once max_wait expires"""
+        batcher = RiskBatcher(lambda items: items, max_batch=100, max_wait_ms=10)
+        self.assertEqual(batcher.submit('solo').result(timeout=2), 'solo')
+
+    def test_batch_failure_reaches_every_caller(self):
+        """Test a failed or misaligned batch fails each waiting future"""
+        batcher = RiskBatcher(lambda items: items[:1], max_batch=2, max_wait_ms=500)
+        futures = [batcher.submit(i) for i in range(2)]
+        for future in futures:
+            with self.assertRaises(ValueError):
+                future.result(timeout=5)
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,140 @@
+"""
+Unit tests for Single-Flight
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from single_flight import SingleFlight, fcntl
+
+
+class SlowWork:
+    """Counts calls and holds each one until released"""
+    def __init__(self, result=None, error=None):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.result = result
+        self.error = error
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def run_concurrently(flights, key, work, callers=4):
+    """Start one caller, let it begin the work, then add the others and release it"""
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        futures = [executor.submit(flights[0].do, key, work)]
+        work.started.wait(5)
+        futures.extend(executor.submit(flights[i % len(flights)].do, key, work) for i in range(1, callers))
+        time.sleep(0.2)
+        work.release.set()
+    return futures
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.flight = SingleFlight()
+
+    def test_concurrent_callers_share_one_call(self):
+        """Test callers arriving while the work runs get its result without running it again"""
+        work = SlowWork(result={'risk_score': 10})
+        futures = run_concurrently([self.flight], 'doc', work)
+        results = [future.result() for future in futures]
+        self.assertEqual(work.calls, 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True])
+        self.assertTrue(all(result == {'risk_score': 10} for result, _ in results))
+        self.assertEqual(self.flight.stats()['shared'], 3)
+        self.assertEqual(self.flight.stats()['in_flight'], 0)
+
+    def test_exception_reaches_every_waiter(self):
+        """Test waiters see the leader's exception instead of retrying the work"""
+        work = SlowWork(error=ValueError('corrupt'))
+        futures = run_concurrently([self.flight], 'doc', work, callers=3)
+        for future in futures:
+            with self.assertRaises(ValueError):
+                future.result()
+        self.assertEqual(work.calls, 1)
+
+    def test_sequential_calls_run_again(self):
+        """Test a finished flight is not reused by later callers"""
+        self.assertEqual(self.flight.do('doc', lambda: 1), (1, False))
+        self.assertEqual(self.flight.do('doc', lambda: 2), (2, False))
+
+    def test_different_keys_do_not_wait(self):
+        """Test unrelated keys run independently"""
+        work = SlowWork(result='slow')
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(self.flight.do, 'a', work)
+            self.assertTrue(work.started.wait(5))
+            self.assertEqual(self.flight.do('b', lambda: 'fast'), ('fast', False))
+            work.release.set()
+            self.assertEqual(future.result(), ('slow', False))
+
+    def test_waiter_computes_itself_after_timeout(self):
+        """Test a waiter stops waiting after the timeout and runs the work itself"""
+        flight = SingleFlight(timeout=0.1)
+        work = SlowWork(result='slow')
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(flight.do, 'doc', work)
+            self.assertTrue(work.started.wait(5))
+            self.assertEqual(flight.do('doc', lambda: 'own'), ('own', False))
+            work.release.set()
+            future.result()
+        self.assertEqual(flight.stats()['timeouts'], 1)
+
+
+@unittest.skipIf(fcntl is None, "file locks need fcntl")
+class TestSingleFlightAcrossProcesses(unittest.TestCase):
+    """Separate instances sharing a lock directory stand in for separate worker processes"""
+    def setUp(self):
+        self.lock_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.lock_dir, ignore_errors=True)
+
+    def test_result_handed_off_through_lock_dir(self):
+        """Test a second 'process' waits on the file lock and reuses the written result"""
+        flights = [SingleFlight(lock_dir=self.lock_dir), SingleFlight(lock_dir=self.lock_dir)]
+        work = SlowWork(result={'risk_score': 25})
+        futures = run_concurrently(flights, 'doc', work, callers=2)
+        results = [future.result() for future in futures]
+        self.assertEqual(work.calls, 1)
+        self.assertEqual(results, [({'risk_score': 25}, False), ({'risk_score': 25}, True)])
+        self.assertEqual(flights[1].stats()['shared_across_processes'], 1)
+        self.assertFalse([name for name in os.listdir(self.lock_dir) if name.endswith('.lock')])
+
+    def test_stale_handoff_not_reused(self):
+        """Test a result written before the caller arrived is not treated as in-flight work"""
+        flight = SingleFlight(lock_dir=self.lock_dir)
+        self.assertEqual(flight.do('doc', lambda: 'first'), ('first', False))
+        self.assertEqual(SingleFlight(lock_dir=self.lock_dir).do('doc', lambda: 'second'), ('second', False))
+
+    def test_lock_dir_must_be_private(self):
+        """Test a lock directory other users could plant hand-offs in is refused"""
+        os.chmod(self.lock_dir, 0o777)
+        with self.assertRaises(PermissionError):
+            SingleFlight(lock_dir=self.lock_dir)
+
+    def test_failure_not_shared_across_processes(self):
+        """Test a failed computation leaves nothing behind, so the waiting process computes itself"""
+        flights = [SingleFlight(lock_dir=self.lock_dir), SingleFlight(lock_dir=self.lock_dir)]
+        work = SlowWork(error=ValueError('corrupt'))
+        futures = run_concurrently(flights, 'doc', work, callers=2)
+        with self.assertRaises(ValueError):
+            futures[0].result()
+        with self.assertRaises(ValueError):
+            futures[1].result()
+        self.assertEqual(work.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
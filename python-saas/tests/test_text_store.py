@@ -0,0 +1,119 @@
+"""
+Unit tests for Text Store
+"""
+import os
+import shutil
+import sqlite3
+import stat
+import tempfile
+import unittest
+from unittest.mock import patch
+from text_store import TextStore, extraction_key
+
+class TestTextStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = TextStore(os.path.join(self.tmpdir, 'texts.sqlite3'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_extraction_key(self):
+        """Test settings are named stably and unset budgets are ignored"""
+        self.assertEqual(extraction_key('auto'), 'auto')
+        self.assertEqual(extraction_key('auto', max_pages=2, max_chars=None), 'auto:max_pages=2')
+        self.assertEqual(extraction_key('pypdf2', max_pages=2, max_chars=10),
+                         extraction_key('pypdf2', max_chars=10, max_pages=2))
+
+    def test_from_env_is_opt_in(self):
+        """Test no store is built unless TEXT_STORE_DB names one"""
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(TextStore.from_env())
+        path = os.path.join(self.tmpdir, 'env.sqlite3')
+        with patch.dict(os.environ, {'TEXT_STORE_DB': path}):
+            self.assertEqual(TextStore.from_env().db_path, path)
+
+    def test_store_is_private(self):
+        """Test a new directory is 0o700 and the database and its WAL files 0o600"""
+        path = os.path.join(self.tmpdir, 'private', 'texts.sqlite3')
+        store = TextStore(path)
+        store.put('abc', 'auto', 'confidential', {})
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode), 0o700)
+        for name in os.listdir(os.path.dirname(path)):
+            self.assertEqual(stat.S_IMODE(os.stat(os.path.join(os.path.dirname(path), name)).st_mode), 0o600)
+
+    def test_tightens_existing_file_and_refuses_symlink(self):
+        """Test a readable existing file is made private and a planted symlink is rejected"""
+        path = os.path.join(self.tmpdir, 'open.sqlite3')
+        with open(path, 'wb'):
+            pass
+        os.chmod(path, 0o644)
+        TextStore(path)
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+
+        link = os.path.join(self.tmpdir, 'link.sqlite3')
+        os.symlink(path, link)
+        with self.assertRaises(OSError):
+            TextStore(link)
+
+    def test_put_and_get_round_trip(self):
+        """Test text, pages and metadata come back as stored, per extraction setting"""
+        self.store.put('abc', 'auto', 'Page one\nPage two', {'title': 'Deed', 'num_pages': 2},
+                       pages=['Page one', 'Page two'])
+        document = self.store.get('abc', 'auto')
+        self.assertEqual(document['text'], 'Page one\nPage two')
+        self.assertEqual(document['pages'], ['Page one', 'Page two'])
+        self.assertEqual(document['metadata']['title'], 'Deed')
+        self.assertFalse(document['truncated'])
+        self.assertIsNone(self.store.get('abc', 'auto:max_pages=1'))
+        self.assertIsNone(self.store.get('missing', 'auto'))
+
+    def test_put_replaces_and_compresses(self):
+        """Test a re-parse replaces the stored text and large text is stored compressed"""
+        self.store.put('abc', 'auto', 'old', {})
+        self.store.put('abc', 'auto', 'Invoice line item ' * 2000, {}, truncated=True)
+        stats = self.store.stats()
+        self.assertEqual(stats['documents'], 1)
+        self.assertEqual(stats['text_chars'], len('Invoice line item ') * 2000)
+        self.assertLess(stats['stored_bytes'], stats['text_chars'] // 10)
+        self.assertTrue(self.store.get('abc', 'auto')['truncated'])
+
+    def test_pages_processed_round_trip(self):
+        """Test the page list of a selective extraction is kept with its text"""
+        self.store.put('abc', 'auto:page_selection=2-3', 'Two\nThree', {}, pages_processed='2-3')
+        self.assertEqual(self.store.get('abc', 'auto:page_selection=2-3')['pages_processed'], '2-3')
+
+    def test_adds_pages_processed_to_existing_store(self):
+        """Test a store created before page selection gains the column and keeps its rows"""
+        path = os.path.join(self.tmpdir, 'old.sqlite3')
+        with sqlite3.connect(path) as conn:
+            conn.execute(
+                "CREATE TABLE documents (document_hash TEXT NOT NULL, extraction TEXT NOT NULL, text BLOB NOT NULL,"
+                " pages BLOB, metadata TEXT, truncated INTEGER, text_length INTEGER, stored_at REAL,"
+                " PRIMARY KEY (document_hash, extraction))"
+            )
+        conn.close()
+        store = TextStore(path)
+        store.put('abc', 'auto', 'text', {}, pages_processed='1')
+        self.assertEqual(store.get('abc', 'auto')['pages_processed'], '1')
+        self.assertEqual(TextStore(path).get('abc', 'auto')['text'], 'text')
+
+    def test_get_many_and_list_hashes(self):
+        """Test bulk lookup and paging through stored hashes in order"""
+        for document_hash in ('c', 'a', 'b'):
+            self.store.put(document_hash, 'auto', f'text {document_hash}', {})
+        self.assertEqual(set(self.store.get_many(['a', 'b', 'z'], 'auto')), {'a', 'b'})
+        self.assertEqual(self.store.list_hashes('auto', limit=2), ['a', 'b'])
+        self.assertEqual(self.store.list_hashes('auto', after='b'), ['c'])
+        self.assertEqual(self.store.list_hashes('pypdf2'), [])
+
+    def test_shared_between_instances(self):
+        """Test a second store on the same file (another worker) sees stored texts"""
+        self.store.put('abc', 'auto', 'shared', {})
+        other = TextStore(self.store.db_path)
+        self.assertEqual(other.get('abc', 'auto')['text'], 'shared')
+        other.clear()
+        self.assertIsNone(self.store.get('abc', 'auto'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+Unit tests for Upload Spool
+"""
+import hashlib
+import io
+import os
+import unittest
+from upload_spool import SpooledUpload, UploadBudget, UploadBudgetExceeded, UploadTooLarge, spool_upload
+
+class TestUploadSpool(unittest.TestCase):
+    def test_small_upload_stays_in_memory(self):
+        """Test uploads under the threshold are served as bytes"""
+        upload = spool_upload(io.BytesIO(b'%PDF-1.4 small'), max_bytes=1024, spool_threshold=512)
+        self.assertFalse(upload.on_disk)
+        self.assertEqual(upload.source(), b'%PDF-1.4 small')
+        self.assertEqual(upload.sha256, hashlib.sha256(b'%PDF-1.4 small').hexdigest())
+        upload.close()
+
+    def test_large_upload_spools_to_disk(self):
+        """Test uploads over the threshold move to a temp file that close removes"""
+        data = b'x' * 4096
+        upload = spool_upload(io.BytesIO(data), max_bytes=10000, spool_threshold=1000)
+        path = upload.source()
+        self.assertTrue(upload.on_disk)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(upload.read(), data)
+        self.assertEqual(upload.sha256, hashlib.sha256(data).hexdigest())
+
+        upload.close()
+        self.assertFalse(os.path.exists(path))
+
+    def test_persist_moves_spooled_file(self):
+        """Test persist hands the temp file over instead of copying it"""
+        data = b'z' * 4096
+        upload = spool_upload(io.BytesIO(data), max_bytes=10000, spool_threshold=1000)
+        temp_path = upload.source()
+        dest = temp_path + '.kept'
+        upload.persist(dest)
+        upload.close()
+        self.assertFalse(os.path.exists(temp_path))
+        with open(dest, 'rb') as f:
+            self.assertEqual(f.read(), data)
+        os.remove(dest)
+
+    def test_limit_enforced_while_streaming(self):
+        """Test the size limit trips on the write that crosses it"""
+        upload = SpooledUpload(max_bytes=100, spool_threshold=50)
+        upload.write(b'a' * 60)
+        with self.assertRaises(UploadTooLarge):
+            upload.write(b'a' * 60)
+        upload.close()
+
+    def test_spool_upload_cleans_up_on_limit(self):
+        """Test spool_upload raises and leaves no temp file behind"""
+        before = set(os.listdir(os.environ.get('TMPDIR', '/tmp')))
+        with self.assertRaises(UploadTooLarge):
+            spool_upload(io.BytesIO(b'y' * 5000), max_bytes=2000, spool_threshold=100)
+        after = set(os.listdir(os.environ.get('TMPDIR', '/tmp')))
+        self.assertEqual({n for n in after - before if n.startswith('upload-')}, set())
+
+    def test_budget_shared_across_uploads(self):
+        """Test uploads drawing on one budget trip it together, though each is under its own limit"""
+        budget = UploadBudget(3000)
+        first = spool_upload(io.BytesIO(b'a' * 2000), max_bytes=2500, spool_threshold=100, budget=budget)
+        self.assertEqual(budget.remaining, 1000)
+        with self.assertRaises(UploadBudgetExceeded):
+            spool_upload(io.BytesIO(b'b' * 2000), max_bytes=2500, spool_threshold=100, budget=budget)
+        first.close()
+
+if __name__ == '__main__':
+    unittest.main()
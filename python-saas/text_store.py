@@ -0,0 +1,141 @@
+"""
+Text Store Module
+Compressed SQLite store of extracted text, per-page text and metadata, keyed by PDF content hash, so documents can be re-scored without re-parsing
+"""
+import json
+import os
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlite_files import chunked, connect, open_db
+
+
+def extraction_key(method: str, **options: Any) -> str:
+    """
+    Name the extraction settings a stored text came from, e.g. 'auto' or 'auto:max_pages=2'
+
+    Args:
+        options: Budgets and page choices that change the text (max_chars / max_pages /
+            page_selection / sample); None values are ignored
+    """
+    parts = [method]
+    parts.extend(f"{name}={value}" for name, value in sorted(options.items()) if value is not None)
+    return ':'.join(parts)
+
+
+class TextStore:
+    def __init__(self, db_path: str, compress_level: int = 6):
+        """
+        Initialize text store
+
+        Args:
+            db_path: SQLite file; shared safely by several worker processes.
+                It holds customer document text, so a missing directory is
+                created 0o700 and the file 0o600
+            compress_level: zlib level for stored text (1 fastest .. 9 smallest)
+
+        Raises:
+            OSError: if db_path is a symlink or belongs to another user
+        """
+        self.db_path = db_path
+        self.compress_level = compress_level
+        open_db(db_path,
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " document_hash TEXT NOT NULL, extraction TEXT NOT NULL, text BLOB NOT NULL, pages BLOB,"
+                " metadata TEXT, truncated INTEGER, text_length INTEGER, stored_at REAL, pages_processed TEXT,"
+                " PRIMARY KEY (document_hash, extraction))")
+        with connect(db_path) as conn:
+            # Stores created before page selection lack the column
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+            if 'pages_processed' not in columns:
+                conn.execute("ALTER TABLE documents ADD COLUMN pages_processed TEXT")
+
+    @classmethod
+    def from_env(cls) -> Optional['TextStore']:
+        """Build a store at TEXT_STORE_DB; None (no text is kept) when it is not set"""
+        path = os.getenv("TEXT_STORE_DB")
+        if not path:
+            return None
+        return cls(path, compress_level=int(os.getenv("TEXT_STORE_COMPRESS_LEVEL", 6)))
+
+    def _pack(self, value: Any) -> bytes:
+        return zlib.compress(json.dumps(value).encode('utf-8'), self.compress_level)
+
+    @staticmethod
+    def _unpack(blob: Optional[bytes]) -> Any:
+        return json.loads(zlib.decompress(blob).decode('utf-8')) if blob is not None else None
+
+    def put(self, document_hash: str, extraction: str, text: str, metadata: Dict[str, Any],
+            truncated: bool = False, pages: Optional[List[str]] = None,
+            pages_processed: Optional[str] = None) -> None:
+        """
+        Store one document's extraction, replacing an earlier one with the same settings
+
+        Args:
+            document_hash: Hex SHA-256 of the PDF bytes
+            extraction: Settings the text came from (see extraction_key)
+            pages: Per-page text, if available
+            pages_processed: 1-based pages the text came from, e.g. '1-3,10'
+        """
+        with connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (document_hash, extraction, text, pages, metadata, truncated,"
+                " text_length, stored_at, pages_processed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (document_hash, extraction, self._pack(text), self._pack(pages) if pages is not None else None,
+                 json.dumps(metadata), int(bool(truncated)), len(text), time.time(), pages_processed)
+            )
+
+    def get(self, document_hash: str, extraction: str) -> Optional[Dict[str, Any]]:
+        """Look up one stored extraction (see get_many)"""
+        return self.get_many([document_hash], extraction).get(document_hash)
+
+    def get_many(self, document_hashes: Iterable[str], extraction: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Look up stored extractions
+
+        Returns:
+            {document_hash: {'text', 'pages', 'metadata', 'truncated', 'pages_processed', 'stored_at'}} for the hashes that are stored
+        """
+        hashes = list(dict.fromkeys(document_hashes))
+        found: Dict[str, Dict[str, Any]] = {}
+        with connect(self.db_path) as conn:
+            for chunk in chunked(hashes):
+                rows = conn.execute(
+                    f"SELECT document_hash, text, pages, metadata, truncated, pages_processed, stored_at FROM documents"
+                    f" WHERE extraction = ? AND document_hash IN ({','.join('?' * len(chunk))})",
+                    [extraction] + chunk
+                ).fetchall()
+                for document_hash, text, pages, metadata, truncated, pages_processed, stored_at in rows:
+                    found[document_hash] = {
+                        'text': self._unpack(text),
+                        'pages': self._unpack(pages),
+                        'metadata': json.loads(metadata) if metadata else {},
+                        'truncated': bool(truncated),
+                        'pages_processed': pages_processed,
+                        'stored_at': stored_at,
+                    }
+        return found
+
+    def list_hashes(self, extraction: str, after: str = '', limit: int = 100) -> List[str]:
+        """Stored document hashes for these settings in hash order, starting after `after` (for paging)"""
+        with connect(self.db_path) as conn:
+            rows = conn.execute(
+                "SELECT document_hash FROM documents WHERE extraction = ? AND document_hash > ?"
+                " ORDER BY document_hash LIMIT ?", (extraction, after, limit)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        """Stored documents, their total text length and the compressed size on disk"""
+        with connect(self.db_path) as conn:
+            documents, text_length, stored_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(text_length), 0),"
+                " COALESCE(SUM(LENGTH(text) + COALESCE(LENGTH(pages), 0)), 0) FROM documents"
+            ).fetchone()
+        return {'documents': documents, 'text_chars': text_length, 'stored_bytes': stored_bytes}
+
+    def clear(self) -> None:
+        """Forget every stored text"""
+        with connect(self.db_path) as conn:
+            conn.execute("DELETE FROM documents")
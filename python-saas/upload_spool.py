@@ -0,0 +1,176 @@
+"""
+Upload Spool Module
+Streams uploads into memory or a temp file, hashing and enforcing the size limit as it goes
+"""
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from typing import Optional, Union, BinaryIO
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised while streaming once an upload exceeds the configured limit"""
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds maximum size of {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+class UploadBudgetExceeded(UploadTooLarge):
+    """Raised once the uploads sharing an UploadBudget exceed it together"""
+    def __init__(self, max_bytes: int):
+        Exception.__init__(self, f"Uploads exceed the combined maximum of {max_bytes} bytes per request")
+        self.max_bytes = max_bytes
+
+
+class UploadBudget:
+    """Byte allowance shared by several uploads, so many parts cannot add up past one limit"""
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.used = 0
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.max_bytes - self.used)
+
+    def take(self, size: int) -> None:
+        """
+        Count size more bytes against the budget
+
+        Raises:
+            UploadBudgetExceeded: once the total goes over max_bytes
+        """
+        self.used += size
+        if self.max_bytes and self.used > self.max_bytes:
+            raise UploadBudgetExceeded(self.max_bytes)
+
+
+class SpooledUpload:
+    """
+    Writable/readable upload buffer
+    Small uploads stay in memory; once spool_threshold is crossed the data
+    moves to a named temp file so parsers can open it without a heap copy.
+    The SHA-256 digest is computed incrementally while the data arrives.
+    """
+    def __init__(self, max_bytes: int, spool_threshold: int, spool_dir: Optional[str] = None,
+                 budget: Optional[UploadBudget] = None):
+        self.max_bytes = max_bytes
+        self.spool_threshold = spool_threshold
+        self.spool_dir = spool_dir
+        self.budget = budget
+        self.size = 0
+        self.path: Optional[str] = None
+        self._hash = hashlib.sha256()
+        self._file: BinaryIO = io.BytesIO()
+
+    @property
+    def sha256(self) -> str:
+        """Hex digest of everything written so far"""
+        return self._hash.hexdigest()
+
+    @property
+    def on_disk(self) -> bool:
+        return self.path is not None
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise UploadTooLarge(self.max_bytes)
+        if self.budget is not None:
+            self.budget.take(len(data))
+        self._hash.update(data)
+        if self.path is None and self.size > self.spool_threshold:
+            self._rollover()
+        return self._file.write(data)
+
+    def _rollover(self) -> None:
+        """Move buffered bytes to a temp file"""
+        fd, path = tempfile.mkstemp(suffix='.pdf', prefix='upload-', dir=self.spool_dir)
+        disk_file = os.fdopen(fd, 'w+b')
+        disk_file.write(self._file.getvalue())
+        self._file = disk_file
+        self.path = path
+
+    def source(self) -> Union[bytes, str]:
+        """
+        Return what a parser should open
+
+        Returns:
+            The bytes for in-memory uploads, or the temp file path once spooled
+        """
+        if self.path is not None:
+            self._file.flush()
+            return self.path
+        return self._file.getvalue()
+
+    def persist(self, dest_path: str) -> None:
+        """
+        Move the upload to dest_path so it outlives the request
+        dest_path must not exist yet and ends up 0o600. A spooled temp file is
+        moved rather than copied; afterwards the spool no longer owns it and
+        close() leaves it in place.
+        """
+        if self.path is not None:
+            self._file.close()
+            shutil.move(self.path, dest_path)
+            self.path = None
+            self._file = io.BytesIO()
+        else:
+            # Readable by this user only, like the mkstemp file a spooled upload is moved from
+            fd = os.open(dest_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self._file.getvalue())
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def readline(self, size: int = -1) -> bytes:
+        return self._file.readline(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        """Close the buffer and remove the temp file, if any"""
+        self._file.close()
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+def spool_upload(stream: BinaryIO, max_bytes: int, spool_threshold: int,
+                 spool_dir: Optional[str] = None, budget: Optional[UploadBudget] = None) -> SpooledUpload:
+    """
+    Copy a readable stream into a SpooledUpload in fixed-size chunks
+
+    Raises:
+        UploadTooLarge: as soon as more than max_bytes have been read
+        UploadBudgetExceeded: as soon as the shared budget is used up
+    """
+    upload = SpooledUpload(max_bytes, spool_threshold, spool_dir, budget)
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            upload.write(chunk)
+    except Exception:
+        upload.close()
+        raise
+    upload.seek(0)
+    return upload
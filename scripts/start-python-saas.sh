@@ -1,24 +1,31 @@
 #!/bin/bash
 
 # Start Python SaaS service
+# Production (default): gunicorn with python-saas/gunicorn.conf.py (tune via GUNICORN_* env vars)
+# Development: ./start-python-saas.sh --dev  (Flask dev server with reloader)
 
 cd "$(dirname "$0")/../python-saas"
 
-echo "🐍 Starting Python SaaS on port 5000..."
+if [ "$1" = "--dev" ]; then
+    SERVER_CMD="app.py"
+    echo "🐍 Starting Python SaaS dev server on port ${PORT:-5000}..."
+else
+    SERVER_CMD="-m gunicorn -c gunicorn.conf.py app:app"
+    echo "🐍 Starting Python SaaS (gunicorn) on port ${PORT:-5000}..."
+fi
 
 # Try to use user pip
 if [ -f ~/.local/bin/pip ]; then
     echo "Installing dependencies with user pip..."
-    ~/.local/bin/pip install -q flask flask-cors PyPDF2 pdfplumber requests python-dotenv 2>&1 | tail -n 1
-    ~/.local/bin/python app.py
+    ~/.local/bin/pip install -q -r requirements.txt 2>&1 | tail -n 1
+    exec ~/.local/bin/python $SERVER_CMD
 elif [ -f venv/bin/activate ]; then
     echo "Using venv..."
     source venv/bin/activate
-    pip install -q flask flask-cors PyPDF2 pdfplumber requests python-dotenv 2>&1 | tail -n 1
-    python app.py
+    pip install -q -r requirements.txt 2>&1 | tail -n 1
+    exec python $SERVER_CMD
 else
     echo "⚠️  No pip found. Please install pip first:"
     echo "   curl -sS https://bootstrap.pypa.io/get-pip.py | python3 - --user"
     exit 1
 fi
-